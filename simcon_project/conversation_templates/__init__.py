@@ -0,0 +1 @@
+default_app_config = 'conversation_templates.apps.ConversationTemplatesConfig'
@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ConversationTemplatesConfig(AppConfig):
     name = 'conversation_templates'
+
+    def ready(self):
+        # Keeps the compiled conversation graphs and the search index in sync with changes
+        from conversation_templates import checks, signals  # noqa: F401
+        from conversation_templates.search_index import create_search_indexes
+        from conversation_templates.response_matrix import fill_response_matrix
+        post_migrate.connect(create_search_indexes, sender=self)
+        # Fills the response matrix after the upgrade that added it; needs the search tables created before
+        post_migrate.connect(fill_response_matrix, sender=self)
@@ -0,0 +1,210 @@
+import audioop
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.files import File
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from conversation_templates.models import AudioTranscodeJob, TemplateNodeResponse
+from conversation_templates.storage import audio_storage, retain_blob, release_blob
+
+# Globals
+TARGET_SAMPLE_RATE = 16000
+TARGET_SAMPLE_WIDTH = 2  # 16 bit
+FRAMES_PER_BLOCK = 65536
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(hours=1)  # Running jobs older than this are assumed to belong to a dead worker
+
+
+def enqueue_transcode(node_response):
+    """
+    Queues conversion of a node response's audio if it is still an uncompressed WAV file.
+    """
+    audio_path = str(node_response.audio_response)
+    if not audio_path.lower().endswith('.wav'):
+        return None
+    return AudioTranscodeJob.objects.create(node_response=node_response, source_file=audio_path)
+
+
+def get_encoder():
+    """
+    Picks the most compact encoder installed on this machine.
+    Returns a tuple of (encoder, file extension). Without any encoder the audio is only downsampled.
+    """
+    if shutil.which('opusenc'):
+        return 'opusenc', '.opus'
+    if shutil.which('ffmpeg'):
+        return 'ffmpeg', '.flac'
+    if shutil.which('flac'):
+        return 'flac', '.flac'
+    return None, '.wav'
+
+
+def downsample_wav(source, target):
+    """
+    Writes a 16 kHz, 16 bit, mono copy of the mono or stereo WAV file at source to target, one block at a time.
+    Raises ValueError for recordings with more than two channels.
+    """
+    with wave.open(source, 'rb') as source_wav:
+        channels = source_wav.getnchannels()
+        width = source_wav.getsampwidth()
+        rate = source_wav.getframerate()
+        if channels > 2:
+            raise ValueError(f'Recordings with {channels} channels are not supported.')
+
+        with wave.open(target, 'wb') as target_wav:
+            target_wav.setnchannels(1)
+            target_wav.setsampwidth(TARGET_SAMPLE_WIDTH)
+            target_wav.setframerate(TARGET_SAMPLE_RATE)
+
+            state = None
+            while True:
+                frames = source_wav.readframes(FRAMES_PER_BLOCK)
+                if not frames:
+                    break
+                if width == 1:
+                    frames = audioop.bias(frames, 1, -128)  # 8 bit WAV samples are unsigned, audioop's are signed
+                if width != TARGET_SAMPLE_WIDTH:
+                    frames = audioop.lin2lin(frames, width, TARGET_SAMPLE_WIDTH)
+                if channels == 2:
+                    frames = audioop.tomono(frames, TARGET_SAMPLE_WIDTH, 0.5, 0.5)
+                if rate != TARGET_SAMPLE_RATE:
+                    frames, state = audioop.ratecv(frames, TARGET_SAMPLE_WIDTH, 1, rate, TARGET_SAMPLE_RATE,
+                                                   state)
+                target_wav.writeframes(frames)
+
+
+def transcode_file(source, work_dir):
+    """
+    Converts the WAV file at source to 16 kHz mono with the best available encoder.
+    Returns the path of the converted file inside work_dir.
+    """
+    encoder, extension = get_encoder()
+    target = os.path.join(work_dir, 'transcoded' + extension)
+
+    if encoder == 'ffmpeg':
+        subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', source,
+                        '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE), '-c:a', 'flac', target], check=True)
+        return target
+
+    downsampled = os.path.join(work_dir, 'downsampled.wav')
+    downsample_wav(source, downsampled)
+    if encoder == 'opusenc':
+        subprocess.run(['opusenc', '--quiet', '--bitrate', '24', downsampled, target], check=True)
+    elif encoder == 'flac':
+        subprocess.run(['flac', '--silent', '--best', '-o', target, downsampled], check=True)
+    else:
+        os.replace(downsampled, target)
+    return target
+
+
+def swap_audio(job, target_file):
+    """
+    Points the node response at the converted file, but only if it still uses the file the job converted.
+    Returns False if the student replaced the recording in the meantime.
+    The update skips the model's signals, so the blob reference counts are moved over here.
+    """
+    swapped = TemplateNodeResponse.objects.filter(id=job.node_response_id, audio_response=job.source_file) \
+        .update(audio_response=target_file)
+    if swapped:
+        retain_blob(target_file)
+        release_blob(job.source_file)
+    return swapped == 1
+
+
+def finish_job(job, status, error=''):
+    job.status = status
+    job.error = error[:1000]
+    job.completion_date = timezone.now()
+    job.save()
+    return job
+
+
+def run_job(job):
+    """
+    Converts the audio for one claimed job and swaps it into the node response.
+    The original file is kept until the node response points at the converted one.
+    """
+    try:
+        if not audio_storage.exists(job.source_file):
+            return finish_job(job, AudioTranscodeJob.SKIPPED, 'Audio file no longer exists.')
+        job.source_size = audio_storage.size(job.source_file)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            source = os.path.join(work_dir, 'source.wav')
+            with audio_storage.open(job.source_file, 'rb') as stored, open(source, 'wb') as local:
+                shutil.copyfileobj(stored, local)
+            target = transcode_file(source, work_dir)
+            job.target_size = os.path.getsize(target)
+            if job.target_size >= job.source_size:
+                return finish_job(job, AudioTranscodeJob.SKIPPED, 'Converted audio is not smaller.')
+
+            name = os.path.splitext(job.source_file)[0] + os.path.splitext(target)[1]
+            with open(target, 'rb') as converted:
+                job.target_file = audio_storage.save(name, File(converted))
+
+        if not swap_audio(job, job.target_file):
+            audio_storage.delete(job.target_file)
+            return finish_job(job, AudioTranscodeJob.SKIPPED, 'Audio was replaced while converting.')
+        audio_storage.delete(job.source_file)
+        return finish_job(job, AudioTranscodeJob.DONE)
+    except Exception as error:
+        if job.attempts < MAX_ATTEMPTS:
+            return finish_job(job, AudioTranscodeJob.PENDING, str(error))
+        return finish_job(job, AudioTranscodeJob.FAILED, str(error))
+
+
+def run_job_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        # Worker threads each hold their own database connection
+        close_old_connections()
+
+
+def claim_jobs(limit):
+    """
+    Marks up to limit pending jobs (or jobs left running by a dead worker) as running and returns them.
+    Each job is claimed with a conditional update, so several worker processes never run the same job.
+    """
+    now = timezone.now()
+    claimable = Q(status=AudioTranscodeJob.PENDING) | Q(status=AudioTranscodeJob.RUNNING,
+                                                        started_date__lt=now - STALE_AFTER)
+    candidates = AudioTranscodeJob.objects.filter(claimable).order_by('creation_date') \
+        .values_list('id', flat=True)[:limit]
+    claimed = []
+    for job_id in candidates:
+        if AudioTranscodeJob.objects.filter(claimable, id=job_id) \
+                .update(status=AudioTranscodeJob.RUNNING, started_date=now, attempts=F('attempts') + 1):
+            claimed.append(job_id)
+    return list(AudioTranscodeJob.objects.filter(id__in=claimed).order_by('creation_date'))
+
+
+def run_workers(workers=2, poll_interval=5, once=False, report=None):
+    """
+    Runs jobs on a pool of worker threads until stopped, or until the queue is empty if once is set.
+    A single worker runs jobs in the calling thread. report is called with every finished job.
+    """
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    run = (lambda jobs: pool.map(run_job_in_thread, jobs)) if pool else (lambda jobs: map(run_job, jobs))
+    try:
+        while True:
+            jobs = claim_jobs(max(workers, 1) * 2)
+            if not jobs:
+                if once:
+                    return
+                close_old_connections()
+                time.sleep(poll_interval)
+                continue
+            for job in run(jobs):
+                if report:
+                    report(job)
+    finally:
+        if pool:
+            pool.shutdown()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends whose entries only live in one worker process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warns when the default or versions cache is not shared between worker processes: the other workers would
+    keep serving compiled graphs, dashboards and completion matrices that one worker invalidated.
+    """
+    warnings = []
+    for alias in ('default', 'versions'):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHES:
+            warnings.append(Warning(f"The {alias} cache ({backend}) is not shared between worker processes.",
+                                    hint="Use a file, database or memcached cache when running more than one "
+                                         "worker.",
+                                    id='conversation_templates.W001'))
+    return warnings
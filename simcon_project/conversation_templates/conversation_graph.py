@@ -0,0 +1,162 @@
+import threading
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeChoice
+
+# Compiled graphs for this worker, keyed by template id: {template_id: (version, ConversationGraph)}
+_graphs = {}
+# Maps every node of a compiled graph to the id of its template
+_node_index = {}
+_lock = threading.Lock()
+
+
+class ConversationGraph:
+    """
+    Read-only, in-memory copy of a ConversationTemplate and everything needed to walk through it.
+
+    Fields:
+    template: The ConversationTemplate object
+    nodes: Dictionary of TemplateNode objects keyed by node id
+    choices: Dictionary of lists of TemplateNodeChoice objects keyed by the id of their parent node
+    start_node: The TemplateNode where the conversation starts, or None
+
+    Every TemplateNode has its parent_template, and every TemplateNodeChoice its parent_template_node and
+    destination_node, already set so following them does not query the database.
+    These objects are shared between requests and must not be modified.
+    """
+    __slots__ = ('template', 'nodes', 'choices', 'start_node')
+
+    def __init__(self, template, nodes, choices):
+        self.template = template
+        self.nodes = {}
+        self.choices = {}
+        self.start_node = None
+
+        for node in nodes:
+            node.parent_template = template
+            self.nodes[node.id] = node
+            self.choices[node.id] = []
+            if node.start and self.start_node is None:
+                self.start_node = node
+
+        for choice in choices:
+            choice.parent_template_node = self.nodes[choice.parent_template_node_id]
+            choice.destination_node = self.nodes.get(choice.destination_node_id)
+            self.choices[choice.parent_template_node_id].append(choice)
+
+    def get_node(self, node_id):
+        node = self.nodes.get(to_uuid(node_id))
+        if node is None:
+            raise TemplateNode.DoesNotExist(f'TemplateNode {node_id} does not exist.')
+        return node
+
+    def get_start_node(self):
+        if self.start_node is None:
+            raise TemplateNode.DoesNotExist(f'{self.template} has no start node.')
+        return self.start_node
+
+    def get_choices(self, node_id):
+        return self.choices.get(to_uuid(node_id), [])
+
+    def get_choice(self, node_id, choice_id):
+        choice_id = to_uuid(choice_id)
+        for choice in self.get_choices(node_id):
+            if choice.id == choice_id:
+                return choice
+        raise TemplateNodeChoice.DoesNotExist(f'TemplateNodeChoice {choice_id} does not exist.')
+
+
+def to_uuid(value):
+    if isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def version_key(template_id):
+    return f'conversation-graph-version:{template_id}'
+
+
+def graph_version(template_id):
+    """
+    Returns the current version of a template's graph from the versions cache. A version that is missing, never
+    set or lost with the cache files, is replaced by a new one rather than read as None, so a graph compiled
+    before it went missing can not be taken for the current one.
+    """
+    versions = caches['versions']
+    version = versions.get(version_key(template_id))
+    if version is None:
+        versions.add(version_key(template_id), uuid.uuid4().hex, None)
+        version = versions.get(version_key(template_id))
+    return version
+
+
+def template_id_for_node(node_id):
+    """
+    Returns the id of the template a TemplateNode belongs to, or None if the node does not exist.
+    """
+    template_id = _node_index.get(node_id)
+    if template_id is None:
+        template_id = TemplateNode.objects.filter(id=node_id).values_list('parent_template_id', flat=True).first()
+    return template_id
+
+
+def compile_graph(template_id):
+    """
+    Loads a template, its nodes and all of their choices in three queries.
+    """
+    template = ConversationTemplate.objects.get(id=template_id)
+    nodes = TemplateNode.objects.filter(parent_template=template)
+    choices = TemplateNodeChoice.objects.filter(parent_template_node__parent_template=template)
+    return ConversationGraph(template, list(nodes), list(choices))
+
+
+def get_graph(template_id):
+    """
+    Returns the compiled ConversationGraph for a template, compiling it on first use in this worker.
+    The graph is recompiled when another worker (or this one) has invalidated it since it was compiled, which
+    relies on the versions cache being shared by the workers (see CACHES in settings.py).
+    """
+    template_id = to_uuid(template_id)
+    version = graph_version(template_id)
+    cached = _graphs.get(template_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    graph = compile_graph(template_id)
+    with _lock:
+        _graphs[template_id] = (version, graph)
+        for node_id in graph.nodes:
+            _node_index[node_id] = template_id
+    return graph
+
+
+def get_graph_for_node(node_id):
+    """
+    Returns the compiled ConversationGraph containing a TemplateNode.
+    Only queries the database the first time this worker sees a template.
+    """
+    node_id = to_uuid(node_id)
+    template_id = template_id_for_node(node_id)
+    if template_id is None:
+        raise TemplateNode.DoesNotExist(f'TemplateNode {node_id} does not exist.')
+    graph = get_graph(template_id)
+    graph.get_node(node_id)
+    return graph
+
+
+def invalidate_graph(template_id):
+    """
+    Drops the compiled graph for a template from this worker, and once the change is committed tells every
+    worker to recompile it. A worker that compiles the graph before the commit stores it under the old version,
+    so it recompiles once the version changes.
+    """
+    if template_id is None:
+        return
+    template_id = to_uuid(template_id)
+    transaction.on_commit(lambda: caches['versions'].set(version_key(template_id), uuid.uuid4().hex, None))
+    with _lock:
+        cached = _graphs.pop(template_id, None)
+        if cached is not None:
+            for node_id in cached[1].nodes:
+                _node_index.pop(node_id, None)
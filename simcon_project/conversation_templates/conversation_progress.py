@@ -0,0 +1,85 @@
+import json
+from conversation_templates.models import TemplateNodeResponse
+
+# Globals
+PROGRESS_COOKIE = 'conversation'
+PROGRESS_SALT = 'conversation_templates.conversation_progress'
+PROGRESS_MAX_AGE = 60 * 60 * 24  # Seconds. A conversation left open for longer has to be started again
+
+
+class ConversationProgress:
+    """
+    The state of the conversation a student is going through, kept in a signed cookie instead of the session.
+    It only holds what cannot be read from the database: the assignment and its settings, and the
+    TemplateResponse once the first step created it. The node responses of that TemplateResponse record
+    everything else, so the cookie changes twice per conversation and no step writes the session.
+
+    Fields:
+    user_id: The student the conversation belongs to
+    assignment_id: Assignment the conversation was started from
+    allow_typed_response: Whether the assignment allows typed responses
+    recording_attempts: Number of recordings the assignment allows per step
+    response_id: The TemplateResponse of the conversation, None until its first step
+    """
+
+    def __init__(self, user_id, assignment_id, allow_typed_response, recording_attempts, response_id=None):
+        self.user_id = user_id
+        self.assignment_id = assignment_id
+        self.allow_typed_response = allow_typed_response
+        self.recording_attempts = recording_attempts
+        self.response_id = response_id
+
+    @classmethod
+    def start(cls, request, assignment):
+        return cls(request.user.id, str(assignment.id), assignment.allow_typed_response,
+                   assignment.recording_attempts)
+
+    @classmethod
+    def load(cls, request):
+        """
+        Returns the progress of the current user's conversation, or None if there is none or its cookie is
+        missing, expired, tampered with or belongs to someone else.
+        """
+        value = request.get_signed_cookie(PROGRESS_COOKIE, default=None, salt=PROGRESS_SALT,
+                                          max_age=PROGRESS_MAX_AGE)
+        if value is None:
+            return None
+        try:
+            user_id, assignment_id, allow_typed_response, recording_attempts, response_id = json.loads(value)
+        except ValueError:
+            return None
+        if user_id != request.user.id:
+            return None
+        return cls(user_id, assignment_id, allow_typed_response, recording_attempts, response_id)
+
+    def dumps(self):
+        return json.dumps([self.user_id, self.assignment_id, self.allow_typed_response, self.recording_attempts,
+                           self.response_id], separators=(',', ':'))
+
+    def save(self, response):
+        response.set_signed_cookie(PROGRESS_COOKIE, self.dumps(), salt=PROGRESS_SALT, max_age=PROGRESS_MAX_AGE,
+                                   httponly=True, samesite='Lax')
+
+    @staticmethod
+    def clear(response):
+        response.delete_cookie(PROGRESS_COOKIE, samesite='Lax')
+
+    def visited_node_response(self, ct_node_id):
+        """
+        Returns the node response already submitted for a node of the conversation, or None.
+        """
+        if self.response_id is None:
+            return None
+        return TemplateNodeResponse.objects.filter(parent_template_response_id=self.response_id,
+                                                   template_node_id=ct_node_id).first()
+
+    def pending_node_response(self):
+        """
+        Returns the node response holding the recording for the current step, before a choice was submitted.
+        """
+        if self.response_id is None:
+            return None
+        return TemplateNodeResponse.objects.filter(parent_template_response_id=self.response_id,
+                                                   template_node__isnull=True) \
+            .order_by('-position_in_sequence').first()
+
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib import messages
 from django.db.models.functions import Lower
-from .models import TemplateFolder, TemplateNodeChoice, ConversationTemplate
+from .models import TemplateFolder, ConversationTemplate
+from .conversation_graph import get_graph
 from bootstrap_modal_forms.forms import BSModalModelForm
 from django_select2 import forms as s2forms
 
@@ -144,21 +145,29 @@ class CustomChoiceRadioSelectWidget(forms.RadioSelect):
 class TemplateNodeChoiceForm(forms.Form):
     """
     Form to display choices related to a TemplateNode
+    Choices come from the compiled ConversationGraph of the node's template, so building and validating the
+    form does not query the database. cleaned_data['choices'] is the selected TemplateNodeChoice.
     """
-    choices = forms.ModelChoiceField(
-        queryset=None,
+    choices = forms.ChoiceField(
         widget=forms.RadioSelect(attrs={'class': "no-bullet-unordered-list"}),
     )
 
     def __init__(self, *args, **kwargs):
         ct_node = kwargs.pop('ct_node', None)
         allow_typed_response = kwargs.pop('allow_typed_response', None)
-        choice_list = TemplateNodeChoice.objects.filter(parent_template_node=ct_node)
+        graph = kwargs.pop('graph', None)
+        if graph is None:
+            graph = get_graph(ct_node.parent_template_id)
+        choice_list = graph.get_choices(ct_node.id)
         super(TemplateNodeChoiceForm, self).__init__(*args, **kwargs)
-        self.fields['choices'].queryset = TemplateNodeChoice.objects.filter(parent_template_node=ct_node)
+        self.choice_map = {str(choice.id): choice for choice in choice_list}
+        self.fields['choices'].choices = [(str(choice.id), choice.choice_text) for choice in choice_list]
         if allow_typed_response:
             self.fields['choices'].widget = CustomChoiceRadioSelectWidget(name="choice-widget", data_list=choice_list)
 
+    def clean_choices(self):
+        return self.choice_map[self.cleaned_data['choices']]
+
     def is_valid(self):
         valid = super(TemplateNodeChoiceForm, self).is_valid()
 
@@ -0,0 +1,335 @@
+import http.cookiejar
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeChoice, \
+    TemplateNodeResponse
+from conversation_templates.storage import collect_unreferenced_blobs
+from conversation_templates.transactions import lock_counters
+from simcon_project.timing import percentile
+from users.models import Assignment, Researcher, Student
+
+# Globals
+EMAIL_DOMAIN = 'loadtest.invalid'  # Never delivered, see RFC 2606
+PASSWORD = 'load-test-password'
+SAMPLE_RATE = 16000
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+def make_wav(seconds):
+    """
+    Returns a mono 16 bit WAV recording of a quiet tone, like the ones the browser uploads.
+    """
+    samples = int(seconds * SAMPLE_RATE)
+    data = struct.pack('<h', 64) * samples
+    fmt = struct.pack('<IHHIIHH', 16, 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16)
+    return b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVEfmt ' + fmt + b'data' + \
+        struct.pack('<I', len(data)) + data
+
+
+def create_fixture(students, steps, rounds):
+    """
+    Creates a researcher with a template of steps nodes in a row and an assignment of it for the given number
+    of students. Returns a dictionary of the ids the simulated students need.
+    """
+    run = uuid.uuid4().hex[:8]
+    researcher = Researcher.objects.create_researcher(email=f'researcher-{run}@{EMAIL_DOMAIN}', password=PASSWORD)
+    template = ConversationTemplate.objects.create(name=f'Load test {run}', description='Load test',
+                                                   researcher=researcher)
+    nodes = [TemplateNode.objects.create(description=f'Step {idx + 1}', parent_template=template,
+                                         position_in_sequence=idx + 1, video_url=VIDEO_URL,
+                                         start=idx == 0, terminal=idx == steps - 1)
+             for idx in range(steps)]
+    choices = [TemplateNodeChoice.objects.create(choice_text='Next', parent_template_node=node,
+                                                 destination_node=destination)
+               for node, destination in zip(nodes, nodes[1:] + [None])]
+    assignment = Assignment.objects.create(name=f'Load test {run}', date_assigned=timezone.now(),
+                                           researcher=researcher, response_attempts=rounds,
+                                           allow_self_rating=True)
+    password = make_password(PASSWORD)  # Hashed once, hashing is slow on purpose
+    student_list = [Student.objects.create(email=f'student-{run}-{idx}@{EMAIL_DOMAIN}', password=password)
+                    for idx in range(students)]
+    assignment.students.add(*student_list)
+    assignment.conversation_templates.add(template)
+    return {
+        'researcher': researcher.id,
+        'template': template.id,
+        'assignment': assignment.id,
+        'steps': [(node.id, choice.id) for node, choice in zip(nodes, choices)],
+        'students': [student.email for student in student_list],
+    }
+
+
+def delete_fixture(fixture):
+    blobs = set(TemplateNodeResponse.objects.filter(parent_template_response__assignment_id=fixture['assignment'])
+                .values_list('audio_response', flat=True))
+    # Deleting the students and the researcher removes the template, assignment and responses with them
+    Student.objects.filter(email__in=fixture['students']).delete()
+    Researcher.objects.filter(id=fixture['researcher']).delete()
+    # The recordings of the run, unless a real response refers to the same blob
+    collect_unreferenced_blobs(grace_period=timedelta(0), names=blobs)
+
+
+@contextmanager
+def test_database():
+    """
+    Runs the block against test databases and a media directory created for it and removed afterwards, like the
+    test runner does, so that the students of a run through the test client never touch the real ones.
+    """
+    directory = tempfile.mkdtemp()
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        if connections[alias].vendor == 'sqlite' and not settings_dict['TEST']['NAME']:
+            # A file, since students writing at the same time lock whole tables of an in-memory database
+            settings_dict['TEST']['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(directory, 'media')):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ClientSession:
+    """
+    A student using the views in this process through the test client. Counts the queries of each request.
+    """
+    def __init__(self, email):
+        # Without allowed hosts, Django in debug mode accepts localhost
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        self.client = Client(HTTP_HOST=host)
+        self.client.force_login(Student.objects.get(email=email))
+
+    def request(self, method, path, data=None):
+        """
+        Returns the status code, redirect location and number of queries of a request.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                files = {name: SimpleUploadedFile('blob', value) for name, value in (data or {}).items()
+                         if isinstance(value, bytes)}
+                response = self.client.post(path, {**(data or {}), **files})
+        return response.status_code, response.get('Location'), len(queries)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class ServerSession:
+    """
+    A student using a running server over HTTP, logged in through the login page. Queries are not counted.
+    """
+    def __init__(self, email, server):
+        self.server = server.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.request('GET', reverse('login'))
+        status, location, queries = self.request('POST', reverse('login'), {'username': email, 'password': PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"{email} could not log in to {self.server} ({status})")
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, method, path, data=None):
+        body = None
+        headers = {'Referer': self.server + path}
+        if method == 'POST':
+            body, content_type = encode_multipart(data or {})
+            headers.update({'Content-Type': content_type, 'X-CSRFToken': self.csrf_token()})
+        request = urllib.request.Request(self.server + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, None, None
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('Location'), None
+
+
+def encode_multipart(data):
+    """
+    Returns the body and content type of a multipart form. Values that are bytes are sent as files.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in data.items():
+        if isinstance(value, bytes):
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="blob"\r\n'
+                         f'Content-Type: application/octet-stream\r\n\r\n'.encode() + value + b'\r\n')
+        else:
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Recorder:
+    """
+    Collects the latency, outcome and query count of every request, by endpoint, from many threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.conversations = 0
+
+    def add(self, endpoint, seconds, ok, queries):
+        with self.lock:
+            samples = self.endpoints.setdefault(endpoint, {'latency': [], 'errors': 0, 'queries': []})
+            samples['latency'].append(seconds)
+            if not ok:
+                samples['errors'] += 1
+            if queries is not None:
+                samples['queries'].append(queries)
+
+    def finished(self):
+        with self.lock:
+            self.conversations += 1
+
+    def report(self, duration):
+        endpoints = {}
+        total = errors = 0
+        for endpoint, samples in sorted(self.endpoints.items()):
+            latency = samples['latency']
+            total += len(latency)
+            errors += samples['errors']
+            endpoints[endpoint] = {
+                'requests': len(latency),
+                'errors': samples['errors'],
+                'error_rate': samples['errors'] / len(latency),
+                'p50_ms': percentile(latency, 50) * 1000,
+                'p95_ms': percentile(latency, 95) * 1000,
+                'p99_ms': percentile(latency, 99) * 1000,
+                'queries_per_request': sum(samples['queries']) / len(samples['queries'])
+                if samples['queries'] else None,
+                'max_queries': max(samples['queries']) if samples['queries'] else None,
+            }
+        return {
+            'duration_s': duration,
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'conversations': self.conversations,
+            'requests_per_second': total / duration if duration else None,
+            'conversations_per_second': self.conversations / duration if duration else None,
+            'endpoints': endpoints,
+        }
+
+
+def simulate_student(session, fixture, recording, recorder):
+    """
+    Goes through the conversation once: the start page, every step with a recording and a choice,
+    and the end page with a self rating. Stops at the first failed request, like a student would.
+    """
+    def timed(endpoint, method, path, data=None, expected=(200,)):
+        start = time.perf_counter()
+        try:
+            status, location, queries = session.request(method, path, data)
+        except Exception:
+            # The test client raises what the view raised, a server would answer 500
+            status, location, queries = None, None, None
+        ok = status in expected
+        recorder.add(f'{endpoint} {method}', time.perf_counter() - start, ok, queries)
+        if not ok:
+            raise RuntimeError(f'{method} {path} returned {status}')
+        return location
+
+    try:
+        timed('conversation-start', 'GET',
+              reverse('conversation-start', args=[fixture['template'], fixture['assignment']]))
+        location = None
+        for node_id, choice_id in fixture['steps']:
+            step = reverse('conversation-step', args=[node_id])
+            timed('conversation-step', 'GET', step)
+            timed('save-audio', 'POST', reverse('save-audio'), {'data': recording})
+            location = timed('conversation-step', 'POST', step, {'choices': str(choice_id)}, expected=(302,))
+        end = urllib.parse.urlparse(location).path
+        timed('conversation-end', 'GET', end)
+        timed('conversation-end', 'POST', end, {'0': '3'}, expected=(302,))
+        recorder.finished()
+    except RuntimeError:
+        pass
+
+
+def run_load_test(students=10, steps=5, rounds=1, recording_seconds=2, server=None, keep_data=False,
+                  live_database=False):
+    """
+    Simulates students going through a conversation at the same time, each in its own thread, rounds times
+    in a row. Requests go to a running server when one is given (an url like http://localhost:8000),
+    else straight to the views through the test client. Returns the report as a dictionary.
+    Through the test client the run uses a test database and media directory of its own, unless live_database.
+    The students, template and assignment are created for the run and deleted after it unless keep_data.
+    """
+    if server is None and not live_database:
+        with test_database():
+            return run_load_test(students=students, steps=steps, rounds=rounds,
+                                 recording_seconds=recording_seconds, keep_data=keep_data, live_database=True)
+
+    fixture = create_fixture(students, steps, rounds)
+    recording = make_wav(recording_seconds)
+    recorder = Recorder()
+    locks_before = lock_counters()
+
+    def student(email):
+        try:
+            session = ServerSession(email, server) if server else ClientSession(email)
+            for idx in range(rounds):
+                simulate_student(session, fixture, recording, recorder)
+        except Exception:
+            # A student that could not log in
+            recorder.add('login POST', 0.0, False, None)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=student, args=[email]) for email in fixture['students']]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+    finally:
+        if not keep_data:
+            delete_fixture(fixture)
+
+    report = recorder.report(duration)
+    report.update({
+        'mode': 'server' if server else 'test-client',
+        'students': students,
+        'steps': steps,
+        'rounds': rounds,
+        'recording_bytes': len(recording),
+    })
+    if not server:
+        # Locks of the writes made in this process, see conversation_templates.transactions.
+        # max_wait is the longest wait since the process started, the others are counted during the run.
+        report['locks'] = {}
+        for name, stats in lock_counters().items():
+            before = locks_before.get(name, {})
+            report['locks'][name] = {key: value if key == 'max_wait' else value - before.get(key, 0)
+                                     for key, value in stats.items()}
+    return report
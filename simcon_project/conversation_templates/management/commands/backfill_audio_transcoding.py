@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from conversation_templates.audio_transcoding import run_workers
+from conversation_templates.models import AudioTranscodeJob, TemplateNodeResponse
+
+
+class Command(BaseCommand):
+    help = "Queues conversion of every audio response that is still stored as WAV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--run', action='store_true', help="Convert the queued audio right away.")
+        parser.add_argument('--workers', type=int, default=2)
+
+    def handle(self, *args, **options):
+        # Audio already queued or converted is left alone
+        queued = AudioTranscodeJob.objects.exclude(status=AudioTranscodeJob.FAILED).values('source_file')
+        node_responses = TemplateNodeResponse.objects.filter(audio_response__iendswith='.wav') \
+            .exclude(audio_response__in=queued).values_list('id', 'audio_response')
+
+        jobs = []
+        queued_count = 0
+        for node_response_id, audio_response in node_responses.iterator():
+            jobs.append(AudioTranscodeJob(node_response_id=node_response_id, source_file=audio_response))
+            if len(jobs) >= options['batch_size']:
+                AudioTranscodeJob.objects.bulk_create(jobs)
+                queued_count += len(jobs)
+                jobs = []
+        AudioTranscodeJob.objects.bulk_create(jobs)
+        queued_count += len(jobs)
+        self.stdout.write(f"Queued {queued_count} audio responses for conversion.")
+
+        if options['run']:
+            saved = []
+            run_workers(workers=options['workers'], once=True, report=lambda job: saved.append(job.bytes_saved))
+            self.stdout.write(f"Converted {len(saved)} audio responses, saved {sum(saved)} bytes.")
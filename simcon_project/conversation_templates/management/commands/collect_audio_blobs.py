@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from conversation_templates.storage import collect_unreferenced_blobs, recount_references
+
+
+class Command(BaseCommand):
+    help = "Deletes audio files in the audio store that no node response refers to anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Keep unreferenced files stored within this many hours.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of files checked per query.")
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute reference counts from the node responses first.")
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recount_references(batch_size=options['batch_size'])
+        deleted, freed = collect_unreferenced_blobs(grace_period=timedelta(hours=options['grace_hours']),
+                                                    batch_size=options['batch_size'])
+        self.stdout.write(f"Deleted {deleted} unreferenced audio files, freed {freed} bytes.")
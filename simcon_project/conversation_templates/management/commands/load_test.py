@@ -0,0 +1,39 @@
+import json
+from django.core.management.base import BaseCommand
+from conversation_templates.load_test import run_load_test
+
+
+class Command(BaseCommand):
+    help = "Simulates students going through a conversation at the same time and reports latency, " \
+           "throughput, queries and errors per endpoint as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10, help="Number of students running at once.")
+        parser.add_argument('--steps', type=int, default=5, help="Number of steps of the conversation.")
+        parser.add_argument('--rounds', type=int, default=1,
+                            help="Number of times each student goes through the conversation.")
+        parser.add_argument('--recording-seconds', type=float, default=2,
+                            help="Length of the recording uploaded at every step.")
+        parser.add_argument('--server',
+                            help="Url of a running server to test, like http://localhost:8000. It has to use the "
+                                 "same database as this command. Without it the views run in this process.")
+        parser.add_argument('--output', help="File the JSON report is written to instead of the output.")
+        parser.add_argument('--live-database', action='store_true',
+                            help="Run the views in this process against the configured database and MEDIA_ROOT, "
+                                 "instead of a test database and media directory created for the test.")
+        parser.add_argument('--keep-data', action='store_true',
+                            help="Keep the students, template and responses created for the test, in the database "
+                                 "of the server or with --live-database.")
+
+    def handle(self, *args, **options):
+        report = run_load_test(students=options['students'], steps=options['steps'], rounds=options['rounds'],
+                               recording_seconds=options['recording_seconds'], server=options['server'],
+                               keep_data=options['keep_data'], live_database=options['live_database'])
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(text)
+            self.stdout.write(f"{report['conversations']} conversations, {report['requests']} requests, "
+                              f"{report['errors']} errors. Report written to {options['output']}.")
+        else:
+            self.stdout.write(text)
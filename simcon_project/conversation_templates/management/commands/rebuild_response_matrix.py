@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from conversation_templates.models import ConversationTemplate
+from conversation_templates.response_matrix import rebuild_response_matrix
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized rows of the all-responses table from the template responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', help="Id of the only template to rebuild.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of responses rebuilt per batch.")
+
+    def handle(self, *args, **options):
+        template = None
+        if options['template']:
+            try:
+                template = ConversationTemplate.objects.get(id=options['template'])
+            except (ConversationTemplate.DoesNotExist, ValueError):
+                raise CommandError(f"Template {options['template']} does not exist.")
+        written = rebuild_response_matrix(template=template, batch_size=options['batch_size'])
+        self.stdout.write(f"Rebuilt {written} response rows.")
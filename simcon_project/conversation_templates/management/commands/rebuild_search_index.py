@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from conversation_templates.search_index import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of template responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of responses indexed per batch.")
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(f"Indexed {indexed} responses.")
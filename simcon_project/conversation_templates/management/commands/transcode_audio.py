@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from conversation_templates.audio_transcoding import run_workers
+from conversation_templates.models import AudioTranscodeJob
+
+
+class Command(BaseCommand):
+    help = "Runs the workers that convert recorded audio responses to compact 16 kHz mono files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Number of jobs converted in parallel.")
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help="Seconds to wait before checking an empty queue again.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        totals = {'jobs': 0, 'bytes_saved': 0}
+
+        def report(job):
+            totals['jobs'] += 1
+            totals['bytes_saved'] += job.bytes_saved
+            if job.status == AudioTranscodeJob.DONE:
+                self.stdout.write(f"{job.source_file} -> {job.target_file}: saved {job.bytes_saved} bytes")
+            else:
+                self.stdout.write(f"{job.source_file}: {job.status} ({job.error})")
+
+        try:
+            run_workers(workers=options['workers'], poll_interval=options['poll_interval'],
+                        once=options['once'], report=report)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Finished {totals['jobs']} jobs, saved {totals['bytes_saved']} bytes.")
@@ -4,3 +4,7 @@ from .template_node_response import TemplateNodeResponse
 from .template_node import TemplateNode
 from .template_response import TemplateResponse
 from .template_folder import TemplateFolder
+from .audio_upload import AudioUpload
+from .audio_transcode_job import AudioTranscodeJob
+from .audio_blob import AudioBlob
+from .response_matrix_row import ResponseMatrixRow
@@ -0,0 +1,23 @@
+from django.db import models
+from django.utils import timezone
+
+
+class AudioBlob(models.Model):
+    """
+    An audio file in the content-addressed audio store (see conversation_templates.storage)
+
+    Fields:
+    name: Name of the file in the store, derived from the SHA-256 hash of its contents. Primary Key.
+    size: Size of the file in bytes
+    reference_count: Number of TemplateNodeResponse objects whose audio_response is this file
+    last_stored: Last time this content was saved to the store. Unreferenced blobs are only
+        garbage-collected once this is older than a grace period, so a blob that was just stored
+        (and is about to be attached) is never collected.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    reference_count = models.IntegerField(default=0)
+    last_stored = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.reference_count} references)"
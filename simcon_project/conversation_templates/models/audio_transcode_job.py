@@ -0,0 +1,58 @@
+from django.db import models
+from django.utils import timezone
+import uuid
+
+
+class AudioTranscodeJob(models.Model):
+    """
+    A queued conversion of a TemplateNodeResponse's audio_response to a compact 16 kHz mono file
+
+    Fields:
+    id: UUID to uniquely identify a job. Primary Key.
+    node_response: TemplateNodeResponse whose audio is converted
+    source_file: Name of the original audio file in default_storage
+    target_file: Name of the converted audio file in default_storage, once there is one
+    status: pending, running, done, skipped (nothing to gain or audio changed meanwhile) or failed
+    attempts: Number of times a worker has picked up the job
+    source_size: Size of the original file in bytes
+    target_size: Size of the converted file in bytes
+    error: Last error raised while converting
+    creation_date: The date the job was queued
+    started_date: The date a worker last picked up the job
+    completion_date: The date the job finished
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (SKIPPED, 'Skipped'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(unique=True, editable=False, primary_key=True, default=uuid.uuid4)
+    node_response = models.ForeignKey('conversation_templates.TemplateNodeResponse', related_name='transcode_jobs',
+                                      on_delete=models.CASCADE)
+    source_file = models.CharField(max_length=255)
+    target_file = models.CharField(max_length=255, default='', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    source_size = models.BigIntegerField(default=None, null=True)
+    target_size = models.BigIntegerField(default=None, null=True)
+    error = models.CharField(max_length=1000, default='', blank=True)
+    creation_date = models.DateTimeField(default=timezone.now)
+    started_date = models.DateTimeField(default=None, null=True)
+    completion_date = models.DateTimeField(default=None, null=True)
+
+    def __str__(self):
+        return f"{self.source_file} ({self.status})"
+
+    @property
+    def bytes_saved(self):
+        if self.status != self.DONE or self.source_size is None or self.target_size is None:
+            return 0
+        return self.source_size - self.target_size
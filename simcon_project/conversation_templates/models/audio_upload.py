@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+import uuid
+
+
+class AudioUpload(models.Model):
+    """
+    Tracks a chunked, resumable upload of an audio response that has not been committed yet
+
+    Fields:
+    id: UUID used by the client as the upload session id. Primary Key.
+    template_response: TemplateResponse the audio is being recorded for
+    file_path: Name of the partially written file in default_storage
+    expected_size: Total size of the WAV file in bytes, read from its RIFF header. Null until the first chunk arrives
+    received_size: Number of bytes appended so far. The offset the next chunk must start at
+    next_chunk: Index the next chunk must have
+    creation_date: The date the upload was started
+    """
+    id = models.UUIDField(unique=True, editable=False, primary_key=True, default=uuid.uuid4)
+    template_response = models.ForeignKey('conversation_templates.TemplateResponse', related_name='audio_uploads',
+                                          on_delete=models.CASCADE)
+    file_path = models.CharField(max_length=255)
+    expected_size = models.PositiveIntegerField(default=None, null=True)
+    received_size = models.PositiveIntegerField(default=0)
+    next_chunk = models.PositiveIntegerField(default=0)
+    creation_date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.file_path}: {self.received_size}/{self.expected_size}"
+
+    @property
+    def complete(self):
+        return self.expected_size is not None and self.received_size == self.expected_size
@@ -23,5 +23,11 @@ class ConversationTemplate(models.Model):
     researcher = models.ForeignKey('users.Researcher', related_name='templates', default=0, on_delete=models.CASCADE)
     archived = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Active templates of a researcher
+            models.Index(fields=['researcher'], condition=models.Q(archived=False), name='template_active_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
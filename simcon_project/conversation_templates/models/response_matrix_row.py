@@ -0,0 +1,54 @@
+from django.db import models
+
+
+class ResponseMatrixRow(models.Model):
+    """
+    Denormalized copy of one completed TemplateResponse as a row of the all-responses table, so the table
+    can be read without joins. Kept up to date by conversation_templates.response_matrix.refresh_matrix_rows.
+
+    Fields:
+    template_response: TemplateResponse the row was built from. Primary Key.
+    template: ConversationTemplate the response belongs to
+    completion_date: Date the Student completed the response
+    assignment_name: Name of the Assignment the response was made for
+    student_name: Last and first name of the Student
+    rating: Student self rating as shown in the table
+    custom_response: Whether the conversation ended with a custom response, None if it has no node responses
+    hidden: Whether the response is hidden from the researcher
+    cells: Transcription of each node response, keyed by the id of the TemplateNode it answered
+    """
+    template_response = models.OneToOneField('conversation_templates.TemplateResponse', primary_key=True,
+                                             related_name='matrix_row', on_delete=models.CASCADE)
+    template = models.ForeignKey('conversation_templates.ConversationTemplate', related_name='matrix_rows',
+                                 on_delete=models.CASCADE)
+    completion_date = models.DateTimeField()
+    assignment_name = models.CharField(max_length=100)
+    student_name = models.CharField(max_length=300)
+    rating = models.CharField(max_length=30, blank=True)
+    custom_response = models.BooleanField(null=True, default=None)
+    hidden = models.BooleanField(default=False)
+    cells = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            # Rows of the all-responses table of a template, newest first
+            models.Index(fields=['template', 'completion_date'], name='matrix_row_completion_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_name}: {self.template_id} ({self.completion_date})"
+
+    def as_row(self):
+        """
+        Returns the row as a dictionary keyed like the columns of the all-responses table.
+        """
+        row = {
+            "assignment": self.assignment_name,
+            "student_name": self.student_name,
+            "completion_date": self.completion_date,
+            "rating": self.rating,
+        }
+        if self.custom_response is not None:
+            row["custom_response"] = self.custom_response
+        row.update(self.cells)
+        return row
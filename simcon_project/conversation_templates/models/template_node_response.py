@@ -1,4 +1,5 @@
 from django.db import models
+from conversation_templates.storage import audio_storage
 import uuid
 
 
@@ -13,7 +14,7 @@ class TemplateNodeResponse(models.Model):
     parent_template_response: TemplateResponse that a TemplateNodeResponse object belongs to
     selected_choice: The choice the user selected for a TemplateNode
     position_in_sequence: Determines the order that TemplateNodeResponse transcriptions appear in
-    audio_response: Audio recording of Student response
+    audio_response: Audio recording of Student response, kept in the content-addressed audio store
     """
     id = models.UUIDField(unique=True, editable=False, primary_key=True, default=uuid.uuid4)
     transcription = models.CharField(max_length=1000, null=True, blank=True, default=None)
@@ -21,9 +22,15 @@ class TemplateNodeResponse(models.Model):
     parent_template_response = models.ForeignKey('conversation_templates.TemplateResponse', default=0, related_name='node_responses', on_delete=models.CASCADE)
     selected_choice = models.ForeignKey('conversation_templates.TemplateNodeChoice', default=0, null=True, blank=True, related_name='node_response', on_delete=models.DO_NOTHING)
     position_in_sequence = models.IntegerField()
-    audio_response = models.FileField(upload_to='audio/%Y/%m/%d', default=None)
+    audio_response = models.FileField(storage=audio_storage, upload_to='audio/%Y/%m/%d', default=None)
     custom_response = models.CharField(max_length=200, null=True, blank=True, default=None)
 
+    class Meta:
+        indexes = [
+            # Node responses of a response in conversation order
+            models.Index(fields=['parent_template_response', 'position_in_sequence'], name='node_response_order_idx'),
+        ]
+
     def __str__(self):
         if self.template_node is None:
             return str(self.id)
@@ -29,6 +29,15 @@ class TemplateResponse(models.Model):
     transcription_student_editable = models.BooleanField(default=True)
     response_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Attempts of a student at a template of an assignment
+            models.Index(fields=['student', 'assignment', 'template'], name='response_attempts_idx'),
+            # Responses shown on the researcher's home page
+            models.Index(fields=['template'], condition=models.Q(archived=False, hidden=False),
+                         name='response_visible_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.email}: {self.template.name}, {self.template.researcher} ({self.completion_date})"
 
@@ -0,0 +1,63 @@
+import uuid
+from django.shortcuts import get_object_or_404
+from conversation_templates.models import TemplateResponse, TemplateNodeResponse
+
+
+def load_response(pk):
+    """
+    Returns the TemplateResponse with its template and student, or raises Http404.
+    """
+    return get_object_or_404(TemplateResponse.objects.select_related('template', 'student'), pk=pk)
+
+
+def node_responses_in_order(response):
+    """
+    Returns a queryset of the node responses of a response in the order they were given, with their template
+    nodes and selected choices.
+    """
+    return TemplateNodeResponse.objects.filter(parent_template_response=response) \
+        .select_related('template_node', 'selected_choice') \
+        .order_by('position_in_sequence')
+
+
+def load_node_responses(response):
+    """
+    Returns the node responses of a response in the order they were given, with their template nodes and
+    selected choices, in one query.
+    """
+    return list(node_responses_in_order(response))
+
+
+def update_transcriptions(response, transcriptions):
+    """
+    Applies edited transcriptions, a dictionary of node response id to text, with one bulk update.
+    Empty texts, malformed ids and node responses of other responses are ignored.
+    Returns the number of node responses changed.
+    """
+    edits = {}
+    for node_id, text in transcriptions.items():
+        try:
+            if text != "":
+                edits[uuid.UUID(node_id)] = text
+        except ValueError:
+            continue
+    changed = []
+    for node in TemplateNodeResponse.objects.filter(parent_template_response=response, id__in=edits.keys()) \
+            .only('id', 'transcription'):
+        if node.transcription != edits[node.id]:
+            node.transcription = edits[node.id]
+            changed.append(node)
+    TemplateNodeResponse.objects.bulk_update(changed, ['transcription'])
+    return len(changed)
+
+
+def set_flags(response, **flags):
+    """
+    Sets fields of a response and saves only those that changed. Returns True if anything was saved.
+    """
+    changed = [field for field, value in flags.items() if getattr(response, field) != value]
+    for field in changed:
+        setattr(response, field, flags[field])
+    if changed:
+        response.save(update_fields=changed)
+    return bool(changed)
@@ -0,0 +1,87 @@
+import csv
+import tempfile
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import formats, timezone
+from openpyxl import Workbook
+
+# Globals
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def node_columns(template):
+    """
+    Returns a list of (key, header) tuples for the node columns of a template's responses, in conversation order.
+    """
+    columns = []
+    for idx, node in enumerate(template.template_nodes.all().order_by('position_in_sequence')):
+        header = f'{idx + 1}: {node.description}'
+        if node.terminal:
+            header += ' (Terminal)'
+        columns.append((str(node.id), header))
+    return columns
+
+
+def export_columns(template):
+    """
+    Returns a list of (key, header) tuples for every column of the exported responses, matching ResponseTable.
+    """
+    return [('assignment', 'Assignment'), ('student_name', 'Student name'), ('completion_date', 'Completion date')] \
+        + node_columns(template) + [('rating', 'Rating'), ('custom_response', 'Custom End')]
+
+
+def export_value(row, key):
+    value = row.get(key)
+    if key == 'completion_date':
+        return formats.date_format(timezone.localtime(value), 'SHORT_DATETIME_FORMAT')
+    if key == 'custom_response':
+        return str(bool(value))
+    return '' if value is None else str(value)
+
+
+class Echo:
+    """
+    File-like object that hands back what is written to it, so csv.writer can produce one line at a time.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for key, header in columns])
+    for row in rows:
+        yield writer.writerow([export_value(row, key) for key, header in columns])
+
+
+def write_xlsx(columns, rows):
+    """
+    Writes the rows to a temporary .xlsx file with a write-only workbook, which keeps rows on disk instead
+    of in memory. Returns the file, positioned at the start.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([header for key, header in columns])
+    for row in rows:
+        sheet.append([export_value(row, key) for key, header in columns])
+    export_file = tempfile.TemporaryFile()
+    workbook.save(export_file)
+    export_file.seek(0)
+    return export_file
+
+
+def export_response(template, export_format, rows):
+    """
+    Returns a streaming response with the template's responses as a .csv or .xlsx file.
+    rows is an iterable of dictionaries from conversation_templates.response_matrix.response_rows.
+    """
+    columns = export_columns(template)
+    file_name = f"{template.name}.{export_format}"
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(columns, rows), content_type=EXPORT_FORMATS['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
+    return FileResponse(write_xlsx(columns, rows), as_attachment=True, filename=file_name,
+                        content_type=EXPORT_FORMATS['xlsx'])
@@ -0,0 +1,148 @@
+from django.db import transaction
+from conversation_templates.models import ResponseMatrixRow, TemplateNodeResponse, TemplateResponse
+from conversation_templates.search_index import highlight_row, index_matrix_rows, transcription_index
+
+# Globals
+CHUNK_SIZE = 500  # Rows read or rebuilt at a time
+NODE_RESPONSE_FIELDS = ('parent_template_response_id', 'template_node_id', 'transcription', 'custom_response')
+
+
+def group_node_responses(node_responses):
+    """
+    Groups node response values by the id of the template response they belong to, keeping their order.
+    """
+    grouped = {}
+    for node in node_responses:
+        grouped.setdefault(node['parent_template_response_id'], []).append(node)
+    return grouped
+
+
+def pivot(responses, node_responses):
+    """
+    Yields one row per response: a dictionary with its assignment, student name, completion date and rating,
+    and the transcription of each node response keyed by the id of the template node it answered.
+    node_responses maps each response id to its node response values in conversation order.
+    """
+    for response in responses:
+        row = {
+            "assignment": response.assignment.name,
+            "student_name": f"{response.student.last_name} {response.student.first_name}",
+            "completion_date": response.completion_date,
+        }
+        for node in node_responses.get(response.id, []):
+            if node['template_node_id'] is None:
+                continue
+            if node['custom_response']:
+                row[str(node['template_node_id'])] = f"{node['transcription']} (Custom Response)"
+                row["custom_response"] = True
+            else:
+                row[str(node['template_node_id'])] = node['transcription']
+                row["custom_response"] = False
+        row["rating"] = response.self_rating_to_string
+        yield row
+
+
+def build_matrix_rows(responses):
+    """
+    Returns unsaved ResponseMatrixRow objects for completed responses, with one query for their node responses.
+    """
+    node_responses = TemplateNodeResponse.objects.filter(parent_template_response__in=responses) \
+        .order_by('parent_template_response_id', 'position_in_sequence').values(*NODE_RESPONSE_FIELDS)
+    matrix_rows = []
+    for response, row in zip(responses, pivot(responses, group_node_responses(node_responses))):
+        matrix_rows.append(ResponseMatrixRow(
+            template_response=response,
+            template_id=response.template_id,
+            completion_date=row.pop('completion_date'),
+            assignment_name=row.pop('assignment'),
+            student_name=row.pop('student_name'),
+            rating=row.pop('rating'),
+            custom_response=row.pop('custom_response', None),
+            hidden=response.hidden,
+            cells=row,
+        ))
+    return matrix_rows
+
+
+def refresh_matrix_rows(response_ids):
+    """
+    Rebuilds the matrix rows of the given template responses. Responses that are not completed (or no longer
+    exist) lose their row. Call this after anything shown in the all-responses table changes.
+    """
+    response_ids = list(response_ids)
+    responses = list(TemplateResponse.objects.filter(id__in=response_ids, completion_date__isnull=False)
+                     .select_related('student', 'assignment'))
+    matrix_rows = build_matrix_rows(responses)
+    with transaction.atomic():
+        ResponseMatrixRow.objects.filter(template_response_id__in=response_ids).delete()
+        ResponseMatrixRow.objects.bulk_create(matrix_rows)
+        transcription_index.delete(response_ids)
+        index_matrix_rows(matrix_rows)
+
+
+def rebuild_response_matrix(template=None, batch_size=CHUNK_SIZE):
+    """
+    Rebuilds the matrix rows of every completed response, or only those of one template, in batches.
+    Returns the number of rows written.
+    """
+    responses = TemplateResponse.objects.filter(completion_date__isnull=False)
+    stale = ResponseMatrixRow.objects.all()
+    if template is not None:
+        responses = responses.filter(template=template)
+        stale = stale.filter(template=template)
+    stale.exclude(template_response__in=responses).delete()
+    return refresh_matrix_rows_in_batches(responses, batch_size)
+
+
+def refresh_matrix_rows_in_batches(responses, batch_size=CHUNK_SIZE):
+    """
+    Rebuilds the matrix rows of a queryset of template responses, batch_size responses at a time.
+    Returns the number of responses.
+    """
+    response_ids = list(responses.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(response_ids), batch_size):
+        refresh_matrix_rows(response_ids[start:start + batch_size])
+    return len(response_ids)
+
+
+def fill_response_matrix(**kwargs):
+    """
+    Builds the matrix rows of every completed response while the table has none, as after the migration that
+    created it. Connected to post_migrate.
+    """
+    if not ResponseMatrixRow.objects.exists() \
+            and TemplateResponse.objects.filter(completion_date__isnull=False).exists():
+        rebuild_response_matrix()
+
+
+def matrix_rows(template, query=None):
+    """
+    Returns the matrix rows of a template, newest first. With a query, only rows whose transcriptions,
+    student, assignment or rating match it are selected, through the transcription index.
+    """
+    rows = ResponseMatrixRow.objects.filter(template=template)
+    if query:
+        rows = transcription_index.search(rows, query)
+    return rows.order_by('-completion_date')
+
+
+def as_row(matrix_row, query=None):
+    row = matrix_row.as_row()
+    return highlight_row(row, query) if query else row
+
+
+def response_matrix(template, query=None):
+    """
+    Returns the rows of the all-responses table for a template, newest first, with one query and no joins.
+    With a query, rows also hold the offsets of the matching words (see search_index.highlight_row).
+    """
+    return [as_row(matrix_row, query) for matrix_row in matrix_rows(template, query)]
+
+
+def response_rows(template, query=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the same rows as response_matrix, reading them in chunks so memory use does not grow with the
+    number of responses.
+    """
+    for matrix_row in matrix_rows(template, query).iterator(chunk_size=chunk_size):
+        yield as_row(matrix_row, query)
@@ -0,0 +1,267 @@
+import re
+import uuid
+from django.db import connection
+from users.models import Assignment
+from conversation_templates.models import ResponseMatrixRow, TemplateNodeResponse, TemplateResponse
+
+# Globals
+SEARCH_CONFIG = 'simple'  # Postgres text search configuration: names are not stemmed
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """
+    Splits a search query into lowercase terms. Punctuation is dropped, so terms are safe to put in a match
+    expression.
+    """
+    return TERM_PATTERN.findall(query.lower())
+
+
+class SearchIndex:
+    """
+    Full-text index of documents keyed by the primary key of a model: an FTS5 table on SQLite, a table with
+    a GIN-indexed tsvector column on Postgres. Other databases have no index (supported is False).
+
+    Every term of a query is matched as a prefix of a word, and all terms have to match. Matches are ranked
+    by bm25 on SQLite and ts_rank on Postgres, as search_rank where higher is better.
+    """
+
+    def __init__(self, table, model):
+        self.table = table
+        self.model = model
+
+    @property
+    def supported(self):
+        return connection.vendor in ('sqlite', 'postgresql')
+
+    def db_key(self, key):
+        return self.model._meta.pk.get_db_prep_value(key, connection)
+
+    @staticmethod
+    def rowid(key):
+        """
+        FTS5 can only look rows up quickly by their integer rowid, so on SQLite each document is stored under
+        a rowid taken from 63 bits of its UUID key.
+        """
+        return uuid.UUID(str(key)).int >> 65
+
+    def create(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                               f"USING fts5(key UNINDEXED, body, tokenize='unicode61 remove_diacritics 2')")
+            elif connection.vendor == 'postgresql':
+                key_type = self.model._meta.pk.db_type(connection)
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                               f"(key {key_type} PRIMARY KEY, body text NOT NULL, document tsvector NOT NULL)")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_document ON {self.table} "
+                               f"USING GIN (document)")
+
+    def replace(self, documents):
+        """
+        Adds or replaces documents, given as a dictionary of primary key to text.
+        """
+        if not self.supported or not documents:
+            return
+        rows = [(self.db_key(key), body) for key, body in documents.items()]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                self.delete(documents.keys())
+                cursor.executemany(f"INSERT INTO {self.table} (rowid, key, body) VALUES (%s, %s, %s)",
+                                   [(self.rowid(key),) + row for key, row in zip(documents.keys(), rows)])
+            else:
+                cursor.executemany(f"INSERT INTO {self.table} (key, body, document) "
+                                   f"VALUES (%s, %s, to_tsvector('{SEARCH_CONFIG}', %s)) "
+                                   f"ON CONFLICT (key) DO UPDATE SET body = EXCLUDED.body, "
+                                   f"document = EXCLUDED.document", [row + (row[1],) for row in rows])
+
+    def delete(self, keys):
+        keys = list(keys)
+        if not self.supported or not keys:
+            return
+        placeholders = ', '.join(['%s'] * len(keys))
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                               [self.rowid(key) for key in keys])
+            else:
+                cursor.execute(f"DELETE FROM {self.table} WHERE key IN ({placeholders})",
+                               [self.db_key(key) for key in keys])
+
+    def is_empty(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {self.table} LIMIT 1")
+            return cursor.fetchone() is None
+
+    def clear(self):
+        if self.supported:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table}")
+
+    def match_expression(self, terms):
+        if connection.vendor == 'sqlite':
+            return ' '.join(f'"{term}"*' for term in terms)
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def search(self, queryset, query):
+        """
+        Narrows a queryset of the indexed model down to the documents matching query, ordered by rank, by
+        joining it with the index in the same query.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        expression = self.match_expression(terms)
+        key_column = f'{connection.ops.quote_name(self.model._meta.db_table)}.' \
+                     f'{connection.ops.quote_name(self.model._meta.pk.column)}'
+        if connection.vendor == 'sqlite':
+            return queryset.extra(
+                tables=[self.table],
+                where=[f'{self.table}.key = {key_column}', f'{self.table} MATCH %s'],
+                params=[expression],
+                select={'search_rank': f'-{self.table}.rank'},
+            ).order_by('-search_rank')
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.key = {key_column}',
+                   f"{self.table}.document @@ to_tsquery('{SEARCH_CONFIG}', %s)"],
+            params=[expression],
+            select={'search_rank': f"ts_rank({self.table}.document, to_tsquery('{SEARCH_CONFIG}', %s))"},
+            select_params=[expression],
+        ).order_by('-search_rank')
+
+
+response_index = SearchIndex('conversation_templates_response_search', TemplateResponse)
+transcription_index = SearchIndex('conversation_templates_transcription_search', ResponseMatrixRow)
+ROW_TEXT_FIELDS = ('assignment', 'student_name', 'rating')
+
+
+def match_offsets(text, terms):
+    """
+    Returns the [start, end] offsets of each word in text that starts with one of the search terms.
+    """
+    if not text or not terms:
+        return []
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    return [[match.start(), match.end()] for match in pattern.finditer(text)]
+
+
+def highlight_row(row, query):
+    """
+    Adds the offsets of the words matching query in each text column of a response matrix row,
+    as row['highlights'], keyed like the columns.
+    """
+    terms = search_terms(query)
+    keys = list(ROW_TEXT_FIELDS) + [key for key in row if key not in ROW_TEXT_FIELDS
+                                    and key not in ('completion_date', 'custom_response', 'highlights')]
+    highlights = {}
+    for key in keys:
+        offsets = match_offsets(row.get(key), terms)
+        if offsets:
+            highlights[key] = offsets
+    row['highlights'] = highlights
+    return row
+
+
+def response_documents(responses):
+    """
+    Returns the search document of each response, keyed by its id: student name, template name, assignment
+    name and the names of the assignment's labels. Takes a queryset of responses; uses two queries.
+    """
+    rows = list(responses.values_list('id', 'student__first_name', 'student__last_name', 'template__name',
+                                      'assignment_id', 'assignment__name'))
+    labels = {}
+    for assignment_id, label_name in Assignment.subject_labels.through.objects \
+            .filter(assignment_id__in={row[4] for row in rows}) \
+            .values_list('assignment_id', 'subjectlabel__label_name'):
+        labels.setdefault(assignment_id, []).append(label_name)
+    return {response_id: ' '.join([first_name, last_name, template_name, assignment_name]
+                                  + labels.get(assignment_id, []))
+            for response_id, first_name, last_name, template_name, assignment_id, assignment_name in rows}
+
+
+def index_responses(responses):
+    """
+    Adds or refreshes the responses in a queryset in the search index.
+    """
+    if response_index.supported:
+        response_index.replace(response_documents(responses))
+
+
+def unindex_responses(response_ids):
+    response_index.delete(response_ids)
+    transcription_index.delete(response_ids)
+
+
+def index_matrix_rows(matrix_rows):
+    """
+    Adds or refreshes the transcription documents of response matrix rows: the student, assignment and rating
+    shown in the row, the transcription of every node response and the text of its custom response.
+    The custom responses are not part of the rows, so they are read with one query.
+    """
+    custom_responses = {}
+    for response_id, text in TemplateNodeResponse.objects \
+            .filter(parent_template_response_id__in=[matrix_row.template_response_id for matrix_row in matrix_rows]) \
+            .exclude(custom_response__isnull=True).exclude(custom_response='') \
+            .values_list('parent_template_response_id', 'custom_response'):
+        custom_responses.setdefault(response_id, []).append(text)
+    transcription_index.replace({
+        matrix_row.template_response_id: ' '.join(
+            [matrix_row.student_name, matrix_row.assignment_name, matrix_row.rating]
+            + [str(text) for text in matrix_row.cells.values() if text]
+            + custom_responses.get(matrix_row.template_response_id, []))
+        for matrix_row in matrix_rows
+    })
+
+
+def responses_for_labels(label_ids):
+    return TemplateResponse.objects.filter(assignment__subject_labels__in=label_ids).distinct()
+
+
+def index_all_responses(batch_size=1000):
+    """
+    Indexes every response, batch_size at a time. Returns the number of responses.
+    """
+    response_ids = list(TemplateResponse.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(response_ids), batch_size):
+        index_responses(TemplateResponse.objects.filter(id__in=response_ids[start:start + batch_size]))
+    return len(response_ids)
+
+
+def index_all_matrix_rows(batch_size=1000):
+    batch = []
+    for matrix_row in ResponseMatrixRow.objects.iterator(chunk_size=batch_size):
+        batch.append(matrix_row)
+        if len(batch) == batch_size:
+            index_matrix_rows(batch)
+            batch = []
+    index_matrix_rows(batch)
+
+
+def rebuild_search_index(batch_size=1000):
+    """
+    Indexes every response and every response matrix row again from scratch, creating the index tables if
+    needed. Returns the number of responses indexed.
+    """
+    response_index.create()
+    transcription_index.create()
+    response_index.clear()
+    indexed = index_all_responses(batch_size)
+    transcription_index.clear()
+    index_all_matrix_rows(batch_size)
+    return indexed
+
+
+def create_search_indexes(**kwargs):
+    """
+    Creates the index tables, and fills the ones that are empty, as they are after the upgrade that added them.
+    Connected to post_migrate.
+    """
+    response_index.create()
+    transcription_index.create()
+    if not response_index.supported:
+        return
+    if response_index.is_empty():
+        index_all_responses()
+    if transcription_index.is_empty():
+        index_all_matrix_rows()
@@ -0,0 +1,150 @@
+from django.db.models.signals import m2m_changed, post_init, post_save, pre_delete, post_delete
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeChoice, \
+    TemplateNodeResponse, TemplateResponse
+from conversation_templates.conversation_graph import invalidate_graph, template_id_for_node
+from conversation_templates.storage import retain_blob, release_blob
+from conversation_templates.search_index import index_responses, unindex_responses, responses_for_labels
+from conversation_templates.response_matrix import refresh_matrix_rows_in_batches
+from users.models import Assignment, CustomUser, Student, SubjectLabel
+from conversation_templates.transactions import tune_sqlite
+
+# Fields of other models that are part of a response's search document
+INDEXED_FIELDS = {
+    CustomUser: ('first_name', 'last_name'),
+    Student: ('first_name', 'last_name'),
+    ConversationTemplate: ('name',),
+    Assignment: ('name',),
+    SubjectLabel: ('label_name',),
+}
+
+
+@receiver([post_save, post_delete], sender=ConversationTemplate)
+def conversation_template_changed(sender, instance, **kwargs):
+    invalidate_graph(instance.id)
+
+
+@receiver([post_save, post_delete], sender=TemplateNode)
+def template_node_changed(sender, instance, **kwargs):
+    invalidate_graph(instance.parent_template_id)
+
+
+@receiver([post_save, post_delete], sender=TemplateNodeChoice)
+def template_node_choice_changed(sender, instance, **kwargs):
+    invalidate_graph(template_id_for_node(instance.parent_template_node_id))
+
+
+@receiver(post_init, sender=TemplateNodeResponse)
+def node_response_loaded(sender, instance, **kwargs):
+    # Remember the stored audio, so a save can tell which blob it stopped referring to.
+    # Counts that drift anyway are harmless: blobs are checked against the node responses before they are deleted.
+    audio = instance.__dict__.get('audio_response')
+    instance._stored_audio = str(audio) if audio else None
+
+
+@receiver(post_save, sender=TemplateNodeResponse)
+def node_response_saved(sender, instance, created, **kwargs):
+    stored_audio = None if created else instance._stored_audio
+    if 'audio_response' not in instance.__dict__:
+        return  # Loaded without its audio and saved without touching it
+    audio = str(instance.audio_response) if instance.audio_response else None
+    if audio != stored_audio:
+        retain_blob(audio)
+        release_blob(stored_audio)
+    instance._stored_audio = audio
+
+
+@receiver(post_delete, sender=TemplateNodeResponse)
+def node_response_deleted(sender, instance, **kwargs):
+    release_blob(instance._stored_audio)
+
+
+def indexed_values(instance):
+    return tuple(instance.__dict__.get(field) for field in INDEXED_FIELDS[type(instance)])
+
+
+def indexed_fields_changed(instance, created):
+    """
+    Whether saving an existing record changed any field that is part of the search documents of responses.
+    """
+    changed = not created and indexed_values(instance) != instance._indexed_values
+    instance._indexed_values = indexed_values(instance)
+    return changed
+
+
+def indexed_model_loaded(sender, instance, **kwargs):
+    instance._indexed_values = indexed_values(instance)
+
+
+# Only for the indexed models, as post_init runs for every row of every queryset
+for indexed_model in INDEXED_FIELDS:
+    post_init.connect(indexed_model_loaded, sender=indexed_model)
+
+
+@receiver(post_save, sender=TemplateResponse)
+def template_response_saved(sender, instance, created, **kwargs):
+    if created:
+        index_responses(TemplateResponse.objects.filter(id=instance.id))
+
+
+@receiver(post_delete, sender=TemplateResponse)
+def template_response_deleted(sender, instance, **kwargs):
+    unindex_responses([instance.id])
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, **kwargs):
+    if indexed_fields_changed(instance, created):
+        responses = TemplateResponse.objects.filter(student_id=instance.pk)
+        index_responses(responses)
+        # The student's name is also in their matrix rows and the transcription documents built from them
+        refresh_matrix_rows_in_batches(responses)
+
+
+@receiver(post_save, sender=ConversationTemplate)
+def template_saved(sender, instance, created, **kwargs):
+    if indexed_fields_changed(instance, created):
+        index_responses(instance.template_responses.all())
+
+
+@receiver(post_save, sender=Assignment)
+def assignment_saved(sender, instance, created, **kwargs):
+    if indexed_fields_changed(instance, created):
+        index_responses(instance.template_responses.all())
+        refresh_matrix_rows_in_batches(instance.template_responses.all())
+
+
+@receiver(m2m_changed, sender=Assignment.subject_labels.through)
+def assignment_labels_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        index_responses(instance.template_responses.all())
+    elif pk_set:
+        index_responses(TemplateResponse.objects.filter(assignment_id__in=pk_set))
+    else:
+        # Cleared from the label side: the assignments it was removed from are no longer known
+        index_responses(TemplateResponse.objects.filter(assignment__researcher=instance.researcher_id))
+
+
+@receiver(post_save, sender=SubjectLabel)
+def subject_label_saved(sender, instance, created, **kwargs):
+    if indexed_fields_changed(instance, created):
+        index_responses(responses_for_labels([instance.id]))
+
+
+@receiver(pre_delete, sender=SubjectLabel)
+def subject_label_deleting(sender, instance, **kwargs):
+    instance._indexed_response_ids = list(responses_for_labels([instance.id]).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=SubjectLabel)
+def subject_label_deleted(sender, instance, **kwargs):
+    index_responses(TemplateResponse.objects.filter(id__in=instance._indexed_response_ids))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    tune_sqlite(connection)
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, F
+from django.utils import timezone
+
+# Globals
+BLOB_DIR = 'audio'
+BLOB_NAME_PATTERN = re.compile(r'^audio/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_blob_name(name):
+    return bool(name) and BLOB_NAME_PATTERN.match(str(name).replace(os.sep, '/')) is not None
+
+
+def blob_name(digest, extension):
+    """
+    Blobs are sharded over two directory levels by the first four hex digits of their hash, so that no
+    directory grows beyond a few thousand entries even with millions of recordings.
+    """
+    return '/'.join([BLOB_DIR, digest[0:2], digest[2:4], digest + extension.lower()])
+
+
+class AudioStorage(FileSystemStorage):
+    """
+    Content-addressed storage for audio responses.
+
+    Files are stored under the SHA-256 hash of their contents, whatever name they are saved with (only the
+    extension is kept). Saving content that is already stored writes nothing and returns the existing name.
+    Blobs can be shared by several node responses, so delete() leaves them in place; they are removed by
+    collect_unreferenced_blobs once no node response refers to them. Files saved before the store existed
+    keep their names and are deleted normally.
+    """
+
+    def _save(self, name, content):
+        from conversation_templates.models import AudioBlob
+
+        hasher = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        name = blob_name(hasher.hexdigest(), os.path.splitext(name)[1])
+
+        if not self.exists(name):
+            full_path = self.path(name)
+            directory = os.path.dirname(full_path)
+            os.makedirs(directory, exist_ok=True)
+            content.seek(0)
+            # Write to a temporary file and move it into place, so a blob is never seen half written.
+            # Two identical uploads racing each other just replace the file with the same bytes.
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as blob_file:
+                for chunk in content.chunks():
+                    blob_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(blob_file.name, self.file_permissions_mode)
+            os.replace(blob_file.name, full_path)
+
+        blob, created = AudioBlob.objects.get_or_create(name=name, defaults={'size': content.size})
+        if not created:
+            AudioBlob.objects.filter(name=name).update(last_stored=timezone.now())
+        return name
+
+    def delete(self, name):
+        if is_blob_name(name):
+            return
+        super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+audio_storage = AudioStorage()
+
+
+def retain_blob(name):
+    if is_blob_name(name):
+        from conversation_templates.models import AudioBlob
+        AudioBlob.objects.filter(name=name).update(reference_count=F('reference_count') + 1)
+
+
+def release_blob(name):
+    if is_blob_name(name):
+        from conversation_templates.models import AudioBlob
+        AudioBlob.objects.filter(name=name).update(reference_count=F('reference_count') - 1)
+
+
+def recount_references(batch_size=1000):
+    """
+    Recomputes every blob's reference_count from the node responses, one grouped query per batch.
+    Repairs counts that drifted, e.g. after node responses were changed with queryset.update().
+    """
+    from conversation_templates.models import AudioBlob, TemplateNodeResponse
+
+    names = list(AudioBlob.objects.order_by('name').values_list('name', flat=True))
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        counts = dict(TemplateNodeResponse.objects.filter(audio_response__in=batch).values('audio_response')
+                      .annotate(references=Count('id')).values_list('audio_response', 'references'))
+        blobs = [AudioBlob(name=name, reference_count=counts.get(name, 0)) for name in batch]
+        AudioBlob.objects.bulk_update(blobs, ['reference_count'])
+
+
+def collect_unreferenced_blobs(grace_period=timedelta(days=1), batch_size=1000, names=None):
+    """
+    Deletes blobs no node response refers to and that have not been stored again within the grace period,
+    only among the given names if there are any. Every candidate is checked against the node responses before
+    it is deleted.
+    Returns a tuple of (number of blobs deleted, bytes freed).
+    """
+    from conversation_templates.models import AudioBlob, TemplateNodeResponse
+
+    deleted, freed = 0, 0
+    cutoff = timezone.now() - grace_period
+    candidates = AudioBlob.objects.filter(reference_count__lte=0, last_stored__lt=cutoff).order_by('name')
+    if names is not None:
+        candidates = candidates.filter(name__in=names)
+    last_name = ''
+    while True:
+        batch = list(candidates.filter(name__gt=last_name)[:batch_size])
+        if not batch:
+            break
+        last_name = batch[-1].name
+        names = [blob.name for blob in batch]
+        in_use = set(TemplateNodeResponse.objects.filter(audio_response__in=names)
+                     .values_list('audio_response', flat=True))
+        for blob in batch:
+            if blob.name in in_use:
+                continue
+            audio_storage.delete_blob(blob.name)
+            blob.delete()
+            deleted += 1
+            freed += blob.size
+        if len(batch) < batch_size:
+            break
+    return deleted, freed
@@ -0,0 +1,70 @@
+import uuid
+from django.db import transaction
+from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeChoice
+from users.models import Researcher
+
+
+def load_template_graph(template):
+    """
+    Returns the nodes and choices of a template as two lists, with one query each.
+    """
+    nodes = list(TemplateNode.objects.filter(parent_template=template))
+    choices = list(TemplateNodeChoice.objects.filter(parent_template_node__parent_template=template))
+    return nodes, choices
+
+
+def copy_instance(instance, **changes):
+    """
+    Returns an unsaved copy of a model instance with some field values (by attribute name) changed.
+    """
+    values = {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+    values.update(changes)
+    return type(instance)(**values)
+
+
+def clone_graph(template, nodes, choices, researcher):
+    """
+    Copies a template and its graph for a researcher in memory, with new ids. Choices point at the copied
+    nodes. Returns the unsaved template, nodes and choices.
+    """
+    template_clone = copy_instance(template, id=uuid.uuid4(), researcher_id=researcher.id)
+    node_ids = {node.id: uuid.uuid4() for node in nodes}
+    node_clones = [copy_instance(node, id=node_ids[node.id], parent_template_id=template_clone.id)
+                   for node in nodes]
+    choice_clones = [copy_instance(choice, id=uuid.uuid4(),
+                                   parent_template_node_id=node_ids[choice.parent_template_node_id],
+                                   destination_node_id=node_ids.get(choice.destination_node_id))
+                     for choice in choices]
+    return template_clone, node_clones, choice_clones
+
+
+def clone_template(template, researcher_emails):
+    """
+    Clones a template with all of its nodes and choices for every researcher in researcher_emails.
+    The source graph is loaded once and every copy is written with bulk_create in one transaction, so the
+    number of queries does not depend on the size of the template or the number of recipients.
+    Returns one result per email: a dictionary with the email, whether it succeeded and either the id
+    of the new template or an error message.
+    """
+    nodes, choices = load_template_graph(template)
+    researchers = {researcher.email: researcher
+                   for researcher in Researcher.objects.filter(email__in=researcher_emails)}
+
+    results = []
+    templates, all_nodes, all_choices = [], [], []
+    for email in researcher_emails:
+        researcher = researchers.get(email)
+        if researcher is None:
+            results.append({'email': email, 'success': False, 'error': 'No researcher with this email.'})
+            continue
+        template_clone, node_clones, choice_clones = clone_graph(template, nodes, choices, researcher)
+        templates.append(template_clone)
+        all_nodes.extend(node_clones)
+        all_choices.extend(choice_clones)
+        results.append({'email': email, 'success': True, 'template_id': template_clone.id})
+
+    with transaction.atomic():
+        ConversationTemplate.objects.bulk_create(templates)
+        TemplateNode.objects.bulk_create(all_nodes)
+        TemplateNodeChoice.objects.bulk_create(all_choices)
+    return results
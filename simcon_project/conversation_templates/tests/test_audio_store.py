@@ -0,0 +1,81 @@
+import io
+import tempfile
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.storage import audio_storage, collect_unreferenced_blobs
+from users.models import Researcher, Student, Assignment
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AudioStoreTests(TestCase):
+    def setUp(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="test_template", researcher=researcher)
+        assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(), researcher=researcher)
+        self.response = TemplateResponse.objects.create(student=student, template=template, assignment=assignment)
+
+    def node_response(self, position, audio):
+        return TemplateNodeResponse.objects.create(parent_template_response=self.response, selected_choice=None,
+                                                   position_in_sequence=position, template_node=None,
+                                                   audio_response=audio)
+
+    def references(self, name):
+        return AudioBlob.objects.get(name=name).reference_count
+
+    def age_blobs(self):
+        AudioBlob.objects.update(last_stored=timezone.now() - timedelta(days=2))
+
+    def test_identical_audio_is_stored_once(self):
+        first = audio_storage.save('audio/student@pdx.edu/one.wav', ContentFile(b'same recording'))
+        second = audio_storage.save('audio/student@pdx.edu/two.wav', ContentFile(b'same recording'))
+        other = audio_storage.save('audio/student@pdx.edu/three.wav', ContentFile(b'other recording'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.endswith('.wav'))
+        parts = first.split('/')
+        self.assertEqual(parts[0], 'audio')
+        self.assertEqual(parts[1] + parts[2], parts[3][:4])
+        self.assertEqual(AudioBlob.objects.count(), 2)
+        with audio_storage.open(first) as audio_file:
+            self.assertEqual(audio_file.read(), b'same recording')
+
+    def test_reference_counts(self):
+        name = audio_storage.save('one.wav', ContentFile(b'same recording'))
+        first = self.node_response(1, name)
+        second = self.node_response(2, name)
+        self.assertEqual(self.references(name), 2)
+
+        first.audio_response = audio_storage.save('two.wav', ContentFile(b'new recording'))
+        first.save()
+        self.assertEqual(self.references(name), 1)
+        self.assertEqual(self.references(first.audio_response.name), 1)
+
+        TemplateNodeResponse.objects.get(id=second.id).delete()
+        self.assertEqual(self.references(name), 0)
+        self.assertTrue(audio_storage.exists(name))
+
+    def test_collect_unreferenced_blobs(self):
+        kept = audio_storage.save('one.wav', ContentFile(b'kept recording'))
+        dropped = audio_storage.save('two.wav', ContentFile(b'dropped recording'))
+        recent = audio_storage.save('three.wav', ContentFile(b'recent recording'))
+        self.node_response(1, kept)
+        self.age_blobs()
+        AudioBlob.objects.filter(name=recent).update(last_stored=timezone.now())
+        # A drifted count must not get a referenced blob deleted
+        AudioBlob.objects.filter(name=kept).update(reference_count=0)
+
+        self.assertEqual(collect_unreferenced_blobs(), (1, len(b'dropped recording')))
+        self.assertTrue(audio_storage.exists(kept))
+        self.assertTrue(audio_storage.exists(recent))
+        self.assertFalse(audio_storage.exists(dropped))
+        self.assertFalse(AudioBlob.objects.filter(name=dropped).exists())
+
+        call_command('collect_audio_blobs', '--recount', '--grace-hours', '0', stdout=io.StringIO())
+        self.assertEqual(self.references(kept), 1)
+        self.assertFalse(audio_storage.exists(recent))
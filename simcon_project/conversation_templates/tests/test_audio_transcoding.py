@@ -0,0 +1,91 @@
+import io
+import os
+import tempfile
+import wave
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from conversation_templates.audio_transcoding import downsample_wav, enqueue_transcode, run_workers
+from conversation_templates.models import *
+from users.models import Researcher, Student, Assignment
+
+
+def make_wav(rate=48000, channels=2, seconds=1, width=2, sample=b'\x10\x00\xf0\xff'):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(sample * (channels * width * rate * seconds // len(sample)))
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AudioTranscodingTests(TestCase):
+    def setUp(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="test_template", researcher=researcher)
+        assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(), researcher=researcher)
+        response = TemplateResponse.objects.create(student=student, template=template, assignment=assignment)
+        self.audio_path = default_storage.save('audio/student@pdx.edu/recording.wav', ContentFile(make_wav()))
+        self.node_response = TemplateNodeResponse.objects.create(parent_template_response=response,
+                                                                 position_in_sequence=1, selected_choice=None,
+                                                                 template_node=None, audio_response=self.audio_path)
+
+    def test_transcode_and_swap(self):
+        job = enqueue_transcode(self.node_response)
+        run_workers(workers=1, once=True)
+
+        job.refresh_from_db()
+        self.node_response.refresh_from_db()
+        self.assertEqual(job.status, AudioTranscodeJob.DONE)
+        self.assertEqual(self.node_response.audio_response.name, job.target_file)
+        self.assertFalse(default_storage.exists(self.audio_path))
+        self.assertGreater(job.bytes_saved, 0)
+        self.assertEqual(job.source_size - job.target_size, job.bytes_saved)
+
+        if job.target_file.endswith('.wav'):
+            with default_storage.open(job.target_file) as audio_file, wave.open(audio_file) as converted:
+                self.assertEqual(converted.getframerate(), 16000)
+                self.assertEqual(converted.getnchannels(), 1)
+
+    def test_rerecorded_audio_is_kept(self):
+        job = enqueue_transcode(self.node_response)
+        new_path = default_storage.save('audio/student@pdx.edu/again.wav', ContentFile(make_wav()))
+        TemplateNodeResponse.objects.filter(id=self.node_response.id).update(audio_response=new_path)
+        run_workers(workers=1, once=True)
+
+        job.refresh_from_db()
+        self.node_response.refresh_from_db()
+        self.assertEqual(job.status, AudioTranscodeJob.SKIPPED)
+        self.assertEqual(self.node_response.audio_response.name, new_path)
+        self.assertTrue(default_storage.exists(self.audio_path))
+
+    def test_backfill(self):
+        call_command('backfill_audio_transcoding', stdout=io.StringIO())
+        call_command('backfill_audio_transcoding', stdout=io.StringIO())
+        self.assertEqual(AudioTranscodeJob.objects.count(), 1)
+        call_command('backfill_audio_transcoding', '--run', '--workers', '1', stdout=io.StringIO())
+        self.assertEqual(AudioTranscodeJob.objects.get().status, AudioTranscodeJob.DONE)
+
+    def downsample(self, wav):
+        work_dir = tempfile.mkdtemp()
+        source, target = os.path.join(work_dir, 'source.wav'), os.path.join(work_dir, 'target.wav')
+        with open(source, 'wb') as source_file:
+            source_file.write(wav)
+        downsample_wav(source, target)
+        with wave.open(target, 'rb') as target_wav:
+            return target_wav.getnchannels(), target_wav.readframes(target_wav.getnframes())
+
+    def test_downsample_8_bit(self):
+        # Silence is 128 in unsigned 8 bit samples, and has to stay silent
+        channels, frames = self.downsample(make_wav(rate=8000, channels=1, width=1, sample=b'\x80'))
+        self.assertEqual(channels, 1)
+        self.assertEqual(set(frames), {0})
+
+    def test_downsample_rejects_more_than_two_channels(self):
+        with self.assertRaises(ValueError):
+            self.downsample(make_wav(channels=4, seconds=1))
@@ -0,0 +1,79 @@
+import struct
+import tempfile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from conversation_templates.models import *
+from users.models import Researcher, Student, Assignment
+
+
+def make_wav(samples):
+    data = b'\x01\x00' * samples
+    fmt = struct.pack('<IHHIIHH', 16, 1, 1, 16000, 32000, 2, 16)
+    return b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVEfmt ' + fmt + b'data' + struct.pack('<I', len(data)) + data
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AudioUploadTests(TestCase):
+    def setUp(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="test_template", researcher=researcher)
+        start_node = TemplateNode.objects.create(description="start", parent_template=template, start=True,
+                                                 position_in_sequence=1, video_url="https://www.youtube.com/watch?v=x")
+        assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(), researcher=researcher)
+        assignment.students.add(student)
+        assignment.conversation_templates.add(template)
+        self.client.login(email="student@pdx.edu", password="abc123")
+        # Starting the conversation sets the progress cookie, which its first step fills with the response
+        self.client.get(reverse('conversation-start', args=[template.id, assignment.id]))
+        self.client.get(reverse('conversation-step', args=[start_node.id]))
+        self.ct_response = TemplateResponse.objects.get()
+        self.wav = make_wav(3000)
+
+    def send_chunk(self, upload_id, index, offset, data):
+        return self.client.post(reverse('audio-upload-chunk', args=[upload_id]),
+                                {'index': index, 'offset': offset, 'data': SimpleUploadedFile('blob', data)})
+
+    def test_chunked_upload(self):
+        upload_id = self.client.post(reverse('start-audio-upload')).json()['upload_id']
+        offset = 0
+        for index, start in enumerate(range(0, len(self.wav), 1000)):
+            state = self.send_chunk(upload_id, index, start, self.wav[start:start + 1000]).json()
+            offset = state['offset']
+            self.assertEqual(state['index'], index + 1)
+        self.assertEqual(offset, len(self.wav))
+
+        response = self.client.post(reverse('commit-audio-upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 200)
+        node_response = TemplateNodeResponse.objects.get(parent_template_response=self.ct_response)
+        with default_storage.open(node_response.audio_response.name) as audio_file:
+            self.assertEqual(audio_file.read(), self.wav)
+        self.assertFalse(AudioUpload.objects.exists())
+
+    def test_resume_after_lost_chunk(self):
+        upload_id = self.client.post(reverse('start-audio-upload')).json()['upload_id']
+        self.send_chunk(upload_id, 0, 0, self.wav[:1000])
+
+        # Retried chunk is acknowledged without being appended twice
+        self.assertEqual(self.send_chunk(upload_id, 0, 0, self.wav[:1000]).json()['offset'], 1000)
+        # Skipped chunk is rejected with the position to resume from
+        response = self.send_chunk(upload_id, 2, 2000, self.wav[2000:3000])
+        self.assertEqual(response.status_code, 409)
+        state = self.client.get(reverse('audio-upload-chunk', args=[upload_id])).json()
+        self.assertEqual((state['index'], state['offset']), (1, 1000))
+
+        self.assertEqual(self.client.post(reverse('commit-audio-upload', args=[upload_id])).status_code, 409)
+        self.send_chunk(upload_id, 1, 1000, self.wav[1000:])
+        self.assertEqual(self.client.post(reverse('commit-audio-upload', args=[upload_id])).status_code, 200)
+
+    def test_rejects_invalid_audio(self):
+        upload_id = self.client.post(reverse('start-audio-upload')).json()['upload_id']
+        self.assertEqual(self.send_chunk(upload_id, 0, 0, b'not a wav file at all').status_code, 400)
+        with self.settings(AUDIO_UPLOAD_MAX_SIZE=1000):
+            self.assertEqual(self.send_chunk(upload_id, 0, 0, self.wav[:1000]).status_code, 413)
+        self.send_chunk(upload_id, 0, 0, self.wav[:1000])
+        response = self.send_chunk(upload_id, 1, 1000, self.wav[1000:] + b'extra')
+        self.assertEqual(response.status_code, 400)
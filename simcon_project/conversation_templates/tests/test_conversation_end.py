@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.transactions import hold_times
+from users.models import Researcher, Student, Assignment
+
+
+class ConversationEndTests(TestCase):
+    def setUp(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", researcher=researcher)
+        self.assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                                    researcher=researcher, allow_self_rating=True)
+        self.response = TemplateResponse.objects.create(student=student, template=self.template,
+                                                        assignment=self.assignment)
+        self.client.login(email="student@pdx.edu", password="abc123")
+
+    def add_nodes(self, count):
+        for idx in range(count):
+            TemplateNodeResponse.objects.create(parent_template_response=self.response, template_node=None,
+                                                selected_choice=None,
+                                                position_in_sequence=self.response.node_responses.count() + 1)
+        return list(self.response.node_responses.order_by('position_in_sequence'))
+
+    def submit(self, nodes, rating):
+        data = {str(node.id): f"said {node.position_in_sequence}" for node in nodes}
+        data['0'] = rating
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('conversation-end', args=[self.response.id]), data)
+        self.assertRedirects(response, reverse('student-view'), fetch_redirect_response=False)
+        return [query['sql'] for query in queries]
+
+    def test_submit_in_one_pass(self):
+        before = hold_times().get('conversation_end', {'count': 0})['count']
+        first = self.submit(self.add_nodes(2), 4)
+        self.response.refresh_from_db()
+        completed = self.response.completion_date
+        self.assertIsNotNone(completed)
+        self.assertEqual(self.response.self_rating, 4)
+        nodes = self.response.node_responses.order_by('position_in_sequence')
+        self.assertEqual([node.transcription for node in nodes], ["said 1", "said 2"])
+        updates = [sql.split('"')[1] for sql in first if sql.startswith('UPDATE')]
+        self.assertEqual(updates, ['conversation_templates_templatenoderesponse',
+                                   'conversation_templates_templateresponse'])
+
+        # Submitting again keeps the first completion date, with the same number of queries for more nodes
+        second = self.submit(self.add_nodes(10), 2)
+        self.response.refresh_from_db()
+        self.assertEqual((self.response.completion_date, self.response.self_rating), (completed, 2))
+        self.assertEqual(len(second), len(first))
+        self.assertEqual(hold_times()['conversation_end']['count'], before + 2)
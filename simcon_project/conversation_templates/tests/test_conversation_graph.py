@@ -0,0 +1,94 @@
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeChoice
+from conversation_templates.forms import TemplateNodeChoiceForm
+from conversation_templates.conversation_graph import get_graph, get_graph_for_node, version_key
+from conversation_templates.checks import check_shared_cache
+from users.models import Researcher
+
+
+class ConversationGraphTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="test_template", researcher=self.researcher)
+        self.start_node = TemplateNode.objects.create(description='Start', parent_template=self.template, start=True,
+                                                      video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        self.end_node = TemplateNode.objects.create(description='End', parent_template=self.template, terminal=True,
+                                                    video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        self.choice = TemplateNodeChoice.objects.create(choice_text='Go', parent_template_node=self.start_node,
+                                                        destination_node=self.end_node)
+
+    def test_compiled_graph(self):
+        graph = get_graph(self.template.id)
+        self.assertEqual(graph.get_start_node().id, self.start_node.id)
+        self.assertEqual(len(graph.nodes), 2)
+        choice = graph.get_choice(self.start_node.id, self.choice.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(choice.destination_node.id, self.end_node.id)
+            self.assertEqual(choice.parent_template_node.parent_template.name, "test_template")
+        self.assertEqual(graph.get_choices(self.end_node.id), [])
+
+    def test_no_queries_once_compiled(self):
+        get_graph_for_node(self.start_node.id)
+        with self.assertNumQueries(0):
+            graph = get_graph_for_node(str(self.end_node.id))
+            form = TemplateNodeChoiceForm({'choices': str(self.choice.id)}, ct_node=graph.get_node(self.start_node.id),
+                                          graph=graph)
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.cleaned_data['choices'].id, self.choice.id)
+
+    def test_invalidated_on_change(self):
+        get_graph(self.template.id)
+        TemplateNodeChoice.objects.create(choice_text='Stay', parent_template_node=self.start_node,
+                                          destination_node=self.start_node)
+        self.assertEqual(len(get_graph(self.template.id).get_choices(self.start_node.id)), 2)
+
+        self.end_node.delete()
+        graph = get_graph(self.template.id)
+        self.assertEqual(len(graph.nodes), 1)
+        self.assertEqual(len(graph.get_choices(self.start_node.id)), 1)
+
+        self.template.name = "renamed"
+        self.template.save()
+        self.assertEqual(get_graph(self.template.id).template.name, "renamed")
+
+    def test_deleted_template(self):
+        template_id = self.template.id
+        get_graph(template_id)
+        self.template.delete()
+        with self.assertRaises(ConversationTemplate.DoesNotExist):
+            get_graph(template_id)
+        with self.assertRaises(TemplateNode.DoesNotExist):
+            get_graph_for_node(self.start_node.id)
+
+
+class GraphVersionTests(TransactionTestCase):
+    def test_version_changes_on_commit(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="test_template", researcher=researcher)
+        version = caches['versions'].get(version_key(template.id))
+        with transaction.atomic():
+            TemplateNode.objects.create(description='Start', parent_template=template, start=True,
+                                        video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+            # Other workers keep the graph they have until the node is visible to them
+            self.assertEqual(caches['versions'].get(version_key(template.id)), version)
+        self.assertNotEqual(caches['versions'].get(version_key(template.id)), version)
+
+    def test_lost_version_recompiles(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="test_template", researcher=researcher)
+        # The version is lost with the cache files before and after another worker renamed the template
+        caches['versions'].delete(version_key(template.id))
+        get_graph(template.id)
+        ConversationTemplate.objects.filter(id=template.id).update(name="renamed")
+        caches['versions'].delete(version_key(template.id))
+        self.assertEqual(get_graph(template.id).template.name, "renamed")
+
+    def test_process_local_cache_is_reported(self):
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={'default': shared, 'versions': shared}):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES={'default': local, 'versions': shared}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['conversation_templates.W001'])
@@ -0,0 +1,82 @@
+import struct
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.conversation_progress import PROGRESS_COOKIE
+from users.models import Researcher, Student, Assignment
+
+
+def make_wav(samples):
+    data = b'\x01\x00' * samples
+    fmt = struct.pack('<IHHIIHH', 16, 1, 1, 16000, 32000, 2, 16)
+    return b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVEfmt ' + fmt + b'data' + struct.pack('<I', len(data)) + data
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ConversationProgressTests(TestCase):
+    def setUp(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", researcher=researcher)
+        self.first = TemplateNode.objects.create(description="first", parent_template=self.template, start=True,
+                                                 position_in_sequence=1, video_url="https://www.youtube.com/watch?v=x")
+        self.last = TemplateNode.objects.create(description="last", parent_template=self.template, terminal=True,
+                                                position_in_sequence=2, video_url="https://www.youtube.com/watch?v=x")
+        self.choice = TemplateNodeChoice.objects.create(choice_text="next", parent_template_node=self.first,
+                                                        destination_node=self.last)
+        self.assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                                    researcher=researcher, response_attempts=2,
+                                                    allow_typed_response=True)
+        self.assignment.students.add(student)
+        self.assignment.conversation_templates.add(self.template)
+        self.client.login(email="student@pdx.edu", password="abc123")
+
+    def record(self):
+        response = self.client.post(reverse('save-audio'), {'data': SimpleUploadedFile('blob', make_wav(100))})
+        self.assertEqual(response.status_code, 200)
+
+    def test_conversation_does_not_write_the_session(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('conversation-start', args=[self.template.id, self.assignment.id]))
+            self.client.get(reverse('conversation-step', args=[self.first.id]))
+            self.record()
+            self.record()  # A second attempt replaces the recording of the step
+            response = self.client.post(reverse('conversation-step', args=[self.first.id]),
+                                        {'choices': str(self.choice.id)})
+            self.assertRedirects(response, reverse('conversation-step', args=[self.last.id]),
+                                 fetch_redirect_response=False)
+            self.client.get(reverse('conversation-step', args=[self.last.id]))
+            self.record()
+            response = self.client.post(reverse('conversation-step', args=[self.last.id]),
+                                        {'choices': 'custom-response', 'custom-text': 'bye'})
+            self.client.get(response.url)
+        # The session is only read, to authenticate the student
+        self.assertFalse([query for query in queries
+                          if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')])
+
+        ct_response = TemplateResponse.objects.get()
+        nodes = list(ct_response.node_responses.order_by('position_in_sequence'))
+        self.assertEqual([(node.template_node, node.custom_response) for node in nodes],
+                         [(self.first, None), (self.last, 'bye')])
+        self.assertEqual(nodes[0].selected_choice, self.choice)
+        # The end page closes the conversation
+        self.assertEqual(self.client.cookies[PROGRESS_COOKIE].value, '')
+        self.assertEqual(self.client.get(reverse('conversation-step', args=[self.first.id])).status_code, 404)
+
+    def test_step_needs_a_started_conversation(self):
+        self.assertEqual(self.client.get(reverse('conversation-step', args=[self.first.id])).status_code, 404)
+        self.client.get(reverse('conversation-start', args=[self.template.id, self.assignment.id]))
+        self.client.cookies[PROGRESS_COOKIE] = self.client.cookies[PROGRESS_COOKIE].value + 'x'
+        self.assertEqual(self.client.get(reverse('conversation-step', args=[self.first.id])).status_code, 404)
+        self.assertFalse(TemplateResponse.objects.exists())
+
+    def test_refresh_keeps_the_response(self):
+        self.client.get(reverse('conversation-start', args=[self.template.id, self.assignment.id]))
+        self.client.get(reverse('conversation-step', args=[self.first.id]))
+        self.client.get(reverse('conversation-step', args=[self.first.id]))
+        self.assertEqual(TemplateResponse.objects.count(), 1)
@@ -0,0 +1,34 @@
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from conversation_templates.load_test import EMAIL_DOMAIN
+from conversation_templates.models import AudioBlob, ConversationTemplate, TemplateResponse
+from users.models import CustomUser
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class LoadTestTests(TransactionTestCase):
+    def test_report(self):
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        # The test database is the live one here. One student at a time: writers of the in-memory test database
+        # lock whole tables instead of waiting.
+        call_command('load_test', students=1, steps=3, rounds=2, recording_seconds=0.1, output=output,
+                     live_database=True)
+        with open(output) as report_file:
+            report = json.load(report_file)
+
+        self.assertEqual((report['conversations'], report['errors']), (2, 0))
+        self.assertEqual(sorted(report['endpoints']), [
+            'conversation-end GET', 'conversation-end POST', 'conversation-start GET',
+            'conversation-step GET', 'conversation-step POST', 'save-audio POST'])
+        steps = report['endpoints']['conversation-step POST']
+        self.assertEqual(steps['requests'], 2 * 3)
+        self.assertLessEqual(steps['p50_ms'], steps['p99_ms'])
+        self.assertIsNotNone(steps['queries_per_request'])
+        # The data of the run is removed afterwards
+        self.assertFalse(CustomUser.objects.filter(email__endswith=EMAIL_DOMAIN).exists())
+        self.assertFalse(ConversationTemplate.objects.exists())
+        self.assertFalse(TemplateResponse.objects.exists())
+        self.assertFalse(AudioBlob.objects.exists())
@@ -0,0 +1,220 @@
+import json
+import re
+from collections import Counter
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.load_test import make_wav
+from conversation_templates.models import *
+from users.models import Researcher, Student, Assignment, SubjectLabel
+
+# Globals
+SMALL = 2  # Rows of each kind seeded for the first measure
+LARGE = 8  # Rows of each kind after the data grew
+REDIRECTS = {'conversation-step-choice'}  # Views answering with a redirect instead of a page
+
+def compact(values):
+    # Lists the way the pages send them, with JSON.stringify, which create_assignment.decode expects
+    return json.dumps(values, separators=(',', ':'))
+
+
+# The views of simcon_project/urls.py with the most queries they may run, whatever the amount of data.
+# Each entry is (name, user, method, url, data, budget). Urls and data are built from the seeded objects; data
+# given as a string is posted as JSON. Entries run in order, so the conversation steps follow its start page.
+VIEWS = [
+    # Students
+    ('student-view', 'student', 'GET', lambda o: reverse('student-view'), None, 12),
+    ('student-settings-view', 'student', 'GET', lambda o: reverse('student-settings-view'), None, 4),
+    ('select-feedback', 'student', 'GET',
+     lambda o: reverse('feedback:select-feedback', args=[o['assignment'].id, o['template'].id]), None, 8),
+    ('view-feedback', 'student', 'GET', lambda o: reverse('feedback:view-feedback', args=[o['own_response'].id]), None, 8),
+    ('conversation-start', 'student', 'GET',
+     lambda o: reverse('conversation-start', args=[o['template'].id, o['assignment'].id]), None, 8),
+    ('conversation-step', 'student', 'GET', lambda o: reverse('conversation-step', args=[o['start_node'].id]),
+     None, 8),
+    ('save-audio', 'student', 'POST', lambda o: reverse('save-audio'),
+     lambda o: {'data': SimpleUploadedFile('blob', make_wav(0.1))}, 10),
+    ('conversation-step-choice', 'student', 'POST',
+     lambda o: reverse('conversation-step', args=[o['start_node'].id]), lambda o: {'choices': str(o['choice'].id)}, 6),
+    ('conversation-end', 'student', 'GET', lambda o: reverse('conversation-end', args=[o['own_response'].id]),
+     None, 6),
+
+    # Researchers
+    ('researcher-view', 'researcher', 'GET', lambda o: reverse('researcher-view'), None, 8),
+    ('template-management', 'researcher', 'GET', lambda o: reverse('management:main'), None, 10),
+    ('folder-view', 'researcher', 'GET', lambda o: reverse('management:folder-view', args=[o['folder'].id]), None, 12),
+    ('share-template-modal', 'researcher', 'GET',
+     lambda o: reverse('management:share-template-modal', args=[o['template'].id]), None, 6),
+    ('share-template-finalize', 'researcher', 'POST', lambda o: reverse('management:share-template-finalize'),
+     lambda o: {'pk': str(o['template'].id), 'researchers': json.dumps([o['colleague'].email])}, 16),
+    ('create-conversation-template-view', 'researcher', 'GET',
+     lambda o: reverse('management:create-conversation-template-view'), None, 6),
+    ('edit_conversation_template', 'researcher', 'GET',
+     lambda o: reverse('management:edit_conversation_template', args=[o['template'].id]), None, 12),
+    ('view-all-responses', 'researcher', 'GET', lambda o: reverse('view-all-responses', args=[o['template'].id]),
+     None, 8),
+    ('export-all-responses', 'researcher', 'GET',
+     lambda o: reverse('view-all-responses', args=[o['template'].id]) + '?_export=csv', None, 8),
+    ('student-management', 'researcher', 'GET', lambda o: reverse('student-management'), None, 10),
+    ('register-students', 'researcher', 'POST', lambda o: reverse('register-students'),
+     lambda o: {'students': json.dumps([f"new{o['round']}-{idx}@pdx.edu" for idx in range(2)])}, 12),
+    ('import-students', 'researcher', 'POST', lambda o: reverse('import-students'),
+     lambda o: {'roster': SimpleUploadedFile('roster.csv', ''.join(
+         f"imported{o['round']}-{idx}@pdx.edu,First,Last\n" for idx in range(2)).encode())}, 12),
+    ('assignment-management', 'researcher', 'GET', lambda o: reverse('ass-management:main'), None, 8),
+    ('view-settings', 'researcher', 'GET', lambda o: reverse('ass-management:view-settings', args=[o['assignment'].id]), None, 6),
+    ('view-templates', 'researcher', 'GET', lambda o: reverse('ass-management:view-templates', args=[o['assignment'].id]),
+     None, 6),
+    ('view-students', 'researcher', 'GET', lambda o: reverse('ass-management:view-students', args=[o['assignment'].id]), None, 8),
+    ('completion-heatmap', 'researcher', 'GET',
+     lambda o: reverse('ass-management:completion-heatmap', args=[o['assignment'].id]), None, 8),
+    ('create-assignment', 'researcher', 'GET', lambda o: reverse('assignments:create-assignment'), None, 8),
+    ('add-assignment', 'researcher', 'POST', lambda o: reverse('assignments:add-assignment'),
+     lambda o: {'name': f"budget assignment {o['round']}", 'assign_now': 'true', 'date': '01/01/2100 10:00 AM',
+                'stuData': compact(o['students']), 'labelData': compact([o['label'].label_name]),
+                'tempData': compact([str(o['template'].id)]), 'response_attempts': 1, 'record_attempts': 1,
+                'allow_typed_response': 'false', 'allow_self_rating': 'false'}, 20),
+    ('view-response', 'researcher', 'GET', lambda o: reverse('view-response', args=[o['response'].id]), None, 8),
+    ('edit-transcriptions', 'researcher', 'POST', lambda o: reverse('view-response', args=[o['response'].id]),
+     lambda o: json.dumps({'transcriptions': {str(node_id): f"edited {o['round']}"
+                                              for node_id in o['response'].node_responses.values_list('id', flat=True)}}),
+     18),
+    ('researcher-settings', 'researcher', 'GET', lambda o: reverse('settings:main'), None, 4),
+    ('researcher-management', 'admin', 'GET', lambda o: reverse('researcher-management'), None, 8),
+]
+
+
+def sql_shape(sql):
+    """
+    Returns a query with its values replaced by ?, so the queries of a loop look the same.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    return re.sub(r'\((\?,\s*)+\?\)', '(...)', sql)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Runs every view against a small and a larger set of data. A view may not run more queries on the larger set,
+    nor more than its budget, which catches queries made once per row.
+    """
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123",
+                                                               first_name="Rea", last_name="Searcher")
+        self.admin = Researcher.objects.create_researcher(email="admin@pdx.edu", password="abc123", is_staff=True)
+        self.colleague = Researcher.objects.create_researcher(email="colleague@pdx.edu", password="abc123")
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123",
+                                                   first_name="Stu", last_name="Dent")
+        for researcher in (self.researcher, self.admin):
+            researcher.refresh_from_db()  # Researcher.save leaves an unusable password on the instance only
+        self.folder = TemplateFolder.objects.create(name="folder", researcher=self.researcher)
+        self.label = SubjectLabel.objects.create(label_name="label", researcher=self.researcher)
+        self.seeded = 0
+        self.objects = {'folder': self.folder, 'colleague': self.colleague}
+
+    def seed(self, count):
+        """
+        Adds count templates, each with its own assignment of all the students, count more students and
+        completed responses of every student to every template.
+        """
+        for idx in range(self.seeded, self.seeded + count):
+            Student.objects.create(email=f"student{idx}@pdx.edu", first_name=f"First{idx}", last_name=f"Last{idx}")
+            template = ConversationTemplate.objects.create(name=f"template {idx}", researcher=self.researcher)
+            nodes = [TemplateNode.objects.create(description=f"step {step}", parent_template=template,
+                                                 position_in_sequence=step, start=step == 1, terminal=step == 3,
+                                                 video_url="https://www.youtube.com/watch?v=x")
+                     for step in (1, 2, 3)]
+            for node, destination in zip(nodes, nodes[1:]):
+                TemplateNodeChoice.objects.create(choice_text="next", parent_template_node=node,
+                                                  destination_node=destination)
+            self.folder.templates.add(template)
+            assignment = Assignment.objects.create(name=f"assignment {idx}", date_assigned=timezone.now(),
+                                                   researcher=self.researcher, response_attempts=10)
+            assignment.conversation_templates.add(template)
+            assignment.subject_labels.add(self.label)
+        self.seeded += count
+
+        students = list(Student.objects.all())
+        self.label.students.set(students)
+        # Registered the way register-students does, so its posts do not change what the student pages list
+        self.researcher.students.set(students)
+        SubjectLabel.objects.get(label_name='All Students', researcher=self.researcher).students.set(students)
+        for assignment in Assignment.objects.filter(researcher=self.researcher):
+            assignment.students.set(students)
+            template = assignment.conversation_templates.get()
+            nodes = list(template.template_nodes.order_by('position_in_sequence'))
+            for student in students:
+                if TemplateResponse.objects.filter(student=student, assignment=assignment).exists():
+                    continue
+                response = TemplateResponse.objects.create(student=student, template=template, assignment=assignment,
+                                                           completion_date=timezone.now(), self_rating=3)
+                for node in nodes:
+                    TemplateNodeResponse.objects.create(parent_template_response=response, template_node=node,
+                                                        selected_choice=None, transcription=f"said {node.description}",
+                                                        position_in_sequence=node.position_in_sequence,
+                                                        audio_response=f"audio/{response.id}/{node.id}.wav",
+                                                        custom_response="bye" if node.terminal else None)
+
+        assignment = Assignment.objects.filter(researcher=self.researcher).order_by('name').first()
+        template = assignment.conversation_templates.get()
+        start_node = template.template_nodes.get(start=True)
+        self.objects.update({
+            'assignment': assignment,
+            'template': template,
+            'start_node': start_node,
+            'choice': start_node.choices.get(),
+            'response': TemplateResponse.objects.filter(assignment=assignment).first(),
+            'own_response': TemplateResponse.objects.filter(assignment=assignment, student=self.student).first(),
+            'students': [student.email for student in students],
+            'label': self.label,
+        })
+
+    def measure(self):
+        """
+        Returns the queries of every view, by name.
+        """
+        queries = {}
+        users = {'student': self.student, 'researcher': self.researcher, 'admin': self.admin}
+        self.objects['round'] = self.objects.get('round', 0) + 1  # Posts create new names every measure
+        for name, user, method, url, data, budget in VIEWS:
+            self.client.force_login(users[user])
+            cache.clear()  # Measure the pages as they are built, not as they are cached
+            with CaptureQueriesContext(connection) as captured:
+                if method == 'GET':
+                    response = self.client.get(url(self.objects))
+                elif isinstance(data(self.objects), str):
+                    response = self.client.post(url(self.objects), data(self.objects), content_type='application/json')
+                else:
+                    response = self.client.post(url(self.objects), data(self.objects))
+                if response.streaming:
+                    b''.join(response.streaming_content)  # Streamed downloads query while they are read
+            self.assertEqual(response.status_code, 302 if name in REDIRECTS else 200, name)
+            queries[name] = [query['sql'] for query in captured
+                             if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+        return queries
+
+    def describe(self, queries):
+        # The distinct queries, most repeated first
+        shapes = Counter(sql_shape(sql) for sql in queries)
+        return '\n'.join(f"{count} x {shape}" for shape, count in shapes.most_common())
+
+    def test_queries_do_not_grow_with_data(self):
+        self.seed(SMALL)
+        small = self.measure()
+        self.seed(LARGE - SMALL)
+        large = self.measure()
+        # The posts did their work, rather than stopping at a validation error
+        for idx in (1, 2):
+            self.assertTrue(Assignment.objects.filter(name=f"budget assignment {idx}").exists())
+            self.assertEqual(Student.objects.filter(email__in=[f"new{idx}-0@pdx.edu", f"imported{idx}-0@pdx.edu"])
+                             .count(), 2)
+        for name, user, method, url, data, budget in VIEWS:
+            with self.subTest(view=name):
+                self.assertLessEqual(len(large[name]), len(small[name]),
+                                     f"{name} ran more queries with more data:\n{self.describe(large[name])}")
+                self.assertLessEqual(len(large[name]), budget,
+                                     f"{name} ran more queries than its budget:\n{self.describe(large[name])}")
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.response_detail import node_responses_in_order
+from conversation_templates.response_matrix import matrix_rows
+from users.models import Researcher, Student, Assignment
+
+
+@contextmanager
+def planner_prefers_indexes():
+    """
+    The tables of a test are tiny, so PostgreSQL would scan them whatever indexes exist. Turning sequential
+    scans off makes it show the index it would use on a real table. SQLite plans without table statistics.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Checks that the hot queries of the student and researcher pages are answered from their indexes.
+    """
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", researcher=self.researcher)
+        self.assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                                    researcher=self.researcher)
+        self.response = TemplateResponse.objects.create(student=self.student, template=self.template,
+                                                        assignment=self.assignment, completion_date=timezone.now())
+
+    def assertUsesIndex(self, queryset, index_name, sorted_by_index=False):
+        with planner_prefers_indexes():
+            plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if sorted_by_index:
+            # SQLite says "USE TEMP B-TREE FOR ORDER BY" and PostgreSQL adds a Sort node when it sorts rows
+            self.assertNotIn('TEMP B-TREE', plan)
+            self.assertNotIn('Sort', plan)
+
+    def test_attempts_of_a_student(self):
+        self.assertUsesIndex(TemplateResponse.objects.filter(student_id=self.student.id, template=self.template,
+                                                             assignment=self.assignment),
+                             'response_attempts_idx')
+
+    def test_all_responses_of_a_template(self):
+        self.assertUsesIndex(matrix_rows(self.template), 'matrix_row_completion_idx', sorted_by_index=True)
+
+    def test_visible_responses_of_a_researcher(self):
+        responses = TemplateResponse.objects.filter(template__researcher__email=self.researcher.email,
+                                                    archived=False, hidden=False)
+        self.assertUsesIndex(responses, 'response_visible_idx')
+
+    def test_active_templates_of_a_researcher(self):
+        self.assertUsesIndex(ConversationTemplate.objects.filter(researcher=self.researcher.id, archived=False),
+                             'template_active_idx')
+
+    def test_node_responses_in_order(self):
+        self.assertUsesIndex(node_responses_in_order(self.response), 'node_response_order_idx', sorted_by_index=True)
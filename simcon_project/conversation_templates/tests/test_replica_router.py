@@ -0,0 +1,93 @@
+import json
+from django.core.cache import cache
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from simcon_project.replica import STICKY_COOKIE, ReplicaMiddleware, analytics_view, reading_replica
+from users.assignment_completion import cache_key, get_completion_matrix
+from users.models import Researcher, Student, Assignment
+
+# Globals
+REPLICA = 'test_replica'  # Declared in simcon_project/test_settings.py
+
+
+def replicate():
+    """
+    Copies the primary database into the replica file. Anything written afterwards is replication lag.
+    """
+    for alias in ('default', REPLICA):
+        connections[alias].ensure_connection()
+    connections['default'].connection.backup(connections[REPLICA].connection)
+
+
+@override_settings(REPLICA_DATABASE=REPLICA)
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Runs against two SQLite databases: the test database as the primary and a copy of it as the replica.
+    """
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", researcher=self.researcher)
+        self.assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                                    researcher=self.researcher)
+        self.add_response()
+        replicate()
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def add_response(self):
+        return TemplateResponse.objects.create(student=self.student, template=self.template,
+                                               assignment=self.assignment, completion_date=timezone.now())
+
+    def visible_responses(self):
+        response = self.client.get(reverse('researcher-view'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        return len(response.context['responseTable'].rows)
+
+    def test_analytics_view_reads_the_replica(self):
+        self.assertEqual(self.visible_responses(), 1)
+        lagging = self.add_response()
+        self.assertEqual(self.visible_responses(), 1)
+        # Other views read the primary
+        self.assertEqual(self.client.get(reverse('view-response', args=[lagging.id])).status_code, 200)
+        replicate()
+        self.assertEqual(self.visible_responses(), 2)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        lagging = self.add_response()
+        response = self.client.post(reverse('view-response', args=[lagging.id]),
+                                    json.dumps({'transcriptions': {}}), content_type='application/json')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+        self.assertEqual(self.visible_responses(), 2)
+        # Once the window is over the replica serves the page again
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertEqual(self.visible_responses(), 1)
+
+    def test_streamed_download_reads_the_replica(self):
+        self.add_response()
+
+        @analytics_view
+        def download(request):
+            rows = (str(response_id) for response_id in TemplateResponse.objects.values_list('id', flat=True))
+            return StreamingHttpResponse(rows)
+
+        response = ReplicaMiddleware(download)(RequestFactory().get('/'))
+        self.assertEqual(len([row for row in response.streaming_content]), 1)
+
+    def test_completion_matrix_is_cached_from_the_primary(self):
+        cache.clear()
+        self.assignment.students.add(self.student)
+        self.assignment.conversation_templates.add(self.template)
+        self.visible_responses()  # Requests end with the pin of the writes above cleared
+        with reading_replica():
+            self.assertEqual(get_completion_matrix(self.assignment.id)['students'], [])
+        self.assertIsNone(cache.get(cache_key(self.assignment.id)))
+        # The students modal reads the primary, so it sees the student the replica does not have yet
+        response = self.client.get(reverse('ass-management:view-students', args=[self.assignment.id]))
+        self.assertEqual(len(response.context['table'].rows), 1)
+        self.assertEqual(len(cache.get(cache_key(self.assignment.id))['students']), 1)
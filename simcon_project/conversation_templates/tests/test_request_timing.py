@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import time
+from unittest import skipUnless
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.backends.django import Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from simcon_project.timing import RequestTiming, RequestTimingMiddleware, percentile, request_timings
+from users.models import Researcher, Student, Assignment
+
+# Globals
+REQUESTS = 2000  # Calls timed for the overhead benchmark
+SAMPLE_RATE = 0.1  # The default of settings.REQUEST_TIMING_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        request_timings.reset()
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.admin = Researcher.objects.create_researcher(email="admin@pdx.edu", password="abc123", is_staff=True)
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        template = ConversationTemplate.objects.create(name="template", researcher=self.researcher)
+        assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                               researcher=self.researcher)
+        TemplateResponse.objects.create(student=self.student, template=template, assignment=assignment,
+                                        completion_date=timezone.now())
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def metrics(self, response):
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_sampled_request(self):
+        self.client.login(email="admin@pdx.edu", password="abc123")
+        response = self.client.get(reverse('researcher-view'))
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics), {'total', 'sql', 'template', 'bytes'})
+        self.assertEqual(metrics['bytes']['desc'], f'"{len(response.content)}"')
+        self.assertGreater(float(metrics['template']['dur']), 0)
+
+        summary = request_timings.summary()['researcher-view']
+        self.assertEqual(summary['samples'], 1)
+        self.assertEqual(f'"{summary["queries"]["p50"]} queries"', metrics['sql']['desc'])
+        self.assertEqual(summary['bytes']['p99'], len(response.content))
+        self.assertLessEqual(summary['sql_ms']['p50'], summary['wall_ms']['p50'])
+
+    def test_details_for_staff_or_debug(self):
+        response = self.client.get(reverse('researcher-view'))
+        self.assertEqual(set(self.metrics(response)), {'total'})
+        self.assertEqual(request_timings.summary()['researcher-view']['samples'], 1)
+        with self.settings(DEBUG=True):
+            response = self.client.get(reverse('researcher-view'))
+        self.assertEqual(set(self.metrics(response)), {'total', 'sql', 'template', 'bytes'})
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_request(self):
+        response = self.client.get(reverse('researcher-view'))
+        self.assertEqual(set(self.metrics(response)), {'total'})
+        self.assertEqual(request_timings.summary(), {})
+
+    def test_streamed_response(self):
+        def download(request):
+            return StreamingHttpResponse(str(response.id) for response in TemplateResponse.objects.all())
+
+        request = RequestFactory().get('/')
+        request.resolver_match = type('Match', (), {'view_name': 'download'})
+        request.user = self.admin
+        response = RequestTimingMiddleware(download)(request)
+        self.assertEqual(set(self.metrics(response)), {'total', 'sql', 'template'})
+        body = b''.join(response.streaming_content)
+        summary = request_timings.summary()['download']
+        self.assertEqual((summary['queries']['p50'], summary['bytes']['p50']), (1, len(body)))
+
+    def test_timings_page_is_for_admins(self):
+        self.client.get(reverse('researcher-view'))
+        self.assertEqual(self.client.get(reverse('request-timings')).status_code, 302)
+        self.client.login(email="admin@pdx.edu", password="abc123")
+        timings = json.loads(self.client.get(reverse('request-timings')).content)
+        self.assertEqual(timings['views']['researcher-view']['samples'], 1)
+        self.assertEqual(set(timings['views']['researcher-view']['wall_ms']), {'p50', 'p95', 'p99'})
+
+    def test_templates_timed_once_middleware_loaded(self):
+        RequestTimingMiddleware(lambda request: HttpResponse())
+        render = Template.render
+        self.assertTrue(getattr(render, 'timed', False))
+        # Loading the middleware again, as every test client does, leaves the timed render as it is
+        RequestTimingMiddleware(lambda request: HttpResponse())
+        self.assertIs(Template.render, render)
+
+    def test_percentile(self):
+        self.assertEqual([percentile(list(range(1, 101)), percent) for percent in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertIsNone(percentile([], 50))
+
+    @skipUnless(os.environ.get('SIMCON_BENCHMARKS'), "Set SIMCON_BENCHMARKS=1 to run the timing benchmarks")
+    def test_overhead(self):
+        """
+        The cost of the middleware per request at a 10% sample rate, against the median time of a page.
+        Measures wall time, so it only runs when asked for, on a machine that is otherwise idle.
+        """
+        self.client.login(email="admin@pdx.edu", password="abc123")
+        page = []
+        for idx in range(20):
+            start = time.perf_counter()
+            sampled = self.client.get(reverse('researcher-view'))
+            page.append(time.perf_counter() - start)
+        queries = int(self.metrics(sampled)['sql']['desc'].strip('"').split()[0])
+
+        response = HttpResponse(b'x' * 1000)
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        costs = {}
+        for rate in (0.0, 1.0):
+            with self.settings(REQUEST_TIMING_SAMPLE_RATE=rate):
+                middleware = RequestTimingMiddleware(lambda request: response)
+                start = time.perf_counter()
+                for idx in range(REQUESTS):
+                    middleware(request)
+                costs[rate] = (time.perf_counter() - start) / REQUESTS
+        # Sampled requests also pay for the wrapper around each of their queries
+        timing = RequestTiming()
+        start = time.perf_counter()
+        for idx in range(REQUESTS):
+            timing(lambda sql, params, many, context: None, 'SELECT 1', (), False, {})
+        per_query = (time.perf_counter() - start) / REQUESTS
+
+        sampled_extra = costs[1.0] - costs[0.0] + queries * per_query
+        share = (costs[0.0] + SAMPLE_RATE * sampled_extra) / percentile(page, 50)
+        logger.info("request timing: %.1f us unsampled, %.1f us more sampled (%d queries), %.3f%% of a page at "
+                    "%d%% sampling", costs[0.0] * 1e6, sampled_extra * 1e6, queries, share * 100, SAMPLE_RATE * 100)
+        self.assertLess(share, 0.01)
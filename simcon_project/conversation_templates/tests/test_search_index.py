@@ -0,0 +1,74 @@
+import io
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.search_index import response_index
+from users.models import Researcher, Student, Assignment, SubjectLabel
+
+
+class ResponseSearchTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.alice = Student.objects.create_user(email="alice@pdx.edu", password="abc123",
+                                                 first_name="Alice", last_name="Jones")
+        self.bob = Student.objects.create_user(email="bob@pdx.edu", password="abc123",
+                                               first_name="Bob", last_name="Smith")
+        self.template = ConversationTemplate.objects.create(name="Interview", researcher=self.researcher)
+        self.assignment = Assignment.objects.create(name="Week one", date_assigned=timezone.now(),
+                                                    researcher=self.researcher)
+        self.label = SubjectLabel().create_label("Biology", self.researcher)
+        self.assignment.subject_labels.add(self.label)
+        self.alice_response = TemplateResponse.objects.create(student=self.alice, template=self.template,
+                                                              assignment=self.assignment)
+        self.bob_response = TemplateResponse.objects.create(student=self.bob, template=self.template,
+                                                            assignment=self.assignment)
+
+    def search(self, query):
+        return set(response_index.search(TemplateResponse.objects.all(), query).values_list('id', flat=True))
+
+    def test_prefix_match_on_all_terms(self):
+        both = {self.alice_response.id, self.bob_response.id}
+        self.assertEqual(self.search("ali"), {self.alice_response.id})
+        self.assertEqual(self.search("interv biol"), both)
+        self.assertEqual(self.search("week smi"), {self.bob_response.id})
+        self.assertEqual(self.search("alice smith"), set())
+        self.assertEqual(self.search('"; DROP'), set())
+
+    def test_index_follows_changes(self):
+        self.bob.first_name = "Robert"
+        self.bob.save()
+        self.assertEqual(self.search("robert"), {self.bob_response.id})
+
+        self.label.label_name = "Chemistry"
+        self.label.save()
+        self.assertEqual(len(self.search("chem")), 2)
+        self.assertEqual(self.search("biology"), set())
+
+        self.template.name = "Debate"
+        self.template.save()
+        self.assertEqual(len(self.search("debate")), 2)
+
+        self.assignment.subject_labels.remove(self.label)
+        self.assertEqual(self.search("chem"), set())
+
+        self.bob_response.delete()
+        self.assertEqual(self.search("robert"), set())
+
+    def test_rebuild_command(self):
+        response_index.clear()
+        self.assertEqual(self.search("alice"), set())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search("alice"), {self.alice_response.id})
+
+    def test_filled_on_migrate(self):
+        response_index.clear()  # As after the migration that added the index
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.search("alice"), {self.alice_response.id})
+
+    def test_researcher_view(self):
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+        response = self.client.get(reverse('researcher-view'), {'searchParam': 'jon biology'})
+        self.assertEqual([row.record.id for row in response.context['responseTable'].rows], [self.alice_response.id])
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from django.db import OperationalError, connections
+from django.test import TransactionTestCase
+from conversation_templates.transactions import hold_times, lock_counters, run_short_transaction, \
+    short_transaction
+
+logger = logging.getLogger(__name__)
+
+# Globals
+BENCHMARK = 'test_benchmark'  # File database declared in simcon_project/test_settings.py
+THREADS = 8
+WRITES_PER_THREAD = 100
+
+
+def counters(name):
+    return lock_counters().get(name, {'locked': 0, 'retries': 0, 'failures': 0, 'retry_wait': 0.0,
+                                      'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0})
+
+
+class SQLiteConcurrencyTests(TransactionTestCase):
+    databases = {'default', BENCHMARK}
+
+    def setUp(self):
+        with connections[BENCHMARK].cursor() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS benchmark_row (id INTEGER PRIMARY KEY, body TEXT)')
+            cursor.execute('DELETE FROM benchmark_row')
+
+    def test_connections_are_tuned(self):
+        with connections[BENCHMARK].cursor() as cursor:
+            pragmas = []
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas.append(cursor.fetchone()[0])
+        self.assertEqual(pragmas, ['wal', 1, 5000])  # 1 is NORMAL
+
+    def test_locked_writes_are_retried(self):
+        before = counters('locked_write')
+        attempts = []
+
+        def write():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'written'
+
+        self.assertEqual(run_short_transaction('locked_write', write), 'written')
+        after = counters('locked_write')
+        self.assertEqual((after['locked'] - before['locked'], after['retries'] - before['retries']), (2, 2))
+
+        def fail():
+            attempts.append(1)
+            raise OperationalError('no such table: missing')
+
+        attempts.clear()
+        with self.assertRaises(OperationalError):
+            run_short_transaction('locked_write', fail)
+        self.assertEqual(len(attempts), 1)
+
+    def test_lock_waits_are_not_hold_time(self):
+        locked = threading.Event()
+
+        def hold():
+            try:
+                with short_transaction('holder', using=BENCHMARK):
+                    locked.set()
+                    time.sleep(0.2)
+            finally:
+                connections[BENCHMARK].close()
+
+        before = counters('waiter')
+        holder = threading.Thread(target=hold)
+        holder.start()
+        locked.wait()
+        with short_transaction('waiter', using=BENCHMARK):
+            with connections[BENCHMARK].cursor() as cursor:
+                cursor.execute("INSERT INTO benchmark_row (body) VALUES ('waited')")
+        holder.join()
+
+        after = counters('waiter')
+        self.assertEqual(after['waits'] - before['waits'], 1)
+        self.assertGreater(after['wait_time'] - before['wait_time'], 0.1)
+        self.assertLess(hold_times()['waiter']['last'], 0.1)
+        self.assertGreater(hold_times()['holder']['last'], 0.2)
+
+    def test_sustained_writes_across_threads(self):
+        before = counters('benchmark')
+        errors = []
+
+        def write():
+            # Reads first like the views do, which only waits for the lock because the transaction begins
+            # as a writer
+            with connections[BENCHMARK].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM benchmark_row')
+                cursor.execute('INSERT INTO benchmark_row (body) VALUES (%s)', [str(cursor.fetchone()[0])])
+
+        def student():
+            try:
+                for idx in range(WRITES_PER_THREAD):
+                    run_short_transaction('benchmark', write, using=BENCHMARK)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections[BENCHMARK].close()
+
+        threads = [threading.Thread(target=student) for idx in range(THREADS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        self.assertEqual(errors, [])
+        with connections[BENCHMARK].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM benchmark_row')
+            self.assertEqual(cursor.fetchone()[0], THREADS * WRITES_PER_THREAD)
+        after = counters('benchmark')
+        logger.info("sqlite writes: %d threads, %.0f writes/s, %d waits, %d locked, %d retries", THREADS,
+                    THREADS * WRITES_PER_THREAD / seconds, after['waits'] - before['waits'],
+                    after['locked'] - before['locked'], after['retries'] - before['retries'])
@@ -0,0 +1,63 @@
+import json
+from django.test import TestCase
+from django.urls import reverse
+from conversation_templates.models import *
+from conversation_templates.template_cloning import clone_template
+from users.models import Researcher, OutboxMessage
+
+
+class TemplateCloningTests(TestCase):
+    def setUp(self):
+        self.owner = Researcher.objects.create_researcher(email="owner@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", description="description",
+                                                            researcher=self.owner)
+        self.add_nodes(3)
+
+    def add_nodes(self, count):
+        previous = self.template.template_nodes.order_by('-position_in_sequence').first()
+        for idx in range(count):
+            node = TemplateNode.objects.create(description=f"node {idx}", parent_template=self.template,
+                                               start=previous is None, video_url="https://www.youtube.com/watch?v=x",
+                                               position_in_sequence=self.template.template_nodes.count() + 1)
+            if previous is not None:
+                TemplateNodeChoice.objects.create(choice_text="next", parent_template_node=previous,
+                                                  destination_node=node)
+                TemplateNodeChoice.objects.create(choice_text="again", parent_template_node=previous,
+                                                  destination_node=previous)
+            previous = node
+
+    def add_researchers(self, count):
+        start = Researcher.objects.count()
+        return [Researcher.objects.create_researcher(email=f"researcher{start + idx}@pdx.edu", password="abc123").email
+                for idx in range(count)]
+
+    def test_clone_graph(self):
+        emails = self.add_researchers(2)
+        results = clone_template(self.template, emails + ["nobody@pdx.edu"])
+        self.assertEqual([result['success'] for result in results], [True, True, False])
+
+        clone = ConversationTemplate.objects.get(id=results[0]['template_id'])
+        self.assertEqual((clone.name, clone.researcher.email), ("template", emails[0]))
+        self.assertEqual(clone.template_nodes.count(), 3)
+        for choice in TemplateNodeChoice.objects.filter(parent_template_node__parent_template=clone):
+            self.assertEqual(choice.destination_node.parent_template_id, clone.id)
+        self.assertEqual(TemplateNodeChoice.objects.filter(parent_template_node__parent_template=clone).count(), 4)
+
+    def test_queries_do_not_grow_with_graph(self):
+        emails = self.add_researchers(3)
+        with self.assertNumQueries(8):
+            clone_template(self.template, emails)
+        self.add_nodes(20)
+        with self.assertNumQueries(8):
+            clone_template(self.template, emails)
+
+    def test_share_template_finalize(self):
+        emails = self.add_researchers(2)
+        self.client.login(email="owner@pdx.edu", password="abc123")
+        researchers = '[' + ','.join(f'"{email}"' for email in emails + ["nobody@pdx.edu"]) + ']'
+        response = self.client.post(reverse('management:share-template-finalize'),
+                                    {'pk': self.template.id, 'researchers': researchers})
+        self.assertEqual(json.loads(response.content)['success'], 1)
+        self.assertIn('nobody@pdx.edu', json.loads(response.content)['message'])
+        self.assertEqual(ConversationTemplate.objects.filter(name="template").count(), 3)
+        self.assertEqual(sorted(OutboxMessage.objects.values_list('recipient', flat=True)), emails)
@@ -0,0 +1,156 @@
+import csv
+import io
+from datetime import timedelta
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from conversation_templates.models import *
+from conversation_templates.response_matrix import rebuild_response_matrix, response_matrix, response_rows
+from users.models import Researcher, Student, Assignment
+
+
+class TemplateResponsesTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="test_template", researcher=self.researcher)
+        self.first = TemplateNode.objects.create(description="first", parent_template=self.template, start=True,
+                                                 position_in_sequence=1, video_url="https://www.youtube.com/watch?v=x")
+        self.last = TemplateNode.objects.create(description="last", parent_template=self.template, terminal=True,
+                                                position_in_sequence=2, video_url="https://www.youtube.com/watch?v=x")
+        self.assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                                    researcher=self.researcher)
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def add_responses(self, count, custom=False):
+        for idx in range(count):
+            student = Student.objects.create_user(email=f"student{Student.objects.count()}@pdx.edu",
+                                                  password="abc123", first_name="Student", last_name=f"{idx}")
+            response = TemplateResponse.objects.create(student=student, template=self.template,
+                                                       assignment=self.assignment, self_rating=4,
+                                                       completion_date=timezone.now() - timedelta(minutes=idx))
+            TemplateNodeResponse.objects.create(parent_template_response=response, template_node=self.first,
+                                                selected_choice=None, position_in_sequence=1,
+                                                transcription=f"hello {idx}")
+            TemplateNodeResponse.objects.create(parent_template_response=response, template_node=self.last,
+                                                selected_choice=None, position_in_sequence=2,
+                                                transcription=f"goodbye {idx}",
+                                                custom_response="goodbye" if custom else None)
+        rebuild_response_matrix(self.template)
+
+    def export(self, export_format, **params):
+        params['_export'] = export_format
+        return self.client.get(reverse('view-all-responses', args=[self.template.id]), params)
+
+    def test_response_rows_in_chunks(self):
+        self.add_responses(5)
+        rows = list(response_rows(self.template, chunk_size=2))
+        self.assertEqual([row[str(self.first.id)] for row in rows], [f"hello {idx}" for idx in range(5)])
+        self.assertEqual(rows[0]['rating'], "Satisfied")
+
+    def test_csv_export_is_streamed(self):
+        self.add_responses(3, custom=True)
+        response = self.export('csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['Assignment', 'Student name', 'Completion date', '1: first',
+                                   '2: last (Terminal)', 'Rating', 'Custom End'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1], "0 Student")
+        self.assertEqual(rows[1][4:], ["goodbye 0 (Custom Response)", "Satisfied", "True"])
+
+    def test_xlsx_export(self):
+        self.add_responses(3)
+        response = self.export('xlsx', filter='hello 2')
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], "hello 2")
+
+    def test_custom_response_is_searchable(self):
+        self.add_responses(2)
+        node_response = TemplateNodeResponse.objects.filter(template_node=self.last).first()
+        node_response.custom_response = "see you tomorrow"
+        node_response.save()
+        rebuild_response_matrix(self.template)
+        rows = response_matrix(self.template, 'tomorrow')
+        self.assertEqual([row[str(self.last.id)] for row in rows],
+                         [f"{node_response.transcription} (Custom Response)"])
+
+    def test_response_matrix_queries(self):
+        self.add_responses(2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(response_matrix(self.template)), 2)
+        self.add_responses(10)
+        with self.assertNumQueries(1):
+            rows = response_matrix(self.template)
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0][str(self.last.id)], "goodbye 0")
+
+    def test_view_queries_do_not_grow_with_responses(self):
+        url = reverse('view-all-responses', args=[self.template.id])
+        self.add_responses(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_responses(10)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['table'].rows), 12)
+        self.assertEqual(len(few), len(many))
+
+    def test_matrix_rows_follow_changes(self):
+        self.add_responses(2)
+        response = TemplateResponse.objects.get(student__last_name="0")
+        node = response.node_responses.get(position_in_sequence=1)
+
+        self.client.post(reverse('view-response', args=[response.id]),
+                         data={'transcriptions': {str(node.id): "edited"}}, content_type='application/json')
+        self.assertEqual(response.matrix_row.cells[str(self.first.id)], "edited")
+
+        self.client.post(reverse('delete-response', args=[response.id]))
+        self.assertTrue(ResponseMatrixRow.objects.get(template_response=response).hidden)
+
+        response.delete()
+        self.assertEqual(ResponseMatrixRow.objects.count(), 1)
+
+    def test_matrix_rows_follow_renames(self):
+        self.add_responses(2)
+        student = Student.objects.get(last_name="0")
+        student.last_name = "Renamed"
+        student.save()
+        self.assignment.name = "moved"
+        self.assignment.save()
+
+        rows = response_matrix(self.template, 'renamed')
+        self.assertEqual([(row['student_name'], row['assignment']) for row in rows], [("Renamed Student", "moved")])
+        self.assertEqual(len(response_matrix(self.template, 'moved')), 2)
+
+    def test_rebuild_command(self):
+        self.add_responses(3)
+        ResponseMatrixRow.objects.all().delete()
+        TemplateResponse.objects.create(student=Student.objects.first(), template=self.template,
+                                        assignment=self.assignment)
+        call_command('rebuild_response_matrix', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(len(response_matrix(self.template)), 3)
+
+    def test_filled_on_migrate(self):
+        self.add_responses(2)
+        ResponseMatrixRow.objects.all().delete()  # As after the migration that added the table
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(len(response_matrix(self.template, 'goodbye')), 2)
+
+    def test_filter_selects_rows_in_database(self):
+        self.add_responses(4)
+        with self.assertNumQueries(1):
+            rows = response_matrix(self.template, "good 3")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['highlights'], {'student_name': [[0, 1]], str(self.first.id): [[6, 7]],
+                                                 str(self.last.id): [[0, 7], [8, 9]]})
+
+        response = self.client.get(reverse('view-all-responses', args=[self.template.id]), {'filter': 'goodb'})
+        self.assertEqual(len(response.context['table'].rows), 4)
+        self.assertContains(response, '<mark>goodbye</mark> 1')
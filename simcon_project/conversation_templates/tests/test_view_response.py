@@ -0,0 +1,84 @@
+import json
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import *
+from conversation_templates.response_detail import load_node_responses, update_transcriptions
+from users.models import Researcher, Student, Assignment
+
+
+class ViewResponseTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.template = ConversationTemplate.objects.create(name="template", researcher=self.researcher)
+        assignment = Assignment.objects.create(name='assignment', date_assigned=timezone.now(),
+                                               researcher=self.researcher)
+        self.response = TemplateResponse.objects.create(student=self.student, template=self.template,
+                                                        assignment=assignment, completion_date=timezone.now())
+        self.add_nodes(3)
+
+    def add_nodes(self, count):
+        for idx in range(count):
+            position = self.response.node_responses.count() + 1
+            node = TemplateNode.objects.create(description=f"step {position}", parent_template=self.template,
+                                               position_in_sequence=position,
+                                               video_url="https://www.youtube.com/watch?v=x")
+            TemplateNodeResponse.objects.create(parent_template_response=self.response, template_node=node,
+                                                selected_choice=None, position_in_sequence=position,
+                                                transcription=f"text {position}")
+
+    def view(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('view-response', args=[self.response.id]), **kwargs)
+        return response, queries
+
+    def test_nodes_in_order(self):
+        nodes = load_node_responses(self.response)
+        self.assertEqual([node.template_node.description for node in nodes], ["step 1", "step 2", "step 3"])
+
+    def test_queries_do_not_grow_with_nodes(self):
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+        response, first = self.view()
+        self.assertEqual(len(response.context['response_nodes']), 3)
+        # The read flag is only written the first time
+        self.assertTrue(any('UPDATE' in query['sql'] for query in first))
+        self.add_nodes(10)
+        response, second = self.view()
+        self.assertEqual(len(response.context['response_nodes']), 13)
+        self.assertFalse(any('UPDATE' in query['sql'] for query in second))
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_student_reads_feedback(self):
+        TemplateResponse.objects.filter(id=self.response.id).update(feedback_read=False)
+        self.client.login(email="student@pdx.edu", password="abc123")
+        self.view()
+        self.response.refresh_from_db()
+        self.assertTrue(self.response.feedback_read)
+
+    def test_transcription_edits(self):
+        nodes = load_node_responses(self.response)
+        other = TemplateResponse.objects.create(student=self.student, template=self.template,
+                                                assignment=self.response.assignment)
+        foreign = TemplateNodeResponse.objects.create(parent_template_response=other, template_node=None,
+                                                      selected_choice=None, position_in_sequence=1,
+                                                      transcription="untouched")
+        edits = {str(nodes[0].id): "edited", str(nodes[1].id): "", str(nodes[2].id): "text 3",
+                 str(foreign.id): "edited", "not-an-id": "edited"}
+        with self.assertNumQueries(2):  # One select and one bulk update
+            self.assertEqual(update_transcriptions(self.response, edits), 1)
+        self.assertEqual([node.transcription for node in load_node_responses(self.response)],
+                         ["edited", "text 2", "text 3"])
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.transcription, "untouched")
+
+    def test_researcher_post_locks_student_edits(self):
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+        node = load_node_responses(self.response)[0]
+        self.client.post(reverse('view-response', args=[self.response.id]),
+                         json.dumps({'transcriptions': {str(node.id): "fixed"}}), content_type='application/json')
+        self.response.refresh_from_db()
+        self.assertFalse(self.response.transcription_student_editable)
+        self.assertEqual(self.response.matrix_row.cells[str(node.template_node_id)], "fixed")
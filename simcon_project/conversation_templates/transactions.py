@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+# Globals
+WRITE_ATTEMPTS = 5  # Times a short transaction runs before a lock error is raised
+RETRY_DELAY = 0.02  # Seconds, the upper bound of the random delay before the first retry. Doubles per retry
+MAX_RETRY_DELAY = 0.5  # Seconds
+LOCK_WAIT_THRESHOLD = 0.001  # Seconds. Taking a free write lock is faster, so longer waits count as waits
+
+# Per-process statistics of short write transactions, keyed by name
+_stats = {}
+_lock_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record_hold_time(name, seconds):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        stats['last'] = seconds
+    logger.debug("%s held the database for %.1f ms", name, seconds * 1000)
+
+
+def lock_entry(name):
+    return _lock_stats.setdefault(name, {'locked': 0, 'retries': 0, 'failures': 0, 'retry_wait': 0.0,
+                                         'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0})
+
+
+def record_lock(name, retried, delay=0.0):
+    with _stats_lock:
+        stats = lock_entry(name)
+        stats['locked'] += 1
+        if retried:
+            stats['retries'] += 1
+            stats['retry_wait'] += delay
+        else:
+            stats['failures'] += 1
+    if not retried:
+        logger.warning("%s gave up after the database stayed locked", name)
+
+
+def record_lock_wait(name, seconds):
+    with _stats_lock:
+        stats = lock_entry(name)
+        if seconds >= LOCK_WAIT_THRESHOLD:
+            stats['waits'] += 1
+        stats['wait_time'] += seconds
+        stats['max_wait'] = max(stats['max_wait'], seconds)
+
+
+def hold_times():
+    """
+    Returns a copy of the statistics of every named write transaction: count, total, max and last hold time
+    in seconds.
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def lock_counters():
+    """
+    Returns a copy of the lock statistics of every named write transaction: how often it waited for another
+    writer to release the database (waits), the seconds spent waiting in total and at most, how often the
+    database was still locked after the busy timeout, how often the transaction was retried, how often it
+    gave up, and the seconds spent waiting before retries.
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _lock_stats.items()}
+
+
+def tune_sqlite(connection):
+    """
+    Applies settings.SQLITE_PRAGMAS to a new SQLite connection: WAL so readers and the writer do not block
+    each other, a busy timeout so writers queue for the lock instead of failing, and so on.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        # Straight on the driver connection, so the pragmas do not show up as queries of the request
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    # "database is locked", or "database table is locked" for shared-cache databases
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+class BeginImmediately:
+    """
+    Execute wrapper that makes SQLite take the write lock when the transaction begins, and records when it got it.
+
+    SQLite starts a transaction that reads first as a reader. When another writer commits before it writes,
+    it fails at once with "database is locked" instead of waiting for the busy timeout. Taking the write
+    lock in BEGIN makes it wait its turn.
+    """
+    def __init__(self):
+        self.acquired = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql != 'BEGIN':
+            return execute(sql, params, many, context)
+        try:
+            return execute('BEGIN IMMEDIATE', params, many, context)
+        finally:
+            self.acquired = time.perf_counter()
+
+
+@contextmanager
+def short_transaction(name, using=DEFAULT_DB_ALIAS):
+    """
+    Runs a block in a transaction and records how long it waited for the write lock and how long it held the
+    database afterwards, which on SQLite is how long every other writer waits. Keep reads and rendering
+    outside the block.
+    """
+    connection = transaction.get_connection(using)
+    begin = BeginImmediately()
+    start = time.perf_counter()
+    try:
+        if connection.vendor == 'sqlite':
+            with connection.execute_wrapper(begin), transaction.atomic(using=using):
+                yield
+        else:
+            with transaction.atomic(using=using):
+                yield
+    finally:
+        # Nested in another transaction, or on other databases, the lock is not taken when the block starts
+        acquired = begin.acquired or start
+        if begin.acquired is not None:
+            record_lock_wait(name, acquired - start)
+        record_hold_time(name, time.perf_counter() - acquired)
+
+
+def run_short_transaction(name, func, using=DEFAULT_DB_ALIAS):
+    """
+    Runs func in a short transaction and returns its result. When SQLite still reports the database as locked
+    after the busy timeout, the transaction is rolled back and func runs again after a random delay, so
+    writers that collided do not collide again. func has to be safe to run again from the start.
+    Inside another transaction func runs only once, since only the outer transaction could be retried.
+    """
+    retry = not transaction.get_connection(using).in_atomic_block
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with short_transaction(name, using):
+                return func()
+        except OperationalError as error:
+            if not is_lock_error(error):
+                raise
+            if not retry or attempt == WRITE_ATTEMPTS - 1:
+                record_lock(name, retried=False)
+                raise
+            delay = random.uniform(0, min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** attempt))
+            record_lock(name, retried=True, delay=delay)
+            time.sleep(delay)
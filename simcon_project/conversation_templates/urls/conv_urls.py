@@ -6,5 +6,8 @@ urlpatterns = [
     path('step/<uuid:ct_node_id>/', conversation_step, name='conversation-step'),
     path('end/<uuid:ct_response_id>/', conversation_end, name='conversation-end'),
     path('save-audio', save_audio, name='save-audio'),
+    path('save-audio/upload/', start_audio_upload, name='start-audio-upload'),
+    path('save-audio/upload/<uuid:upload_id>/', audio_upload_chunk, name='audio-upload-chunk'),
+    path('save-audio/upload/<uuid:upload_id>/commit/', commit_audio_upload, name='commit-audio-upload'),
     path('exit', exit_conversation, name='exit-conversation'),
 ]
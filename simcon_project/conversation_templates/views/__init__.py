@@ -1,4 +1,5 @@
 from .conversation import conversation_start, conversation_step, conversation_end, exit_conversation, save_audio
+from .audio_upload import start_audio_upload, audio_upload_chunk, commit_audio_upload
 from .create_conversation_template_view import *
 from .edit_conversation_template_view import *
 from .template_management import *
@@ -0,0 +1,159 @@
+import json
+import struct
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpResponse
+from django.contrib.auth.decorators import user_passes_test
+from django.views.decorators.http import require_POST, require_http_methods
+from conversation_templates.models import AudioUpload
+from conversation_templates.conversation_progress import ConversationProgress
+from conversation_templates.views.conversation import audio_file_handle, attach_audio
+from conversation_templates.storage import audio_storage
+from users.views.student_home import is_student
+
+
+def upload_response(upload, status=200, message=''):
+    """
+    Tells the client where to resume: the index and byte offset the next chunk must have.
+    """
+    return HttpResponse(json.dumps({
+        'upload_id': str(upload.id),
+        'index': upload.next_chunk,
+        'offset': upload.received_size,
+        'message': message,
+    }), status=status, content_type='application/json')
+
+
+def error_response(message, status=400):
+    return HttpResponse(json.dumps({'message': message}), status=status, content_type='application/json')
+
+
+def read_wav_size(header):
+    """
+    Checks the RIFF header at the start of a WAV file and returns the total file size it declares.
+    Raises ValueError if the data does not start like a WAV file.
+    """
+    if len(header) < 16 or header[0:4] != b'RIFF' or header[8:12] != b'WAVE' or header[12:16] != b'fmt ':
+        raise ValueError('Audio must be a WAV file.')
+    return struct.unpack('<I', header[4:8])[0] + 8
+
+
+def get_upload(request, upload_id, lock=False):
+    """
+    Returns the upload if it belongs to the conversation in progress, else None.
+    """
+    progress = ConversationProgress.load(request)
+    if progress is None or progress.response_id is None:
+        return None
+    uploads = AudioUpload.objects.filter(id=upload_id, template_response_id=progress.response_id)
+    if lock:
+        uploads = uploads.select_for_update()
+    return uploads.first()
+
+
+def discard_upload(upload):
+    default_storage.delete(upload.file_path)
+    upload.delete()
+
+
+@require_POST
+@user_passes_test(is_student)
+def start_audio_upload(request):
+    """
+    Starts a chunked upload of an audio response for the current step.
+    Any earlier upload for the same conversation that was never committed is discarded.
+    """
+    progress = ConversationProgress.load(request)
+    if progress is None or progress.response_id is None:
+        return error_response('No conversation in progress.', status=404)
+    ct_response_id = progress.response_id
+
+    for upload in AudioUpload.objects.filter(template_response_id=ct_response_id):
+        discard_upload(upload)
+
+    file_path = default_storage.save(audio_file_handle(request), ContentFile(b''))
+    upload = AudioUpload.objects.create(template_response_id=ct_response_id, file_path=file_path)
+    return upload_response(upload, status=201)
+
+
+@require_http_methods(['GET', 'POST'])
+@user_passes_test(is_student)
+def audio_upload_chunk(request, upload_id):
+    """
+    GET returns the index and offset to resume the upload from.
+    POST appends one chunk. The chunk must have the expected index and offset; a chunk that was already
+    received is acknowledged without being written again, so clients can safely retry.
+    The first chunk must hold the WAV header, which declares the size of the whole file.
+    """
+    if request.method == 'GET':
+        upload = get_upload(request, upload_id)
+        if upload is None:
+            return error_response('Upload does not exist.', status=404)
+        return upload_response(upload)
+
+    data = request.FILES.get('data')
+    try:
+        index = int(request.POST.get('index'))
+        offset = int(request.POST.get('offset'))
+    except (TypeError, ValueError):
+        return error_response('Chunk index and offset are required.')
+    if data is None:
+        return error_response('Chunk has no data.')
+
+    with transaction.atomic():
+        upload = get_upload(request, upload_id, lock=True)
+        if upload is None:
+            return error_response('Upload does not exist.', status=404)
+
+        # Retry of a chunk that has already been stored
+        if index < upload.next_chunk and offset + data.size <= upload.received_size:
+            return upload_response(upload)
+        if index != upload.next_chunk or offset != upload.received_size:
+            return upload_response(upload, status=409, message='Chunk out of order.')
+
+        chunk = data.read()
+        if offset == 0:
+            try:
+                upload.expected_size = read_wav_size(chunk)
+            except ValueError as error:
+                return upload_response(upload, status=400, message=str(error))
+            if upload.expected_size > settings.AUDIO_UPLOAD_MAX_SIZE:
+                return upload_response(upload, status=413, message='Recording is too large.')
+        if upload.received_size + len(chunk) > upload.expected_size:
+            return upload_response(upload, status=400, message='Chunk goes past the end of the recording.')
+
+        with default_storage.open(upload.file_path, 'ab') as audio_file:
+            # Drop anything left over from a write whose bookkeeping never got saved
+            audio_file.truncate(upload.received_size)
+            audio_file.write(chunk)
+        upload.received_size += len(chunk)
+        upload.next_chunk += 1
+        upload.save(update_fields=['expected_size', 'received_size', 'next_chunk'])
+    return upload_response(upload)
+
+
+@require_POST
+@user_passes_test(is_student)
+def commit_audio_upload(request, upload_id):
+    """
+    Attaches a fully received upload to the node response of the current step.
+    Returns the url of the audio file like save_audio does.
+    """
+    with transaction.atomic():
+        upload = get_upload(request, upload_id, lock=True)
+        if upload is None:
+            return error_response('Upload does not exist.', status=404)
+        if not upload.complete:
+            return upload_response(upload, status=409, message='Upload is not complete.')
+        if default_storage.size(upload.file_path) != upload.expected_size:
+            discard_upload(upload)
+            return error_response('Stored recording is damaged, please record again.')
+
+        # Move the finished recording into the audio store, where identical recordings share one file
+        with default_storage.open(upload.file_path, 'rb') as audio_file:
+            audio_path = audio_storage.save(upload.file_path, audio_file)
+        ct_node_response = attach_audio(request, audio_path)
+        discard_upload(upload)
+    return HttpResponse(ct_node_response.audio_response.url)
@@ -1,13 +1,21 @@
 import os
 import django_tables2 as tables
-import secrets
-from django.core.files.storage import default_storage
 from django.shortcuts import render, redirect
 from django.utils import timezone
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseNotFound, HttpResponse
-from conversation_templates.models import ConversationTemplate, TemplateNode, TemplateNodeResponse, TemplateResponse
+from conversation_templates.models import TemplateNodeResponse, TemplateResponse
 from conversation_templates.forms import TemplateNodeChoiceForm
-from users.models import Student, Assignment
+from conversation_templates.conversation_graph import get_graph, get_graph_for_node
+from conversation_templates.audio_transcoding import enqueue_transcode
+from conversation_templates.conversation_progress import ConversationProgress
+from conversation_templates.storage import audio_storage
+from conversation_templates.response_matrix import refresh_matrix_rows
+from conversation_templates.transactions import run_short_transaction
+from users.models import Assignment
+from users.student_dashboard import invalidate_dashboards
+from users.assignment_completion import invalidate_completion_matrix
 from django.contrib.auth.decorators import user_passes_test
 from users.views.student_home import is_student
 
@@ -23,43 +31,12 @@ class NodeDescriptionTable(tables.Table):
     description = tables.Column(accessor='template_node__description')
 
 
-def if_visited(request, ct_node_id):
-    page_dict = request.session.get('page_dict')
-    if not page_dict:
-        return False
-    if page_dict.get(str(ct_node_id)):
-        return True
-    return False
-
-
-def get_node_response(request, ct_node_id):
-    page_dict = request.session.get('page_dict')
-    return TemplateNodeResponse.objects.get(id=page_dict.get(str(ct_node_id)))
-
-
-# Tracks completed node responses
-def store_node_response(request, ct_node_id, ct_node_response_id):
-    page_dict = request.session.get('page_dict')
-    page_dict.update({str(ct_node_id): str(ct_node_response_id)})
-    request.session.modified = True
-
-
-# Clear things from past user session
-def flush_session_data(request):
-    if 'page_dict' in request.session:
-        del request.session['page_dict']
-    if 'ct_response_id' in request.session:
-        del request.session['ct_response_id']
-    if 'ct_node_response_id' in request.session:
-        del request.session['ct_node_response_id']
-    if 'validation_key' in request.session:
-        del request.session['validation_key']
-    request.session.modified = True
-
-
 def check_page_authorization(request):
-    if request.session.get('validation_key') is None:
-        return HttpResponseNotFound('<h1>Access Denied</h1>')
+    """
+    Returns the progress of the conversation in progress, or None if the student did not start one from the
+    start page (for example because they copy pasted an old conversation link).
+    """
+    return ConversationProgress.load(request)
 
 
 @user_passes_test(is_student)
@@ -69,31 +46,26 @@ def conversation_start(request, ct_id, assign_id):
     """
     # Check if user has retries
     assignment = Assignment.objects.get(id=assign_id)
-    ct = ConversationTemplate.objects.get(id=ct_id)
-    student = Student.objects.get(email=request.user.email)
-    student_attempts = TemplateResponse.objects.filter(student=student, template=ct, assignment=assignment).count()
+    graph = get_graph(ct_id)
+    ct = graph.template
+    student_attempts = TemplateResponse.objects.filter(student_id=request.user.id, template=ct,
+                                                       assignment=assignment).count()
     if student_attempts >= assignment.response_attempts:
         return HttpResponseNotFound('<h1>Sorry, maximum number of attempts reached for this conversation.</h1>')
 
     # Else, set up conversation
     ctx = {}
     t = '{}/conversation_start.html'.format(ct_templates_dir)
-    ct_start_node = TemplateNode.objects.get(parent_template=ct, start=True)
-
-    # Clear existing session data leftover from incomplete response
-    flush_session_data(request)
-    request.session['assign_id'] = assign_id
-    request.session['page_dict'] = {}
-    request.session['validation_key'] = secrets.token_hex(8)
-    request.session['allow_typed_response'] = assignment.allow_typed_response
-    request.session['allow_self_rating'] = assignment.allow_self_rating
-    request.session['recording_attempts'] = assignment.recording_attempts
-    request.session.modified = True
+    ct_start_node = graph.get_start_node()
+
     ctx.update({
         'ct': ct,
         'ct_start_node': ct_start_node,
     })
-    return render(request, t, ctx)
+    response = render(request, t, ctx)
+    # Replaces any progress leftover from an incomplete response
+    ConversationProgress.start(request, assignment).save(response)
+    return response
 
 
 @user_passes_test(is_student)
@@ -103,35 +75,40 @@ def conversation_step(request, ct_node_id):
     and select a choice.
     """
     # Check to make sure student didn't copy paste old conversation link
-    check_page_authorization(request)
+    progress = check_page_authorization(request)
+    if progress is None:
+        return HttpResponseNotFound('<h1>Access Denied</h1>')
 
     # Else, set up TemplateNode data
     ctx = {}
     t = '{}/conversation_step.html'.format(ct_templates_dir)
-    ct_node = TemplateNode.objects.get(id=ct_node_id)
-    ct = ct_node.parent_template
-    ct_node_response = TemplateNodeResponse.objects.filter(id=request.session.get('ct_node_response_id')).first()
-    allow_typed_response = request.session['allow_typed_response']
-    recording_attempts = request.session['recording_attempts']
+    graph = get_graph_for_node(ct_node_id)
+    ct_node = graph.get_node(ct_node_id)
+    ct = graph.template
+    allow_typed_response = progress.allow_typed_response
+    recording_attempts = progress.recording_attempts
 
-    # Check if page has already been completed
-    if if_visited(request, ct_node_id):
-        ct_node_response = get_node_response(request, ct_node_id)
+    # Check if page has already been completed, else use the recording for this step if there is one
+    ct_node_response = progress.visited_node_response(ct_node_id) or progress.pending_node_response()
 
     # POST request
     if request.method == 'POST':
-        ct_response = TemplateResponse.objects.filter(id=request.session.get('ct_response_id')).first()
-        if not ct_response:
+        if progress.response_id is None:
             # For debugging, will remove once in production
             return HttpResponseNotFound('<h1>Conversation Template Response does not exist for current session</h1>')
+        if ct_node_response is None:
+            return HttpResponseNotFound('<h1>No response was recorded for this step</h1>')
 
-        choice = ct_node_response.selected_choice
+        choice = None
+        if ct_node_response.selected_choice_id is not None:
+            choice = graph.get_choice(ct_node.id, ct_node_response.selected_choice_id)
         # Check if user has not submitted a choice yet
-        if not choice:
+        if not choice and ct_node_response.template_node_id is None:
             choice_form = TemplateNodeChoiceForm(
                 request.POST,
                 ct_node=ct_node,
-                allow_typed_response=allow_typed_response
+                allow_typed_response=allow_typed_response,
+                graph=graph
             )
             if choice_form.is_valid():
                 if request.POST.get('choices') == 'custom-response':
@@ -140,36 +117,32 @@ def conversation_step(request, ct_node_id):
                     custom_response = None
                     choice = choice_form.cleaned_data['choices']
 
-                # Edit node response to add remaining fields
+                # Edit node response to add remaining fields, which also marks the step as completed
                 ct_node_response.template_node = ct_node
                 ct_node_response.selected_choice = choice
                 ct_node_response.custom_response = custom_response
-                ct_node_response.save()
-
-                # Persist that node response id
-                store_node_response(request, ct_node_id, ct_node_response.id)
-                del request.session['ct_node_response_id']
-                request.session.modified = True
+                ct_node_response.save(update_fields=['template_node', 'selected_choice', 'custom_response'])
             else:
                 # For debugging, will be removed or changed before deploying to production
                 return HttpResponseNotFound('<h1>An invalid choice was selected</h1>')
 
         # End conversation or go to next node
-        if ct_node.terminal or choice is None or choice.destination_node is None:
-            return redirect('conversation-end', ct_response_id=ct_response.id)
-        return redirect('conversation-step', ct_node_id=choice.destination_node.id)
+        if ct_node.terminal or choice is None or choice.destination_node_id is None:
+            return redirect('conversation-end', ct_response_id=progress.response_id)
+        return redirect('conversation-step', ct_node_id=choice.destination_node_id)
 
     # GET request
     # Check for page refresh
-    if ct_node.start and request.session.get('ct_response_id') is None:
+    created = False
+    if ct_node.start and progress.response_id is None:
         ct_response = TemplateResponse.objects.create(
-            student=Student.objects.get(email=request.user.email),
+            student_id=request.user.id,
             template=ct,
-            assignment=Assignment.objects.get(id=request.session.get('assign_id')),
+            assignment_id=progress.assignment_id,
         )
-        request.session['ct_response_id'] = str(ct_response.id)  # persist the template response in the session
-        request.session.modified = True
-    choice_form = TemplateNodeChoiceForm(ct_node=ct_node, allow_typed_response=allow_typed_response)
+        progress.response_id = str(ct_response.id)  # persist the template response in the progress cookie
+        created = True
+    choice_form = TemplateNodeChoiceForm(ct_node=ct_node, allow_typed_response=allow_typed_response, graph=graph)
 
     ctx.update({
         'ct': ct,
@@ -179,32 +152,57 @@ def conversation_step(request, ct_node_id):
         'allow_typed_response': allow_typed_response,
         'recording_attempts': recording_attempts,
     })
-    return render(request, t, ctx)
+    response = render(request, t, ctx)
+    if created:
+        progress.save(response)
+    return response
 
 
-def save_audio(request):
-    data = request.FILES.get('data')
+def audio_file_handle(request):
+    """
+    Returns the name a new audio response for the current user is saved under. The audio store keeps only
+    its extension, but uploads in progress are written to the media root under this name.
+    """
     file_handle = str(timezone.now())
     file_handle = file_handle.replace(':', '-') + '.wav'
-    file_handle = os.path.join('audio', str(request.user), file_handle)  # Create full file handle
-    audio_path = default_storage.save(file_handle, data)  # Store audio in media root
-    ct_response = TemplateResponse.objects.get(id=request.session.get('ct_response_id'))
-    ct_node_response = None
+    return os.path.join('audio', str(request.user), file_handle)  # Create full file handle
+
+
+def attach_audio(request, audio_path):
+    """
+    Attaches a stored audio file to the node response of the current step, creating the node response if the
+    student has not recorded anything for this step yet. Queues the file to be converted to a compact format.
+    Returns None if no conversation is in progress.
+    """
+    progress = ConversationProgress.load(request)
+    if progress is None or progress.response_id is None:
+        return None
 
     # Check if node response already exists
-    if request.session.get('ct_node_response_id') is None:
+    ct_node_response = progress.pending_node_response()
+    if ct_node_response is None:
         ct_node_response = TemplateNodeResponse.objects.create(
             template_node=None,
-            parent_template_response=ct_response,
+            parent_template_response_id=progress.response_id,
             selected_choice=None,
-            position_in_sequence=ct_response.node_responses.count() + 1,
+            position_in_sequence=TemplateNodeResponse.objects.filter(
+                parent_template_response_id=progress.response_id).count() + 1,
             audio_response=audio_path
         )
-        request.session['ct_node_response_id'] = ct_node_response.id
     else:
-        ct_node_response = TemplateNodeResponse.objects.get(id=request.session.get('ct_node_response_id'))
         ct_node_response.audio_response = audio_path
-        ct_node_response.save()
+        ct_node_response.save(update_fields=['audio_response'])
+    enqueue_transcode(ct_node_response)
+    return ct_node_response
+
+
+def save_audio(request):
+    data = request.FILES.get('data')
+    audio_path = audio_storage.save(audio_file_handle(request), data)  # Store audio in the audio store
+    ct_node_response = run_short_transaction('save_audio', lambda: attach_audio(request, audio_path))
+    if ct_node_response is None:
+        # The stored blob is left to collect_unreferenced_blobs, identical recordings may share it
+        return HttpResponseNotFound('<h1>No conversation in progress</h1>')
     return HttpResponse(ct_node_response.audio_response.url)
 
 
@@ -212,41 +210,43 @@ def save_audio(request):
 def conversation_end(request, ct_response_id):
     ctx = {}
     t = '{}/conversation_end.html'.format(ct_templates_dir)
-    ct_response = TemplateResponse.objects.get(id=ct_response_id)
+    ct_response = TemplateResponse.objects.select_related('template', 'assignment').get(id=ct_response_id)
     ct = ct_response.template
-    assignment = Assignment.objects.get(id=request.session.get('assign_id'))
-    allow_self_rating = assignment.allow_self_rating
+    allow_self_rating = ct_response.assignment.allow_self_rating
 
     # Get responses in order
     ct_node_responses = TemplateNodeResponse.objects.filter(parent_template_response=ct_response) \
         .order_by('position_in_sequence')
-    response_table_content = ct_node_responses.values(
-        'position_in_sequence',
-        'template_node__description',
-        'audio_response'
-    )
-    ct_node_table = NodeDescriptionTable(response_table_content)
 
     # POST request
     if request.method == 'POST':
-        for response in ct_node_responses:
+        nodes = list(ct_node_responses.only('id', 'transcription'))
+        for response in nodes:
             response.transcription = request.POST.get(str(response.id), '')
-            response.save()
         # The key has to be 0, I have no clue why, just don't touch it
-        if allow_self_rating:
-            ct_response.self_rating = request.POST.get('0', 0)
-        else:
-            ct_response.self_rating = 0
-        ct_response.save()
-        if ct_response.completion_date is None:
-            ct_response.completion_date = timezone.now()
-            ct_response.save()
+        self_rating = request.POST.get('0', 0) if allow_self_rating else 0
+
+        def submit():
+            TemplateNodeResponse.objects.bulk_update(nodes, ['transcription'])
+            TemplateResponse.objects.filter(id=ct_response.id).update(
+                self_rating=self_rating,
+                completion_date=Coalesce(F('completion_date'), Value(timezone.now())),
+            )
+        # Everything is read before the transaction, so it only holds the database for the two writes
+        run_short_transaction('conversation_end', submit)
+        # update() skips the post_save receivers
+        invalidate_dashboards([ct_response.student_id])
+        invalidate_completion_matrix([ct_response.assignment_id])
+        refresh_matrix_rows([ct_response.id])
         return redirect('student-view')
 
     # GET request
-    if 'validation_key' in request.session:
-        del request.session['validation_key']
-        request.session.modified = True
+    response_table_content = ct_node_responses.values(
+        'position_in_sequence',
+        'template_node__description',
+        'audio_response'
+    )
+    ct_node_table = NodeDescriptionTable(response_table_content)
     ctx.update({
         'ct': ct,
         'ct_response': ct_response,
@@ -254,7 +254,10 @@ def conversation_end(request, ct_response_id):
         'ct_node_responses': ct_node_responses,
         'allow_self_rating': allow_self_rating
     })
-    return render(request, t, ctx)
+    response = render(request, t, ctx)
+    # The conversation is over, its steps can no longer be visited
+    ConversationProgress.clear(response)
+    return response
 
 
 def exit_conversation(request):
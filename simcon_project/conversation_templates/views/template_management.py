@@ -5,14 +5,16 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import user_passes_test
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http import HttpResponse
-from django.core.mail import send_mail
+from users.outbox import enqueue_mail
 from users.views.researcher_home import is_researcher
-from conversation_templates.models import ConversationTemplate, TemplateFolder, TemplateResponse, TemplateNode, TemplateNodeChoice
+from conversation_templates.models import ConversationTemplate, TemplateFolder, TemplateResponse
 from conversation_templates.forms import FolderCreationForm, FolderEditForm, AddTemplatesForm
+from conversation_templates.conversation_graph import invalidate_graph
+from conversation_templates.template_cloning import clone_template
+from users.student_dashboard import invalidate_template_dashboards
 from users.models import Researcher
 from bootstrap_modal_forms.generic import BSModalUpdateView, BSModalDeleteView
 from django_tables2 import TemplateColumn, tables, RequestConfig, A, SingleTableView
-from copy import copy
 import re
 import json
 
@@ -254,28 +256,19 @@ def share_template_finalize(request):
     if researchers is None or researchers == '':
         success = 1
         error_message += 'No researchers selected.\n'
-    # for each researcher, clone template, all it's nodes and each node's choices.
-    if success == 0:
-        for researcher_email in researchers:
-            template_nodes = TemplateNode.objects.filter(parent_template=template)
-            template.pk = None
-            template.researcher = Researcher.objects.get(email=researcher_email)
-            template.save()
-            original_to_clone_map = {}
-            for template_node in template_nodes:
-                node_clone = copy(template_node)
-                node_clone.pk = None
-                node_clone.parent_template = template
-                node_clone.save()
-                original_to_clone_map[template_node.pk] = node_clone.pk
-            for template_node in template_nodes:
-                for node_choice in TemplateNodeChoice.objects.filter(parent_template_node=template_node):
-                    choice_clone = node_choice
-                    choice_clone.pk = None
-                    choice_clone.parent_template_node = TemplateNode.objects.get(pk=original_to_clone_map.get(template_node.pk))
-                    if not template_node.terminal:
-                        choice_clone.destination_node = TemplateNode.objects.get(pk=original_to_clone_map.get(node_choice.destination_node.pk))
-                    choice_clone.save()
+    if success != 0:
+        return HttpResponse(json.dumps({
+            'success': success,
+            'message': error_message,
+        }))
+
+    # clone template, all it's nodes and each node's choices for every researcher at once.
+    results = clone_template(template, researchers)
+    recipients = [result['email'] for result in results if result['success']]
+    for result in results:
+        if not result['success']:
+            success = 1
+            error_message += result['email'] + ': ' + result['error'] + '\n'
 
     sender = Researcher.objects.filter(id=request.user.id)
     sender_name = str(sender.first().get_full_name())
@@ -284,7 +277,8 @@ def share_template_finalize(request):
     subject = 'Simulated Conversations Template Shared with You'
     msg = sender_name + ' (' + sender_email + ') ' + 'has shared \"' + template_name + '\" with you on Simulated ' \
                                                                                        'Conversations.'
-    send_mail(subject, msg, 'simcon.dev@gmail.com', researchers, fail_silently=False)
+    if recipients:
+        enqueue_mail(subject, msg, 'simcon.dev@gmail.com', recipients)
     return HttpResponse(json.dumps({
         'success': success,
         'message': error_message,
@@ -388,6 +382,9 @@ def archive_template(request, pk):
     else:
         ConversationTemplate.objects.filter(pk=pk).update(archived=True)
         TemplateResponse.objects.filter(template=template.id).update(archived=True)
+    # update() skips the post_save signal, so drop the compiled conversation graph and dashboards here
+    invalidate_graph(template.id)
+    invalidate_template_dashboards(template.id)
 
     back = request.POST.get('back', '/')
     return redirect(back)
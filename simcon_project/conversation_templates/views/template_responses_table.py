@@ -1,10 +1,17 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import render, redirect
 from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
 from django_tables2 import tables, RequestConfig, SingleTableView
 from django_tables2.export.views import TableExport
 from conversation_templates.models import ConversationTemplate, TemplateResponse
 from conversation_templates.forms import SelectTemplateForm
+from conversation_templates.response_export import EXPORT_FORMATS, export_response, node_columns
+from conversation_templates.response_matrix import response_matrix, response_rows
+from conversation_templates.search_index import transcription_index
+from simcon_project.replica import analytics_view
 
 
 class ResponseTable(tables.Table):
@@ -15,6 +22,26 @@ class ResponseTable(tables.Table):
         fields = ['assignment', 'student_name', 'completion_date']
 
 
+class HighlightColumn(tables.columns.Column):
+    """
+    Column that marks the words matching the filter, using the offsets in the row's highlights.
+    """
+    def render(self, value, record, bound_column):
+        offsets = record.get('highlights', {}).get(bound_column.name)
+        if not offsets:
+            return value
+        html, last = [], 0
+        for start, end in offsets:
+            html.append(escape(value[last:start]))
+            html.append(format_html('<mark>{}</mark>', value[start:end]))
+            last = end
+        html.append(escape(value[last:]))
+        return mark_safe(''.join(html))
+
+    def value(self, value):
+        return value
+
+
 class TemplateResponsesView(UserPassesTestMixin, LoginRequiredMixin, SingleTableView):
     model = TemplateResponse
     table_class = ResponseTable
@@ -23,6 +50,7 @@ class TemplateResponsesView(UserPassesTestMixin, LoginRequiredMixin, SingleTable
     def test_func(self):
         return self.request.user.is_authenticated and self.request.user.is_researcher
 
+    @method_decorator(analytics_view)
     def get(self, request, pk):
         """
         On get request render a custom table based on ResponseTable:
@@ -32,60 +60,35 @@ class TemplateResponsesView(UserPassesTestMixin, LoginRequiredMixin, SingleTable
                  dynamically created since each template has different number of nodes")
         """
         template = ConversationTemplate.objects.get(pk=pk)
+
+        # Downloads are streamed straight from the database instead of being built from the table
+        export_format = request.GET.get("_export", None)
+        if export_format in EXPORT_FORMATS:
+            return export_response(template, export_format, select_rows(request, template, stream=True))
+
         extra_columns = []  # List of tuples of description and column object to pass to table
-        table_data = []  # List of dictionaries to populate table. 1 dictionary = 1 column
-
-        for idx, node in enumerate(template.template_nodes.all().order_by('position_in_sequence')):
-            if node.terminal:
-                extra_columns.append((str(node.id), tables.columns.Column(
-                    orderable=False, attrs={'th': {'class': 'data-column'}},
-                    verbose_name=f'{idx + 1}: {node.description} (Terminal)')))
-            else:
-                extra_columns.append((str(node.id), tables.columns.Column(
-                    orderable=False, attrs={'th': {'class': 'data-column'}},
-                    verbose_name=f'{idx + 1}: {node.description}')))
+        for key, header in node_columns(template):
+            extra_columns.append((key, HighlightColumn(
+                orderable=False, attrs={'th': {'class': 'data-column'}}, verbose_name=header)))
 
         extra_columns.append(("rating", tables.columns.Column(default=False)))
         extra_columns.append(
             ("custom_response", tables.columns.BooleanColumn(default=False, verbose_name="Custom End")))
 
-        # Populate the table with data for each response
-        completed_responses = template.template_responses.exclude(completion_date__isnull=True)
-        for response in completed_responses.order_by('-completion_date'):
-            column_data = {
-                "assignment": response.assignment.name,
-                "student_name": f"{response.student.last_name} {response.student.first_name}",
-                "completion_date": response.completion_date,
-            }
-
-            for node in response.node_responses.all().order_by('position_in_sequence'):
-                if node.custom_response:
-                    column_data.update({str(node.template_node.id): node.transcription + ' (Custom Response)'})
-                    column_data.update({"custom_response": True})
-                else:
-                    column_data.update({str(node.template_node.id): node.transcription})
-                    column_data.update({"custom_response": False})
-
-            column_data.update({"rating": response.self_rating_to_string})
-            table_data.append(column_data)
-        if 'filter' in request.GET:
-            table_data = filter_search(request, table_data)
-
+        table_data = list(select_rows(request, template))  # List of dictionaries. 1 dictionary = 1 row
         if not table_data:
             response_table = None
         else:
             response_table = ResponseTable(data=table_data, extra_columns=extra_columns)
             RequestConfig(request, paginate=False).configure(response_table)
 
-
-        export_format = request.GET.get("_export", None)
         context = {
             "table": response_table,
             "form": SelectTemplateForm(request=request, initial=template),
             "pk": pk
         }
 
-        # Code needed to export table as .xls
+        # Formats other than .csv and .xlsx are exported from the table
         if TableExport.is_valid_format(export_format):
             exporter = TableExport(export_format, response_table)
             file_name = f"{template.name}.{format(export_format)}"
@@ -99,14 +102,24 @@ class TemplateResponsesView(UserPassesTestMixin, LoginRequiredMixin, SingleTable
         return redirect(reverse('view-all-responses', args=[request.POST['templates']]))
 
 
+def select_rows(request, template, stream=False):
+    """
+    Returns the response matrix rows of a template that match the filter parameter, if there is one.
+    Matching rows are selected in the database when it has a transcription index, else in Python.
+    """
+    query = request.GET.get('filter')
+    if not transcription_index.supported:
+        rows = response_rows(template) if stream else response_matrix(template)
+        return filter_search(request, rows) if query is not None else rows
+    return response_rows(template, query) if stream else response_matrix(template, query)
+
+
 def filter_search(request, table_data):
-    filtered_data = []
     param = request.GET['filter']
     for data in table_data:
         # if param is in any of the key value pairs in the dictionary data.items()
         if {k: v for (k, v) in data.items() if filter_helper(k, v, param)}:
-            filtered_data.append(data)
-    return filtered_data
+            yield data
 
 
 def filter_helper(k, v, param):
@@ -1,69 +1,50 @@
 import json
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, redirect
 from users.views.redirect_from_login import is_authenticated
 from django.http import HttpResponseRedirect
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth import get_user_model
-from conversation_templates.models import TemplateResponse, TemplateNodeResponse
+from conversation_templates.models import TemplateResponse
+from conversation_templates.response_detail import load_response, load_node_responses, update_transcriptions, \
+    set_flags
+from conversation_templates.response_matrix import refresh_matrix_rows
 from django.contrib.auth.decorators import user_passes_test
 from bootstrap_modal_forms.generic import BSModalDeleteView
-from django.core.mail import send_mail
+from users.outbox import enqueue_mail
 
 
 @user_passes_test(is_authenticated)
 def view_response(request, pk):
-    response = get_object_or_404(TemplateResponse, pk=pk)
+    response = load_response(pk)
     user = get_user_model()
-    if user.get_is_researcher(request.user):
-        response.response_read = True
-        response.save()
+    is_researcher = user.get_is_researcher(request.user)
+    if is_researcher:
+        set_flags(response, response_read=True)
 
     if request.method == 'POST':
         if 'update-overall-feedback' in request.POST:
             response.feedback = request.POST.get('overall-feedback-input')
             response.feedback_read = False
-            response.save()
+            response.save(update_fields=['feedback', 'feedback_read'])
             return HttpResponseRedirect(reverse('view-response', kwargs={'pk': pk}))
         else:
             transcriptions = json.loads(request.body.decode('utf-8'))["transcriptions"]
-            for node_id in transcriptions:
-                current_node = get_object_or_404(TemplateNodeResponse, pk=node_id)
-                if transcriptions[node_id] != "":
-                    current_node.transcription = transcriptions[node_id]
-                    current_node.save()
-            if user.get_is_researcher(request.user):
-                response.transcription_student_editable = False
-                response.save()
+            changed = update_transcriptions(response, transcriptions)
+            if is_researcher:
+                set_flags(response, transcription_student_editable=False)
+            if changed:
+                refresh_matrix_rows([response.id])
 
-    nodes = []
-    num_nodes = TemplateNodeResponse.objects.filter(parent_template_response=response).count()
-    for i in range(1, num_nodes+1):
-        if TemplateNodeResponse.objects.get(parent_template_response=response, position_in_sequence=i):
-            nodes.append(TemplateNodeResponse.objects.get(parent_template_response=response, position_in_sequence=i))
-        else:
-            break
-
-    self_rating = ""
-    if response.self_rating == 0:
-        self_rating = "None"
-    if response.self_rating == 1:
-        self_rating = "Very unsatisfied"
-    if response.self_rating == 2:
-        self_rating = "Unsatisfied"
-    if response.self_rating == 3:
-        self_rating = "Somewhat satisfied"
-    if response.self_rating == 4:
-        self_rating = "Satisfied"
-    if response.self_rating == 5:
-        self_rating = "Very Satisfied"
+    nodes = load_node_responses(response)
+    self_rating = response.self_rating_to_string
 
-    if user.get_is_researcher(request.user):
+    if is_researcher:
         return render(request, 'view_response.html', {'response_nodes': nodes, 'response': response, 'self_rating': self_rating})
     else:
-        response.feedback_read = True
-        response.save()
+        set_flags(response, feedback_read=True)
         return render(request, 'feedback/view_feedback.html', {'response_nodes': nodes, 'response': response, 'self_rating': self_rating})
 
+
 class ResponseDeleteView(BSModalDeleteView):
     model = TemplateResponse
     template_name = 'response_delete_modal.html'
@@ -81,9 +62,10 @@ class ResponseDeleteView(BSModalDeleteView):
             template_name= this_response.template.name
             subject = 'New Re-Assigned Template for Simulated Conversations: '+ template_name
             message = 'Please check your Portal to complete: '+ template_name
-            send_mail(subject, message, 'smtp.gmail.com', [student_email], fail_silently=False)
+            enqueue_mail(subject, message, 'smtp.gmail.com', [student_email])
             this_response.delete()
         else:
             this_response.hidden = True
             this_response.save()
+            refresh_matrix_rows([this_response.id])
         return redirect(reverse('researcher-view'))
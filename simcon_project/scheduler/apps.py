@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SchedulerConfig(AppConfig):
+    name = 'scheduler'
+
+    def ready(self):
+        # Wakes the scheduler when notifications are queued or moved
+        from scheduler import signals  # noqa: F401
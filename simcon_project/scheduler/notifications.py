@@ -0,0 +1,139 @@
+import heapq
+import time
+import uuid
+from datetime import timedelta
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from users.models import Assignment, Email
+from users.outbox import enqueue_mass_mail, deliver_outbox
+
+# Globals
+CHECK_INTERVAL = timedelta(seconds=15)  # How often to look for earlier due times queued by other processes
+LOAD_LIMIT = 1000  # Due times held in memory at once, the queue is reloaded when it runs dry
+WAKE_CHECK_INTERVAL = 1  # Seconds between looks at the schedule generation while the scheduler sleeps
+GENERATION_KEY = 'scheduler-schedule-generation'
+
+
+def schedule_generation():
+    """
+    Returns the generation of the schedule, which changes every time an Email is created or changed.
+    It is kept in the versions cache, which the web workers and the scheduler process share.
+    """
+    return caches['versions'].get(GENERATION_KEY)
+
+
+def wake_scheduler():
+    """
+    Wakes the scheduler, whichever process it runs in, once the Email that was created or changed is committed.
+    """
+    transaction.on_commit(lambda: caches['versions'].set(GENERATION_KEY, uuid.uuid4().hex, None))
+
+
+def next_due_time():
+    """
+    Returns the earliest date_assigned of an assignment with a pending Email, or None, with one indexed query.
+    """
+    return Email.objects.order_by('assignment__date_assigned') \
+        .values_list('assignment__date_assigned', flat=True).first()
+
+
+def send_due_notifications(now=None):
+    """
+    Queues the notification of every assignment that is due, for all of its students at once, and removes
+    the sent Email rows in the same transaction. Returns the number of notifications sent.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = list(Email.objects.select_for_update()
+                      .filter(assignment__date_assigned__lte=now).order_by('assignment__date_assigned'))
+        if not emails:
+            return 0
+        recipients = {}
+        for assignment_id, email in Assignment.students.through.objects \
+                .filter(assignment_id__in=[email.assignment_id for email in emails]) \
+                .values_list('assignment_id', 'student__email'):
+            recipients.setdefault(assignment_id, []).append(email)
+        enqueue_mass_mail([(email.subject, email.message, None, recipients.get(email.assignment_id, []))
+                           for email in emails])
+        Email.objects.filter(id__in=[email.id for email in emails]).delete()
+    return len(emails)
+
+
+class NotificationScheduler:
+    """
+    Sends assignment notifications when they are due, and every other email of the outbox at least every
+    CHECK_INTERVAL. The due times of pending Emails are kept in a priority queue, and the scheduler sleeps
+    until the earliest one. Saving or deleting an Email in any process changes the schedule generation, which
+    wakes it within WAKE_CHECK_INTERVAL, and every CHECK_INTERVAL it also checks the database for earlier due
+    times, in case the generation was lost with the cache.
+    """
+
+    def __init__(self, check_interval=CHECK_INTERVAL, report=None, wake_check_interval=WAKE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.wake_check_interval = wake_check_interval
+        self.report = report
+        self.queue = []
+        self.generation = None
+
+    def load(self):
+        self.generation = schedule_generation()
+        self.queue = list(Email.objects.order_by('assignment__date_assigned')
+                          .values_list('assignment__date_assigned', flat=True)[:LOAD_LIMIT])
+        heapq.heapify(self.queue)
+
+    def next_due(self):
+        return self.queue[0] if self.queue else None
+
+    def run_due(self, now):
+        while self.queue and self.queue[0] <= now:
+            heapq.heappop(self.queue)
+        sent = send_due_notifications(now)
+        if sent and self.report:
+            self.report(sent)
+        if not self.queue:
+            self.load()
+        return sent
+
+    def timeout(self, now):
+        next_due = self.next_due()
+        if next_due is None:
+            return self.check_interval.total_seconds()
+        return max(min(next_due - now, self.check_interval).total_seconds(), 0)
+
+    def wait(self, timeout):
+        """
+        Sleeps up to timeout seconds. Returns True as soon as the schedule generation changed since the last load.
+        """
+        deadline = time.monotonic() + timeout
+        while schedule_generation() == self.generation:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.wake_check_interval, remaining))
+        return True
+
+    def step(self):
+        """
+        Sends what is due and delivers the outbox, then sleeps until the next due time, a change or the
+        next check.
+        """
+        now = timezone.now()
+        next_due = self.next_due()
+        if next_due is not None and next_due <= now:
+            self.run_due(now)
+        # The notifications just queued, and the feedback, sharing and registration emails the site queued
+        deliver_outbox(once=True)
+        if self.wait(self.timeout(timezone.now())):
+            self.load()
+        else:
+            earliest = next_due_time()
+            if earliest is not None and (self.next_due() is None or earliest < self.next_due()):
+                heapq.heappush(self.queue, earliest)
+        close_old_connections()
+
+    def run(self):
+        self.load()
+        self.run_due(timezone.now())
+        while True:
+            self.step()
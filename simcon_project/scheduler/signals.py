@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from scheduler.notifications import wake_scheduler
+from users.models import Assignment, Email
+
+
+@receiver([post_save, post_delete], sender=Email)
+def email_changed(sender, instance, **kwargs):
+    wake_scheduler()
+
+
+@receiver(post_save, sender=Assignment)
+def assignment_rescheduled(sender, instance, created, **kwargs):
+    # The due time of the assignment's Email may have moved
+    if not created:
+        wake_scheduler()
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from django.core import mail
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from scheduler.notifications import NotificationScheduler, send_due_notifications
+from users.models import Assignment, Email, OutboxMessage, Researcher, Student
+from users.outbox import enqueue_mail
+
+
+class SchedulingMixin:
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.students = [Student.objects.create_user(email=f"student{idx}@pdx.edu", password="abc123")
+                         for idx in range(2)]
+
+    def schedule(self, name, delay):
+        assignment = Assignment.objects.create(name=name, researcher=self.researcher,
+                                               date_assigned=timezone.now() + delay)
+        assignment.students.set(self.students)
+        return Email.objects.create(subject=name, message="You have a new assignment.", assignment=assignment)
+
+
+class NotificationSchedulerTests(SchedulingMixin, TestCase):
+    def test_send_due_notifications(self):
+        self.schedule("due", timedelta(minutes=-1))
+        self.schedule("later", timedelta(hours=1))
+        with self.assertNumQueries(7):
+            self.assertEqual(send_due_notifications(), 1)
+        self.assertEqual(list(Email.objects.values_list('subject', flat=True)), ["later"])
+        self.assertEqual(sorted(OutboxMessage.objects.values_list('recipient', flat=True)),
+                         ["student0@pdx.edu", "student1@pdx.edu"])
+
+        # The queries do not depend on the number of due notifications
+        for idx in range(5):
+            self.schedule(f"due {idx}", timedelta(minutes=-1))
+        with self.assertNumQueries(7):
+            self.assertEqual(send_due_notifications(), 5)
+
+    def test_sleeps_until_next_due_time(self):
+        later = self.schedule("later", timedelta(hours=1))
+        scheduler = NotificationScheduler(check_interval=timedelta(days=1))
+        scheduler.load()
+        now = timezone.now()
+        self.assertAlmostEqual(scheduler.timeout(now), (later.assignment.date_assigned - now).total_seconds())
+
+    def test_delivers_the_outbox_every_step(self):
+        scheduler = NotificationScheduler(check_interval=timedelta(0))
+        scheduler.load()
+        enqueue_mail("Feedback", "You have new feedback.", None, ["student0@pdx.edu"])
+        scheduler.step()
+        self.assertEqual([message.subject for message in mail.outbox], ["Feedback"])
+
+
+class SchedulerWakeTests(SchedulingMixin, TransactionTestCase):
+    """
+    Wakeups are sent once the Email is committed, so these tests commit.
+    """
+    def test_wakes_on_new_email(self):
+        scheduler = NotificationScheduler(check_interval=timedelta(days=1))
+        scheduler.load()
+        self.assertIsNone(scheduler.next_due())
+        self.assertFalse(scheduler.wait(0))
+        self.schedule("due", timedelta(seconds=-1))
+        self.assertTrue(scheduler.wait(0))
+
+        scheduler.step()  # Woken up by the new Email instead of sleeping for a day
+        self.assertIsNotNone(scheduler.next_due())
+        self.schedule("also due", timedelta(seconds=-1))
+        scheduler.check_interval = timedelta(0)  # Nothing is left to wake it after this step
+        scheduler.step()
+        self.assertFalse(Email.objects.exists())
+        self.assertEqual(len(mail.outbox), 4)
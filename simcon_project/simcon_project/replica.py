@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import FileResponse
+
+# Globals
+STICKY_COOKIE = 'primary'  # Set after a request writes, so the next requests of the browser read their writes
+
+# What the current request is allowed to read from the replica
+_state = threading.local()
+
+
+def replica_alias():
+    """
+    Returns the alias of the read replica, or None if none is configured.
+    """
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def reads_from_replica():
+    """
+    Whether reads go to the replica: inside an analytics view, unless the request already wrote, followed a
+    recent write of the same browser or is inside a transaction on the primary.
+    """
+    return (getattr(_state, 'analytics', False) and not getattr(_state, 'pinned', False)
+            and replica_alias() is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of analytics views to the replica and everything else to the primary (default) database.
+    """
+    def db_for_read(self, model, **hints):
+        return replica_alias() if reads_from_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Whatever this request reads next has to see the write
+        _state.pinned = True
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their tables and rows by copying the primary
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Keeps a browser on the primary for REPLICA_STICKY_SECONDS after one of its requests wrote, so a researcher
+    sees their own changes before the replica caught up. Uses a cookie rather than the session, which would
+    otherwise be written on every request that writes. Goes first in MIDDLEWARE so session and login writes
+    count too.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = STICKY_COOKIE in request.COOKIES
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            if _state.wrote:
+                response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+                                    samesite='Lax')
+        finally:
+            _state.pinned = _state.wrote = False
+        return response
+
+
+@contextmanager
+def reading_replica():
+    previous = getattr(_state, 'analytics', False)
+    _state.analytics = True
+    try:
+        yield
+    finally:
+        _state.analytics = previous
+
+
+def stream_from_replica(content):
+    # Streamed downloads run their queries after the view returned
+    with reading_replica():
+        yield from content
+
+
+def analytics_view(view):
+    """
+    Marks a view whose reads may be served by the replica, a few seconds behind the primary.
+    Only use it on pages that show aggregated or historical data.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading_replica():
+            response = view(request, *args, **kwargs)
+        # Files are already written; only generators still have queries to run
+        if response.streaming and not isinstance(response, FileResponse):
+            response.streaming_content = stream_from_replica(response.streaming_content)
+        return response
+    return wrapper
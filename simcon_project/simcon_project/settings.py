@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'simcon_project.replica.ReplicaMiddleware',
+    'simcon_project.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +83,26 @@ TEMPLATES = [
     },
 ]
 
+# Compiled conversation graphs, student dashboards and completion matrices are invalidated through the cache,
+# so every worker process has to share it. Files work for the workers of one server; deployments with more
+# than one server need a networked cache such as memcached.
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+CACHE_DIR = os.environ.get('SIMCON_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+    },
+    # Versions the workers compare their compiled graphs against. Kept apart from the default cache so they
+    # never expire and are not culled to make room for pages and select2 entries.
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
 # Tell select2 which cache configuration to use:
 SELECT2_CACHE_BACKEND = "default"
 
@@ -95,6 +117,40 @@ DATABASES = {
     }
 }
 
+# Applied to every new SQLite connection, so parallel students do not run into "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers do not block the writer, nor the writer the readers
+    'synchronous': 'NORMAL',  # Safe with WAL; only checkpoints wait for the disk
+    'busy_timeout': 5000,  # Milliseconds a writer waits for the lock before giving up
+    'mmap_size': 64 * 1024 * 1024,  # Bytes of the database file read through memory mapping
+}
+
+# Optional read replica for the researcher's analytics pages, e.g. SIMCON_REPLICA_DB=/path/to/replica.sqlite3.
+# SIMCON_REPLICA_ENGINE picks another backend than SQLite, with SIMCON_REPLICA_HOST, SIMCON_REPLICA_PORT,
+# SIMCON_REPLICA_USER and SIMCON_REPLICA_PASSWORD for its connection. Without it every query goes to the default
+# database.
+REPLICA_DATABASE = 'replica'
+if os.environ.get('SIMCON_REPLICA_DB'):
+    DATABASES[REPLICA_DATABASE] = {
+        'ENGINE': os.environ.get('SIMCON_REPLICA_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.environ['SIMCON_REPLICA_DB'],
+        'HOST': os.environ.get('SIMCON_REPLICA_HOST', ''),
+        'PORT': os.environ.get('SIMCON_REPLICA_PORT', ''),
+        'USER': os.environ.get('SIMCON_REPLICA_USER', ''),
+        'PASSWORD': os.environ.get('SIMCON_REPLICA_PASSWORD', ''),
+        # Tests read the replica from the test database instead of the real replica
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['simcon_project.replica.ReplicaRouter']
+# Seconds a browser keeps reading from the default database after one of its requests wrote
+REPLICA_STICKY_SECONDS = 10
+
+# Share of the requests whose queries, template rendering and size are measured, see simcon_project/timing.py.
+# Every request gets its total time in the Server-Timing header, the measures only show there for staff or DEBUG.
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('SIMCON_TIMING_SAMPLE_RATE', 0.1))
+# Samples kept per view for the percentiles of the request timings page
+REQUEST_TIMING_WINDOW = 1000
+
 # Allows Django to use our User class
 # https://testdriven.io/blog/django-custom-user-model/#user-model
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -157,6 +213,9 @@ LOGIN_REDIRECT_URL = 'redirect-from-login'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
+# Largest audio response (in bytes) accepted by the chunked upload endpoints
+AUDIO_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+
 # Bootstrap Template for Django Tables
 DJANGO_TABLES2_TEMPLATE = "django_tables2/bootstrap4.html"
 MEDIAFILES_DIRS = [
@@ -0,0 +1,34 @@
+"""
+Settings of the test suite, used by "python manage.py test" instead of settings.py.
+"""
+import os
+import tempfile
+from simcon_project.settings import *  # noqa: F401,F403
+
+# Databases of their own for the tests that need them. The test runner only creates the ones a test case lists in its
+# databases attribute, from the same models as the default test database.
+DATABASES = dict(DATABASES)  # noqa: F405
+# Replica the analytics views read from, filled by copying the default test database, see test_replica_router.py
+DATABASES['test_replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'TEST': {'NAME': os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')},
+}
+# A file database, since WAL and locking between connections do not apply to the in-memory test database, see
+# test_sqlite_concurrency.py
+DATABASES['test_benchmark'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'TEST': {'NAME': os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')},
+}
+
+# Tests clear the caches, so they get caches of their own instead of the files of a server on this checkout
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'versions',
+        'TIMEOUT': None,
+    },
+}
@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+# Globals
+SAMPLE_FIELDS = ('wall_ms', 'sql_ms', 'queries', 'template_ms', 'bytes')
+PERCENTILES = (50, 95, 99)
+
+# Timings of the request the current thread is handling, or None when it is not sampled
+_state = threading.local()
+
+
+def percentile(samples, percent):
+    """
+    Returns the nearest-rank percentile of a list of numbers, or None if it is empty.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * percent // 100))  # Ceiling without floats
+    return ordered[int(rank) - 1]
+
+
+class RequestTiming:
+    """
+    What one sampled request spent: queries and their time on every database, and the time to render
+    templates. Nested templates count once, as part of the template that included them.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # Used as a database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+    def watch_queries(self):
+        """
+        Returns a context manager that counts the queries of this thread on every database while it is open.
+        """
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class TimingHistograms:
+    """
+    The last REQUEST_TIMING_WINDOW samples of every view, by url name, shared by the threads of the process.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, name, sample):
+        with self.lock:
+            window = self.views.get(name)
+            if window is None:
+                window = self.views[name] = deque(maxlen=settings.REQUEST_TIMING_WINDOW)
+            window.append(sample)
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def summary(self):
+        """
+        Returns the number of samples and the p50, p95 and p99 of every measure, by url name.
+        """
+        with self.lock:
+            views = {name: list(window) for name, window in self.views.items()}
+        summary = {}
+        for name, samples in sorted(views.items()):
+            summary[name] = {'samples': len(samples)}
+            for idx, field in enumerate(SAMPLE_FIELDS):
+                values = [sample[idx] for sample in samples if sample[idx] is not None]
+                summary[name][field] = {f'p{percent}': percentile(values, percent) for percent in PERCENTILES}
+        return summary
+
+
+request_timings = TimingHistograms()
+
+
+def instrument_templates():
+    """
+    Times Template.render of the Django template backend. Called by RequestTimingMiddleware when it is loaded.
+    """
+    if getattr(Template.render, 'timed', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def timed_render(self, context=None, request=None):
+        timing = getattr(_state, 'timing', None)
+        if timing is None or timing.rendering:
+            return render(self, context, request)
+        timing.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            timing.template += time.perf_counter() - start
+            timing.rendering = False
+
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+def server_timing(wall, timing=None, size=None):
+    # Durations in milliseconds, see https://www.w3.org/TR/server-timing/
+    metrics = [f'total;dur={wall * 1000:.1f}']
+    if timing is not None:
+        metrics.append(f'sql;dur={timing.sql * 1000:.1f};desc="{timing.queries} queries"')
+        metrics.append(f'template;dur={timing.template * 1000:.1f}')
+    if size is not None:
+        metrics.append(f'bytes;desc="{size}"')
+    return ', '.join(metrics)
+
+
+def shows_details(request):
+    """
+    Returns whether the Server-Timing header of a request may list its queries, template time and size, which
+    only staff and DEBUG servers see. Every sampled request is recorded in request_timings either way.
+    """
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class RequestTimingMiddleware:
+    """
+    Adds a Server-Timing header with the wall time of every request. A REQUEST_TIMING_SAMPLE_RATE share of the
+    requests is measured in full, with the number and time of its queries, the time to render its templates
+    and the bytes of its response, and added to request_timings under the url name of its view. The header
+    of a sampled request only includes those measures for staff, or when DEBUG is on.
+    Only sampled requests pay for counting queries, which keeps the cost per request low.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        sampled = random.random() < settings.REQUEST_TIMING_SAMPLE_RATE
+        start = time.perf_counter()
+        if not sampled:
+            response = self.get_response(request)
+            response['Server-Timing'] = server_timing(time.perf_counter() - start)
+            return response
+
+        timing = _state.timing = RequestTiming()
+        try:
+            with timing.watch_queries():
+                response = self.get_response(request)
+        finally:
+            _state.timing = None
+        name = request.resolver_match.view_name if request.resolver_match else None
+        details = shows_details(request)
+
+        if response.streaming:
+            # The body and its queries come after the headers went out, so they are only in the histogram
+            response['Server-Timing'] = server_timing(time.perf_counter() - start, timing if details else None)
+            response.streaming_content = self.stream(response.streaming_content, timing, name, start)
+        else:
+            wall = time.perf_counter() - start
+            if details:
+                response['Server-Timing'] = server_timing(wall, timing, len(response.content))
+            else:
+                response['Server-Timing'] = server_timing(wall)
+            self.record(name, wall, timing, len(response.content))
+        return response
+
+    def stream(self, content, timing, name, start):
+        size = 0
+        with timing.watch_queries():
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.record(name, time.perf_counter() - start, timing, size)
+
+    @staticmethod
+    def record(name, wall, timing, size):
+        # Requests that did not reach a view, like 404s, have no url name
+        if name:
+            request_timings.add(name, (wall * 1000, timing.sql * 1000, timing.queries, timing.template * 1000, size))
@@ -60,9 +60,11 @@ urlpatterns = [
     path('researcher/create-students/', create_students_modal, name="create-students"),
     path('researcher/create-students/validate/', validate_student_email, name="validate-student-email"),
     path('researcher/create-students/final/', register_students, name="register-students"),
+    path('researcher/create-students/import/', import_students, name="import-students"),
 
     # Stuff researcher who is an admin can see
     path('admin/researchers/researcher-management/', researcher_management, name="researcher-management"),
+    path('admin/researchers/request-timings/', request_timings_view, name="request-timings"),
     path('admin/researchers/delete/<pk>/', ResearcherDeleteView.as_view(), name="delete-researcher"),
 ]
 
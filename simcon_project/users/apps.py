@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # Keeps the cached student dashboards and completion matrices in sync with changes
+        from users import signals  # noqa: F401
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from conversation_templates.models import ConversationTemplate, TemplateResponse
+from users.models import Student
+from simcon_project.replica import reads_from_replica
+
+# Globals
+CACHE_TIMEOUT = 60 * 60  # Seconds. Entries are invalidated on changes, the timeout only bounds stale entries
+
+
+def cache_key(assignment_id):
+    return f'assignment-completion:{assignment_id}'
+
+
+def build_completion_matrix(assignment_id):
+    """
+    Returns the students × templates completion matrix of an assignment as a dictionary with:
+    students: list of dictionaries with the id, name and email of each assigned student
+    templates: list of dictionaries with the id and name of each template in the assignment
+    cells: dictionary keyed by (student id, template id) with the number of responses started (attempts),
+        the number completed (completed) and the latest completion date (last_completion) of each pair
+        the student responded to at all
+    The cells come from a single grouped query, whatever the size of the assignment.
+    """
+    students = list(Student.objects.filter(assignments=assignment_id).order_by('last_name', 'first_name')
+                    .values('id', 'first_name', 'last_name', 'email'))
+    templates = list(ConversationTemplate.objects.filter(assignments=assignment_id).order_by('name')
+                     .values('id', 'name'))
+    cells = {}
+    for cell in TemplateResponse.objects.filter(assignment=assignment_id) \
+            .values('student_id', 'template_id') \
+            .annotate(attempts=Count('id'), completed=Count('id', filter=Q(completion_date__isnull=False)),
+                      last_completion=Max('completion_date')) \
+            .order_by():
+        cells[(cell['student_id'], cell['template_id'])] = {
+            'attempts': cell['attempts'],
+            'completed': cell['completed'],
+            'last_completion': cell['last_completion'],
+        }
+    for student in students:
+        student['name'] = student['first_name'] + ' ' + student['last_name']
+    return {'students': students, 'templates': templates, 'cells': cells}
+
+
+def get_completion_matrix(assignment_id):
+    """
+    Returns build_completion_matrix for the assignment, cached until a response to it or the assignment changes.
+    Only matrices read from the primary database are cached: one read from a lagging replica would miss a
+    change whose invalidation already happened.
+    """
+    matrix = cache.get(cache_key(assignment_id))
+    if matrix is None:
+        matrix = build_completion_matrix(assignment_id)
+        if not reads_from_replica():
+            cache.set(cache_key(assignment_id), matrix, CACHE_TIMEOUT)
+    return matrix
+
+
+def invalidate_completion_matrix(assignment_ids):
+    """
+    Drops the cached matrices of the assignments, at once for the request making the change and again once it
+    is committed, since other workers may cache the old matrix until then.
+    """
+    keys = [cache_key(assignment_id) for assignment_id in assignment_ids]
+    if transaction.get_connection().in_atomic_block:
+        cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def completed_templates(matrix, student_id):
+    """
+    Returns the number of templates of the assignment the student completed at least once.
+    """
+    return sum(1 for template in matrix['templates']
+               if matrix['cells'].get((student_id, template['id']), {}).get('completed'))
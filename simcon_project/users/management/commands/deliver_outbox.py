@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from users.models import OutboxMessage
+from users.outbox import BATCH_SIZE, deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Delivers the emails queued in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Number of emails sent over one connection to the mail server.")
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help="Seconds to wait before checking an empty outbox again.")
+        parser.add_argument('--once', action='store_true', help="Exit once no email is due.")
+
+    def handle(self, *args, **options):
+        totals = {OutboxMessage.SENT: 0, OutboxMessage.PENDING: 0, OutboxMessage.DEAD: 0}
+
+        def report(message):
+            totals[message.status] += 1
+            if message.status != OutboxMessage.SENT:
+                self.stdout.write(f"{message.recipient}: {message.status} after {message.attempts} attempts "
+                                  f"({message.error})")
+
+        try:
+            deliver_outbox(batch_size=options['batch_size'], poll_interval=options['poll_interval'],
+                           once=options['once'], report=report)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Sent {totals[OutboxMessage.SENT]} emails, {totals[OutboxMessage.PENDING]} "
+                          f"will be retried, {totals[OutboxMessage.DEAD]} dead-lettered.")
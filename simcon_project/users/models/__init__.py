@@ -4,3 +4,4 @@ from .researcher import Researcher
 from .subject_label import SubjectLabel
 from .assignment import Assignment
 from .email import Email
+from .outbox_message import OutboxMessage
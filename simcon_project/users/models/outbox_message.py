@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+import uuid
+
+
+class OutboxMessage(models.Model):
+    """
+    An email waiting in the outbox to be delivered to one recipient by the delivery worker
+
+    Fields:
+    id: UUID to uniquely identify a message. Primary Key.
+    subject: Subject line of the email
+    body: Plain text body of the email
+    from_email: Sender address, DEFAULT_FROM_EMAIL when empty
+    recipient: The single address the email is sent to
+    status: pending, sending (claimed by a worker), sent or dead (gave up after too many failed attempts)
+    attempts: Number of times a worker has tried to send the message
+    next_attempt: The earliest date a worker may pick the message up (again)
+    error: Last error raised while sending
+    creation_date: The date the message was queued
+    sent_date: The date the message was sent
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+
+    id = models.UUIDField(unique=True, editable=False, primary_key=True, default=uuid.uuid4)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, default='', blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    error = models.CharField(max_length=1000, default='', blank=True)
+    creation_date = models.DateTimeField(default=timezone.now)
+    sent_date = models.DateTimeField(default=None, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
@@ -0,0 +1,132 @@
+import smtplib
+import time
+from datetime import timedelta
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from users.models import OutboxMessage
+
+# Globals
+BATCH_SIZE = 50  # Messages sent over one SMTP connection
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1)  # Doubled after every failed attempt
+MAX_RETRY_DELAY = timedelta(hours=1)
+SENDING_TIMEOUT = timedelta(minutes=15)  # Messages claimed longer ago than this belong to a dead worker
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)  # Retrying these cannot succeed
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    """
+    Queues an email for every recipient in recipient_list instead of sending it during the request.
+    Takes the same arguments as django.core.mail.send_mail. The messages are written with one insert and
+    belong to the surrounding transaction, so they are only delivered if it commits.
+    """
+    return enqueue_mass_mail([(subject, message, from_email, recipient_list)])
+
+
+def enqueue_mass_mail(datatuple):
+    """
+    Queues several emails with one insert. Takes the same (subject, message, from_email, recipient_list)
+    tuples as django.core.mail.send_mass_mail.
+    """
+    messages = []
+    for subject, message, from_email, recipient_list in datatuple:
+        recipients = dict.fromkeys(recipient for recipient in recipient_list if recipient)
+        messages.extend(OutboxMessage(subject=subject, body=message, from_email=from_email or '',
+                                      recipient=recipient) for recipient in recipients)
+    return OutboxMessage.objects.bulk_create(messages)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_messages(limit):
+    """
+    Marks up to limit due messages (or messages left sending by a dead worker) as sending and returns them.
+    Each message is claimed with a conditional update, so several workers never send the same message.
+    """
+    now = timezone.now()
+    claimable = Q(status=OutboxMessage.PENDING, next_attempt__lte=now) | \
+        Q(status=OutboxMessage.SENDING, next_attempt__lte=now - SENDING_TIMEOUT)
+    candidates = OutboxMessage.objects.filter(claimable).order_by('next_attempt') \
+        .values_list('id', flat=True)[:limit]
+    claimed = []
+    for message_id in candidates:
+        if OutboxMessage.objects.filter(claimable, id=message_id) \
+                .update(status=OutboxMessage.SENDING, next_attempt=now, attempts=F('attempts') + 1):
+            claimed.append(message_id)
+    return list(OutboxMessage.objects.filter(id__in=claimed).order_by('creation_date'))
+
+
+def record_failure(message, error, now):
+    message.error = str(error)[:1000]
+    if message.attempts >= MAX_ATTEMPTS or isinstance(error, PERMANENT_ERRORS):
+        message.status = OutboxMessage.DEAD
+    else:
+        message.status = OutboxMessage.PENDING
+        message.next_attempt = now + retry_delay(message.attempts)
+
+
+def send_batch(messages):
+    """
+    Sends claimed messages over a single connection to the mail server and records the outcome of each one.
+    A failed message is retried later with exponential backoff, and dead-lettered after MAX_ATTEMPTS.
+    Returns the messages.
+    """
+    connection = get_connection(fail_silently=False)
+    sent, failed = [], []
+    try:
+        connection.open()
+    except Exception as error:
+        now = timezone.now()
+        for message in messages:
+            record_failure(message, error, now)
+        failed = messages
+    else:
+        for message in messages:
+            email = EmailMessage(message.subject, message.body, message.from_email or None, [message.recipient],
+                                 connection=connection)
+            try:
+                email.send()
+                sent.append(message)
+            except Exception as error:
+                record_failure(message, error, timezone.now())
+                failed.append(message)
+                # The server may have dropped the connection, start the rest of the batch on a new one
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+    finally:
+        connection.close()
+
+    now = timezone.now()
+    for message in sent:
+        message.status = OutboxMessage.SENT
+        message.sent_date = now
+        message.error = ''
+    OutboxMessage.objects.filter(id__in=[message.id for message in sent]) \
+        .update(status=OutboxMessage.SENT, sent_date=now, error='')
+    OutboxMessage.objects.bulk_update(failed, ['status', 'next_attempt', 'error'])
+    return messages
+
+
+def deliver_outbox(batch_size=BATCH_SIZE, poll_interval=5, once=False, report=None):
+    """
+    Drains the outbox batch by batch until stopped, or until no message is due if once is set.
+    report is called with every message the worker tried to send.
+    """
+    while True:
+        messages = claim_messages(batch_size)
+        if not messages:
+            if once:
+                return
+            close_old_connections()
+            time.sleep(poll_interval)
+            continue
+        for message in send_batch(messages):
+            if report:
+                report(message)
@@ -0,0 +1,143 @@
+import csv
+import io
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from users.models import CustomUser, Student, SubjectLabel
+from users.outbox import enqueue_mass_mail
+
+# Globals
+IMPORT_BATCH_SIZE = 500  # Roster rows written per round of bulk inserts
+INVITATION_SUBJECT = 'Activate Your Simulated Conversations account'
+INVITATION_SENDER = 'simcon.dev@gmail.com'
+
+
+def read_roster(roster_file):
+    """
+    Reads an uploaded CSV roster one row at a time. Every row has an email address, optionally followed by
+    the student's first and last name, and a header row starting with "email" is skipped.
+    Yields (row number, email, first name, last name) for every non-empty row.
+    """
+    rows = csv.reader(io.TextIOWrapper(roster_file, encoding='utf-8-sig', newline=''))
+    for row_number, row in enumerate(rows, start=1):
+        row = [cell.strip() for cell in row]
+        if not any(row):
+            continue
+        if row_number == 1 and row[0].lower() in ('email', 'email address'):
+            continue
+        row += [''] * (3 - len(row))
+        yield row_number, row[0], row[1], row[2]
+
+
+def validate_roster(rows):
+    """
+    Checks the rows of read_roster as they stream by. Yields valid rows as (row number, email, first name,
+    last name) with a normalized email, and the rest as (row number, email, error), so a report can be built
+    without holding the whole roster in memory.
+    """
+    seen = set()
+    for row_number, email, first_name, last_name in rows:
+        email = BaseUserManager.normalize_email(email)
+        try:
+            validate_email(email)
+        except ValidationError:
+            yield row_number, email, 'Invalid email address.'
+            continue
+        if email.lower() in seen:
+            yield row_number, email, 'Duplicate of an earlier row.'
+            continue
+        seen.add(email.lower())
+        if len(first_name) > 30 or len(last_name) > 30:
+            yield row_number, email, 'Names must be at most 30 characters long.'
+            continue
+        yield row_number, email, first_name or 'N/A', last_name or 'N/A'
+
+
+def insert_students(user_ids):
+    """
+    Creates the Student rows of existing CustomUser rows with one statement. bulk_create does not support
+    multi-table inheritance, so the child rows are inserted directly.
+    """
+    if not user_ids:
+        return
+    table = connection.ops.quote_name(Student._meta.db_table)
+    column = connection.ops.quote_name(Student._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} ({column}) VALUES (%s)', [(user_id,) for user_id in user_ids])
+
+
+def user_rows(emails):
+    return {user['email']: user for user in CustomUser.objects.filter(email__in=emails)
+            .values('id', 'email', 'is_researcher', 'registered', 'student')}
+
+
+def import_batch(researcher, label, rows, invitation, report):
+    """
+    Registers one batch of validated rows: creates the missing students, adds all of them to the researcher's
+    students and label, and queues invitations for everyone who has not registered yet.
+    """
+    users = user_rows([row[1] for row in rows])
+    new_users = []
+    for row_number, email, first_name, last_name in rows:
+        user = users.get(email)
+        if user is not None and user['is_researcher']:
+            report['errors'].append({'row': row_number, 'email': email, 'error': 'Email belongs to a researcher.'})
+        elif user is None:
+            new_users.append(CustomUser(email=email, first_name=first_name, last_name=last_name,
+                                        password=make_password(None)))
+    CustomUser.objects.bulk_create(new_users)
+    report['created'] += len(new_users)
+
+    # SQLite does not return the ids of bulk inserted rows, so they are read back by email
+    if new_users:
+        users.update(user_rows([user.email for user in new_users]))
+    students = [users[email] for row_number, email, first_name, last_name in rows
+                if not users[email]['is_researcher']]
+    insert_students([student['id'] for student in students if student['student'] is None])
+
+    Student.added_by.through.objects.bulk_create(
+        [Student.added_by.through(student_id=student['id'], researcher_id=researcher.id) for student in students],
+        ignore_conflicts=True)
+    SubjectLabel.students.through.objects.bulk_create(
+        [SubjectLabel.students.through(subjectlabel_id=label.id, student_id=student['id']) for student in students],
+        ignore_conflicts=True)
+    report['added'] += len(students)
+
+    invitations = [(INVITATION_SUBJECT, invitation + urlsafe_base64_encode(force_bytes(student['id'])) + '\n',
+                    INVITATION_SENDER, [student['email']])
+                   for student in students if not student['registered']]
+    enqueue_mass_mail(invitations)
+    report['invited'] += len(invitations)
+
+
+def import_roster(researcher, rows, site):
+    """
+    Registers every (row number, email, first name, last name) row for a researcher in one transaction,
+    in batches of IMPORT_BATCH_SIZE rows with a constant number of queries each.
+    Students are added to the researcher's "All Students" label, and invitations to register at site are
+    queued in the outbox for students without an account.
+    Returns a report with the number of students created, added and invited, and a list of errors with
+    the row number, email and error message of every row that was skipped.
+    """
+    report = {'created': 0, 'added': 0, 'invited': 0, 'errors': []}
+    invitation = 'Hi, \nPlease register here: \nhttp://' + site + '/student/register/'
+    batch = []
+    with transaction.atomic():
+        # researcher may be the CustomUser of the request, which the foreign key to Researcher does not accept
+        label, created = SubjectLabel.objects.get_or_create(label_name='All Students', researcher_id=researcher.id)
+        for row in validate_roster(rows):
+            if len(row) == 3:
+                report['errors'].append({'row': row[0], 'email': row[1], 'error': row[2]})
+                continue
+            batch.append(row)
+            if len(batch) == IMPORT_BATCH_SIZE:
+                import_batch(researcher, label, batch, invitation, report)
+                batch = []
+        if batch:
+            import_batch(researcher, label, batch, invitation, report)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
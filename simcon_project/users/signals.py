@@ -0,0 +1,61 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from conversation_templates.models import ConversationTemplate, TemplateResponse
+from users.models import Assignment
+from users.assignment_completion import invalidate_completion_matrix
+from users.student_dashboard import invalidate_dashboards, invalidate_assignment_dashboards, \
+    invalidate_template_dashboards
+
+
+@receiver([post_save, post_delete], sender=TemplateResponse)
+def template_response_changed(sender, instance, **kwargs):
+    # Responses, completions and feedback all show on the student's dashboard and the completion matrix
+    invalidate_dashboards([instance.student_id])
+    invalidate_completion_matrix([instance.assignment_id])
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(pre_delete, sender=Assignment)
+def assignment_changed(sender, instance, **kwargs):
+    invalidate_assignment_dashboards([instance.id])
+    invalidate_completion_matrix([instance.id])
+
+
+def changed_assignments(instance, reverse, pk_set):
+    """
+    Returns the ids of the assignments touched by an m2m_changed signal on one of Assignment's relations.
+    """
+    if not reverse:
+        return [instance.id]
+    return pk_set if pk_set else list(instance.assignments.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Assignment.students.through)
+def assignment_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_clear', 'post_add', 'post_remove'):
+        invalidate_completion_matrix(changed_assignments(instance, reverse, pk_set))
+        if reverse:
+            invalidate_dashboards([instance.id])
+        elif action == 'pre_clear':
+            invalidate_assignment_dashboards([instance.id])
+        else:
+            invalidate_dashboards(pk_set)
+
+
+@receiver(m2m_changed, sender=Assignment.conversation_templates.through)
+def assignment_templates_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_clear', 'post_add', 'post_remove'):
+        invalidate_completion_matrix(changed_assignments(instance, reverse, pk_set))
+        if not reverse:
+            invalidate_assignment_dashboards([instance.id])
+        elif action == 'pre_clear':
+            invalidate_template_dashboards(instance.id)
+        else:
+            invalidate_assignment_dashboards(pk_set)
+
+
+@receiver(post_save, sender=ConversationTemplate)
+def template_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_template_dashboards(instance.id)
+        invalidate_completion_matrix(instance.assignments.values_list('id', flat=True))
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+from users.models import Assignment
+
+# Globals
+CACHE_TIMEOUT = 60 * 60  # Seconds. Entries are invalidated on changes, the timeout only bounds stale entries
+AssignedTemplate = Assignment.conversation_templates.through
+
+
+def cache_key(student_id):
+    return f'student-dashboard:{student_id}'
+
+
+def assigned_template_rows(student_id):
+    """
+    Returns one row per template assigned to the student, with the student's responses to it summarised,
+    from a single grouped query:
+    last_completion is the latest completion date, responses the number of responses started and
+    unread_feedback the number of responses with feedback the student has not read.
+    Assignments that are not assigned yet are included, so the rows stay valid once they are.
+    """
+    response = 'conversationtemplate__template_responses__'
+    own_responses = Q(**{response + 'assignment': F('assignment_id'), response + 'student': student_id})
+    unread = own_responses & Q(**{response + 'feedback_read': False})
+    rows = AssignedTemplate.objects \
+        .filter(assignment__students=student_id, conversationtemplate__archived=False) \
+        .values('assignment_id', 'assignment__date_assigned', 'assignment__response_attempts',
+                'conversationtemplate_id', 'conversationtemplate__name') \
+        .annotate(last_completion=Max(response + 'completion_date', filter=own_responses),
+                  responses=Count(response + 'id', filter=own_responses),
+                  unread_feedback=Count(response + 'id', filter=unread)) \
+        .order_by('assignment__date_assigned', 'conversationtemplate__name')
+    return list(rows)
+
+
+def get_assigned_templates(student_id):
+    """
+    Returns the rows of assigned_template_rows for assignments that have been assigned by now, cached per
+    student until one of their responses or assignments changes.
+    """
+    rows = cache.get(cache_key(student_id))
+    if rows is None:
+        rows = assigned_template_rows(student_id)
+        cache.set(cache_key(student_id), rows, CACHE_TIMEOUT)
+    now = timezone.now()
+    return [row for row in rows if row['assignment__date_assigned'] <= now]
+
+
+def invalidate_dashboards(student_ids):
+    """
+    Drops the cached dashboards of the students. The cache is shared by the workers, and until the change is
+    committed they still read the old rows and may cache them again, so the entries are dropped once more
+    after the commit.
+    """
+    keys = [cache_key(student_id) for student_id in student_ids]
+    if transaction.get_connection().in_atomic_block:
+        cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_assignment_dashboards(assignments):
+    """
+    Invalidates the dashboards of every student in the given assignments (a queryset or list of ids).
+    """
+    invalidate_dashboards(set(Assignment.students.through.objects.filter(assignment__in=assignments)
+                              .values_list('student_id', flat=True)))
+
+
+def invalidate_template_dashboards(template_id):
+    invalidate_assignment_dashboards(AssignedTemplate.objects.filter(conversationtemplate_id=template_id)
+                                     .values('assignment_id'))
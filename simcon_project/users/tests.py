@@ -1,5 +1,28 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import smtplib
+import time
+from datetime import timedelta
+from unittest import mock
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from conversation_templates.models import ConversationTemplate, TemplateResponse
+from users.models import Researcher, Student, Assignment, OutboxMessage, SubjectLabel
+from users.student_dashboard import get_assigned_templates, cache_key as dashboard_key
+from users.assignment_completion import get_completion_matrix, cache_key as matrix_key
+from users.outbox import enqueue_mail, deliver_outbox, MAX_ATTEMPTS
+from users.roster_import import import_roster
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
 
 
 class UsersManagersTests(TestCase):
@@ -72,3 +95,301 @@ class UsersManagersTests(TestCase):
             User.objects.create_superuser(email='super@user.com',
                                           password='foo',
                                           is_superuser=False)
+
+
+class StudentDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        self.assignment = Assignment.objects.create(name="assignment", researcher=self.researcher,
+                                                    date_assigned=timezone.now() - timedelta(days=1),
+                                                    response_attempts=3)
+        self.assignment.students.add(self.student)
+        self.templates = [ConversationTemplate.objects.create(name=f"template {idx}", researcher=self.researcher)
+                          for idx in range(3)]
+        self.assignment.conversation_templates.set(self.templates)
+
+    def respond(self, template, completed=True, feedback_read=True):
+        return TemplateResponse.objects.create(student=self.student, template=template, assignment=self.assignment,
+                                               completion_date=timezone.now() if completed else None,
+                                               feedback_read=feedback_read)
+
+    def test_one_query_for_all_templates(self):
+        self.respond(self.templates[0])
+        self.respond(self.templates[0], feedback_read=False)
+        with self.assertNumQueries(1):
+            rows = get_assigned_templates(self.student.id)
+        with self.assertNumQueries(0):
+            get_assigned_templates(self.student.id)
+        first = rows[0]
+        self.assertEqual((first['responses'], first['unread_feedback']), (2, 1))
+        self.assertIsNotNone(first['last_completion'])
+        self.assertEqual([row['responses'] for row in rows[1:]], [0, 0])
+
+    def test_cache_invalidation(self):
+        get_assigned_templates(self.student.id)
+        self.respond(self.templates[1])
+        self.assertEqual(get_assigned_templates(self.student.id)[1]['responses'], 1)
+
+        self.assignment.conversation_templates.remove(self.templates[2])
+        self.assertEqual(len(get_assigned_templates(self.student.id)), 2)
+
+        later = Assignment.objects.create(name="later", researcher=self.researcher, date_assigned=timezone.now())
+        later.conversation_templates.add(self.templates[2])
+        later.students.add(self.student)
+        self.assertEqual(len(get_assigned_templates(self.student.id)), 3)
+
+        later.date_assigned = timezone.now() + timedelta(days=1)
+        later.save()
+        self.assertEqual(len(get_assigned_templates(self.student.id)), 2)
+
+    def test_student_view(self):
+        self.respond(self.templates[0], feedback_read=False)
+        self.client.login(email="student@pdx.edu", password="abc123")
+        response = self.client.get(reverse('student-view'))
+        self.assertEqual(len(response.context['incomplete_table'].rows), 2)
+        completed = list(response.context['completed_table'].rows)
+        self.assertEqual(len(completed), 1)
+        self.assertEqual(completed[0].record['attempts_left'], 2)
+        self.assertTrue(completed[0].record['new_feedback'])
+
+
+class CacheCommitTests(TransactionTestCase):
+    def test_dashboard_cached_before_the_commit_is_dropped(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        assignment = Assignment.objects.create(name="assignment", researcher=researcher, date_assigned=timezone.now())
+        template = ConversationTemplate.objects.create(name="template", researcher=researcher)
+        with transaction.atomic():
+            TemplateResponse.objects.create(student=student, template=template, assignment=assignment)
+            # Another worker does not see the response yet
+            cache.set(dashboard_key(student.id), [], 60)
+        self.assertIsNone(cache.get(dashboard_key(student.id)))
+
+    def test_matrix_cached_before_the_commit_is_dropped(self):
+        researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        student = Student.objects.create_user(email="student@pdx.edu", password="abc123")
+        assignment = Assignment.objects.create(name="assignment", researcher=researcher, date_assigned=timezone.now())
+        template = ConversationTemplate.objects.create(name="template", researcher=researcher)
+        with transaction.atomic():
+            TemplateResponse.objects.create(student=student, template=template, assignment=assignment,
+                                            completion_date=timezone.now())
+            cache.set(matrix_key(assignment.id), {'students': [], 'templates': [], 'cells': {}}, 60)
+        self.assertIsNone(cache.get(matrix_key(assignment.id)))
+
+
+class AssignmentCompletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.assignment = Assignment.objects.create(name="assignment", researcher=self.researcher,
+                                                    date_assigned=timezone.now())
+        self.templates = [ConversationTemplate.objects.create(name=f"template {idx}", researcher=self.researcher)
+                          for idx in range(2)]
+        self.assignment.conversation_templates.set(self.templates)
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def add_students(self, count):
+        for idx in range(count):
+            student = Student.objects.create_user(email=f"student{Student.objects.count()}@pdx.edu",
+                                                  password="abc123", first_name="Student", last_name=str(idx))
+            self.assignment.students.add(student)
+            TemplateResponse.objects.create(student=student, template=self.templates[0], assignment=self.assignment,
+                                            completion_date=timezone.now())
+            TemplateResponse.objects.create(student=student, template=self.templates[1], assignment=self.assignment)
+
+    def test_matrix_queries_do_not_grow(self):
+        self.add_students(2)
+        with self.assertNumQueries(3):
+            matrix = get_completion_matrix(self.assignment.id)
+        with self.assertNumQueries(0):
+            get_completion_matrix(self.assignment.id)
+        student = matrix['students'][0]['id']
+        self.assertEqual(matrix['cells'][(student, self.templates[0].id)]['completed'], 1)
+        self.assertEqual(matrix['cells'][(student, self.templates[1].id)]['attempts'], 1)
+
+        self.add_students(10)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(get_completion_matrix(self.assignment.id)['students']), 12)
+
+    def test_view_students(self):
+        self.add_students(2)
+        response = self.client.get(reverse('ass-management:view-students', args=[self.assignment.id]))
+        self.assertEqual([row.record['templates_completed'] for row in response.context['table'].rows],
+                         ['1/2', '1/2'])
+        self.assertEqual(response.context['completion_string'],
+                         '50% of assigned templates have been completed at least once.')
+
+        TemplateResponse.objects.create(student=Student.objects.first(), template=self.templates[1],
+                                        assignment=self.assignment, completion_date=timezone.now())
+        response = self.client.get(reverse('ass-management:view-students', args=[self.assignment.id]))
+        self.assertIn('75%', response.context['completion_string'])
+
+    def test_heatmap_download(self):
+        self.add_students(1)
+        response = self.client.get(reverse('ass-management:completion-heatmap', args=[self.assignment.id]))
+        rows = list(load_workbook(io.BytesIO(response.content)).active.values)
+        self.assertEqual(rows[0], ('Student', 'Email Address', 'template 0', 'template 1'))
+        self.assertTrue(rows[1][2].startswith('1/1 '))
+        self.assertEqual(rows[1][3], '0/1')
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_fans_out_per_recipient(self):
+        enqueue_mail('subject', 'message', 'simcon.dev@gmail.com', ['a@pdx.edu', 'b@pdx.edu', 'a@pdx.edu'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.PENDING).count(), 2)
+
+        with mock.patch('users.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            deliver_outbox(once=True)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['a@pdx.edu', 'b@pdx.edu'])
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 2)
+
+    def test_retry_and_dead_letter(self):
+        enqueue_mail('subject', 'message', None, ['good@pdx.edu', 'bad@pdx.edu'])
+        send = mail.EmailMessage.send
+
+        def flaky_send(email, *args, **kwargs):
+            if email.to == ['bad@pdx.edu']:
+                raise smtplib.SMTPServerDisconnected('connection lost')
+            return send(email, *args, **kwargs)
+
+        with mock.patch.object(mail.EmailMessage, 'send', flaky_send):
+            deliver_outbox(once=True)
+            bad = OutboxMessage.objects.get(recipient='bad@pdx.edu')
+            self.assertEqual((bad.status, bad.attempts), (OutboxMessage.PENDING, 1))
+            self.assertGreater(bad.next_attempt, timezone.now())
+            self.assertEqual(OutboxMessage.objects.get(recipient='good@pdx.edu').status, OutboxMessage.SENT)
+
+            for attempt in range(MAX_ATTEMPTS - 1):
+                OutboxMessage.objects.filter(id=bad.id).update(next_attempt=timezone.now())
+                deliver_outbox(once=True)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (OutboxMessage.DEAD, MAX_ATTEMPTS))
+        self.assertEqual([email.to for email in mail.outbox], [['good@pdx.edu']])
+
+
+class RosterImportTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.label = SubjectLabel.objects.get(label_name='All Students', researcher=self.researcher)
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def roster(self, count, start=0):
+        return [(idx + 1, f"student{start + idx}@pdx.edu", "Student", str(idx)) for idx in range(count)]
+
+    def test_queries_do_not_grow_with_roster(self):
+        with self.assertNumQueries(10):
+            report = import_roster(self.researcher, self.roster(5), 'testserver')
+        with self.assertNumQueries(10):
+            import_roster(self.researcher, self.roster(50, start=5), 'testserver')
+        self.assertEqual((report['created'], report['added'], report['invited']), (5, 5, 5))
+        self.assertEqual(self.researcher.students.count(), 55)
+        self.assertEqual(self.label.students.count(), 55)
+        self.assertEqual(OutboxMessage.objects.count(), 55)
+
+        student = Student.objects.get(email="student0@pdx.edu")
+        self.assertEqual((student.first_name, student.has_usable_password()), ("Student", False))
+
+    def test_label_created_for_request_user(self):
+        self.label.delete()
+        user = get_user_model().objects.get(id=self.researcher.id)
+        import_roster(user, self.roster(1), 'testserver')
+        label = SubjectLabel.objects.get(label_name='All Students', researcher=self.researcher)
+        self.assertEqual(label.students.count(), 1)
+
+    def test_existing_students(self):
+        other = Researcher.objects.create_researcher(email="other@pdx.edu", password="abc123")
+        registered = Student.objects.create_user(email="student0@pdx.edu", password="abc123", registered=True)
+        registered.added_by.add(other)
+        report = import_roster(self.researcher, self.roster(2), 'testserver')
+        self.assertEqual((report['created'], report['added'], report['invited']), (1, 2, 1))
+        self.assertEqual(set(registered.added_by.all()), {self.researcher, other})
+        self.assertEqual(list(OutboxMessage.objects.values_list('recipient', flat=True)), ["student1@pdx.edu"])
+
+    def test_csv_upload_reports_errors(self):
+        roster = SimpleUploadedFile("roster.csv", b"email,first name,last name\n"
+                                                  b"ada@pdx.edu,Ada,Lovelace\n"
+                                                  b"not an email\n"
+                                                  b"\n"
+                                                  b"ADA@PDX.EDU\n"
+                                                  b"researcher@pdx.edu\n"
+                                                  b"alan@pdx.edu\n", content_type="text/csv")
+        response = self.client.post(reverse('import-students'), {'roster': roster})
+        data = json.loads(response.content)
+        self.assertEqual(data['success'], 1)
+        self.assertEqual((data['created'], data['invited']), (2, 2))
+        self.assertEqual([error['row'] for error in data['errors']], [3, 5, 6])
+        self.assertEqual(Student.objects.get(email="ada@pdx.edu").last_name, "Lovelace")
+
+    def test_register_students(self):
+        response = self.client.post(reverse('register-students'),
+                                    {'students': '["ada@pdx.edu","alan@pdx.edu"]'})
+        self.assertEqual(json.loads(response.content)['success'], 0)
+        self.assertEqual(self.label.students.count(), 2)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+
+class AddAssignmentBenchmarkTests(TestCase):
+    def setUp(self):
+        self.researcher = Researcher.objects.create_researcher(email="researcher@pdx.edu", password="abc123")
+        self.templates = [ConversationTemplate.objects.create(name=f"template {idx}", researcher=self.researcher)
+                          for idx in range(3)]
+        self.client.login(email="researcher@pdx.edu", password="abc123")
+
+    def add_label(self, name, count):
+        label = SubjectLabel.objects.create(label_name=name, researcher=self.researcher)
+        students = [Student.objects.create(email=f"{name}{idx}@pdx.edu") for idx in range(count)]
+        label.students.set(students)
+        return [student.email for student in students]
+
+    def encode(self, values):
+        return json.dumps(values, separators=(',', ':'))
+
+    def post_assignment(self, students, labels, assign_now='true'):
+        data = {
+            'name': 'assignment', 'assign_now': assign_now, 'date': '01/01/2100 10:00 AM',
+            'stuData': self.encode(students), 'labelData': self.encode(labels),
+            'tempData': self.encode([str(template.id) for template in self.templates]),
+            'response_attempts': 1, 'record_attempts': 1,
+            'allow_typed_response': 'false', 'allow_self_rating': 'false',
+        }
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('assignments:add-assignment'), data)
+        # SQLite splits large bulk inserts into several statements, count those as one
+        statements = {query['sql'] for query in queries if query['sql'].startswith('INSERT')}
+        inserts = len({statement.split(' SELECT ')[0] for statement in statements})
+        selects = len([query for query in queries if not query['sql'].startswith('INSERT')])
+        return json.loads(response.content), selects + inserts, time.perf_counter() - start
+
+    def test_queries_do_not_grow_with_students(self):
+        report = []
+        for size in (5, 200):
+            students = self.add_label(f"small{size}", 2)
+            self.add_label(f"label{size}", size)
+            result, queries, seconds = self.post_assignment(students, [f"label{size}"])
+            self.assertEqual(result['success'], 0, result['msg'])
+            report.append((size + 2, queries, seconds))
+        for size, queries, seconds in report:
+            logger.info("add_assignment: %d students, %d queries, %.1f ms", size, queries, seconds * 1000)
+        self.assertEqual(report[0][1], report[1][1])
+
+        assignment = Assignment.objects.get(subject_labels__label_name="label200")
+        self.assertEqual(assignment.students.count(), 202)
+        self.assertEqual(assignment.conversation_templates.count(), 3)
+        self.assertEqual(OutboxMessage.objects.filter(subject__contains='Assignment').count(), 7 + 202)
+
+    def test_nothing_saved_on_error(self):
+        self.add_label("empty", 0)
+        result, queries, seconds = self.post_assignment(["unknown@pdx.edu"], ["empty"], assign_now='false')
+        self.assertEqual(result['success'], 1)
+        self.assertIn('unknown@pdx.edu', result['msg'])
+        self.assertFalse(Assignment.objects.exists())
+
+        students = self.add_label("later", 3)
+        result, queries, seconds = self.post_assignment(students, [], assign_now='false')
+        self.assertEqual(result['success'], 0, result['msg'])
+        self.assertEqual(Assignment.objects.get().email.subject, 'Simulated Conversation Assignment Update')
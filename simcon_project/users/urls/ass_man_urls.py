@@ -7,5 +7,6 @@ urlpatterns = [
     path('view-details/<pk>/', view_settings, name="view-settings"),
     path('view-templates/<pk>/', view_templates, name="view-templates"),
     path('view-students/<pk>/', view_students, name="view-students"),
+    path('view-students/<pk>/heatmap/', download_completion_heatmap, name="completion-heatmap"),
     path('delete/<pk>', AssignmentDeleteView.as_view(), name="delete-assignment"),
 ]
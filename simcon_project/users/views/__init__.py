@@ -2,11 +2,13 @@ from .redirect_from_login import redirect_from_login
 from .researcher_home import researcher_view
 from .researcher_settings_page import researcher_settings_view
 from .researcher_management import researcher_management, ResearcherDeleteView
+from .request_timings import request_timings_view
 from .researcher_registration import researcher_registration
 from .student_settings_page import student_settings_view
 from .student_home import student_view
 from .student_management import *
-from .assignment_management import assignment_management_view, view_settings, view_templates, view_students, AssignmentDeleteView
+from .assignment_management import assignment_management_view, view_settings, view_templates, view_students, \
+    download_completion_heatmap, AssignmentDeleteView
 from .student_registration import student_registration
 from .logout import logout
 from .create_assignment import *
\ No newline at end of file
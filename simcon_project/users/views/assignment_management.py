@@ -1,13 +1,25 @@
-from django.shortcuts import render
+from django.http import HttpResponse
+from django.shortcuts import render, get_object_or_404
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
 import django_tables2 as tables
 from django_tables2.config import RequestConfig
 from django.contrib.auth.decorators import user_passes_test
 from django.urls import reverse_lazy
 from users.views.researcher_home import is_researcher
-from users.models import Assignment, Researcher, Student
-from conversation_templates.models import ConversationTemplate, TemplateResponse
+from users.models import Assignment, Researcher
+from conversation_templates.models import ConversationTemplate
+from users.assignment_completion import completed_templates, get_completion_matrix
 from bootstrap_modal_forms.generic import BSModalDeleteView
 
+# Globals
+HEATMAP_FILLS = {
+    'completed': PatternFill(start_color='63BE7B', end_color='63BE7B', fill_type='solid'),
+    'started': PatternFill(start_color='FFEB84', end_color='FFEB84', fill_type='solid'),
+    'not_started': PatternFill(start_color='F8696B', end_color='F8696B', fill_type='solid'),
+}
+
 
 class AssignmentsTable(tables.Table):
     """
@@ -159,40 +171,21 @@ def view_students(request, pk):
     """
     student_rows = []
     total_completed_templates = 0
-    assignment = Assignment.objects.get(pk=pk)
-    students = Student.objects.filter(assignments=assignment)
-    templates = ConversationTemplate.objects.filter(assignments=assignment)
-    assigned_template_count = ConversationTemplate.objects.filter(assignments=assignment).count()
+    matrix = get_completion_matrix(pk)
+    assigned_template_count = len(matrix['templates'])
 
     # per student, count number of templates in assignment they have at least one submission for
     # as well as getting name and email. One student per row for table.
-    for student in students:
-        completed_template_count = TemplateResponse.objects.exclude(completion_date=None) \
-                                                            .filter(assignment=assignment,
-                                                                    template__in=templates,
-                                                                    student=student) \
-                                                            .values('template') \
-                                                            .distinct().count()
-        if completed_template_count > assigned_template_count:
-            completed_template_count = assigned_template_count
-        if completed_template_count < 0:
-            completed_template_count = 0
+    for student in matrix['students']:
+        completed_template_count = completed_templates(matrix, student['id'])
         total_completed_templates = total_completed_templates + completed_template_count
-
-        row_data = {}
-        row_data.update({'id': student.id,
-                         'name': student.first_name + ' ' + student.last_name,
-                         'email_address': student.email,
-                         'templates_completed': str(completed_template_count) + '/' + str(assigned_template_count)})
-        student_rows.append(row_data)
+        student_rows.append({'id': student['id'],
+                             'name': student['name'],
+                             'email_address': student['email'],
+                             'templates_completed': str(completed_template_count) + '/' + str(assigned_template_count)})
     assigned_students_table = AssignedStudentsTable(student_rows)
 
-    total_assigned_templates = ConversationTemplate.objects.filter(assignments=assignment).count() * \
-                                                                        assignment.students.count()
-    if total_completed_templates > total_assigned_templates:
-        total_completed_templates = total_assigned_templates
-    if total_completed_templates < 0:
-        total_completed_templates = 0
+    total_assigned_templates = assigned_template_count * len(matrix['students'])
     if total_assigned_templates <= 0:
         completion_string = 'No students were given this assignment.'
     else:
@@ -200,4 +193,43 @@ def view_students(request, pk):
         completion_percent = str(completion_percent * 100).split('.', 1)[0] + '%'
         completion_string = completion_percent + ' of assigned templates have been completed at least once.'
     return render(request, 'assignment_management/view_students_modal.html', {'table': assigned_students_table,
-                                                                               'completion_string': completion_string})
+                                                                               'completion_string': completion_string,
+                                                                               'pk': pk})
+
+
+@user_passes_test(is_researcher)
+def download_completion_heatmap(request, pk):
+    """
+    Downloads the completion of an assignment as an .xlsx heatmap: one row per student, one column per template.
+    Cells show completed/started responses and the last completion date, and are colored green when the
+    template was completed, yellow when it was only started and red when it was not started.
+    """
+    assignment = get_object_or_404(Assignment, pk=pk, researcher=request.user.id)
+    matrix = get_completion_matrix(pk)
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Completion'
+    sheet.append(['Student', 'Email Address'] + [template['name'] for template in matrix['templates']])
+    for student in matrix['students']:
+        row = [student['name'], student['email']]
+        fills = []
+        for template in matrix['templates']:
+            cell = matrix['cells'].get((student['id'], template['id']))
+            if cell is None:
+                row.append('Not started')
+                fills.append(HEATMAP_FILLS['not_started'])
+                continue
+            text = f"{cell['completed']}/{cell['attempts']}"
+            if cell['last_completion'] is not None:
+                text += ' ' + timezone.localtime(cell['last_completion']).strftime('%m/%d/%Y')
+            row.append(text)
+            fills.append(HEATMAP_FILLS['completed' if cell['completed'] else 'started'])
+        sheet.append(row)
+        for column, fill in enumerate(fills, start=3):
+            sheet.cell(row=sheet.max_row, column=column).fill = fill
+
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Disposition'] = f'attachment; filename="{assignment.name} completion.xlsx"'
+    workbook.save(response)
+    return response
@@ -1,9 +1,10 @@
 from django.shortcuts import render
-from users.models import SubjectLabel, Assignment, Student, Researcher, Email
+from users.models import SubjectLabel, Assignment, Student, Email
 from conversation_templates.models import ConversationTemplate
 from django.core import serializers
+from django.db import transaction
 from django.http import HttpResponse
-from django.core.mail import EmailMessage
+from users.outbox import enqueue_mail
 from django.views.decorators.csrf import ensure_csrf_cookie
 from tzlocal import get_localzone
 from django.contrib.auth.decorators import user_passes_test
@@ -46,7 +47,7 @@ def decode(str):
 
 
 def sendMail(subject, msg, recipient, email_address):
-    EmailMessage(subject, msg, email_address, [], recipient).send()
+    enqueue_mail(subject, msg, email_address, recipient)
 
 # Determine if data is empty.
 def isNull(data):
@@ -100,63 +101,60 @@ def add_assignment(request):
     labelIsNull = isNull(labels)
     tempIsNull = isNull(templates)
 
-    # Save the data that can be directly assigned to assignment.
-    assignment = Assignment()
-    assignment.name = name
-    assignment.date_assigned = sched_datetime
-    researcher = Researcher.objects.get(id=researcher)
-    assignment.researcher = researcher
-    assignment.response_attempts = response_attempts
-    assignment.recording_attempts = record_attempts
-    assignment.allow_typed_response = allow_typed_response
-    assignment.allow_self_rating = allow_self_rating
-    assignment.save()
-
-    # Assign student information to assignment,
-    # and judge whether there is an error that both students and labels are empty.
+    # Resolve students, labels and templates with one query each, before anything is saved.
     # Also check if chosen labels have any students in them
     if stuIsNull and labelIsNull:
         success = 1
         errMsg = errMsg+'Either students or labels must not be empty.\n\n'
-    labelStudents = Student.objects.filter(labels__label_name__in=labels, labels__researcher=researcher)
-    if stuIsNull and not labelIsNull:
-        if stuIsNull and labelStudents.count() <= 0:
-            success = 1
-            errMsg = errMsg + 'The chosen label(s) does not contain any students.\n\n'
+    student_ids = set()
     if not stuIsNull:
-        for stu in students:
-            stuTmp = Student.objects.get(email=stu)
-            assignment.students.add(stuTmp)
+        found = dict(Student.objects.filter(email__in=students).values_list('email', 'id'))
+        student_ids.update(found.values())
+        missing = [email for email in students if email not in found]
+        if missing:
+            success = 1
+            errMsg = errMsg + 'Students not found: ' + ', '.join(missing) + '\n\n'
+    label_ids = []
     if not labelIsNull:
-        for students in labelStudents:
-            stuTmp = Student.objects.get(email=students.email)
-            assignment.students.add(stuTmp)
-        # Assign label information to assignment
-        for label in labels:
-            labelTmp = SubjectLabel.objects.get(label_name=label, researcher=researcher)
-            assignment.subject_labels.add(labelTmp)
-
-    # Assign template information to assignment
+        label_ids = list(SubjectLabel.objects.filter(label_name__in=labels, researcher=researcher)
+                         .values_list('id', flat=True))
+        label_students = set(SubjectLabel.students.through.objects.filter(subjectlabel_id__in=label_ids)
+                             .values_list('student_id', flat=True))
+        if stuIsNull and not label_students:
+            success = 1
+            errMsg = errMsg + 'The chosen label(s) does not contain any students.\n\n'
+        student_ids.update(label_students)
+
+    # Verify templates
+    template_ids = []
     if tempIsNull:
         success = 1
         errMsg = errMsg+'Template must not be empty.\n\n'
     else:
-        for temp in templates:
-            tempTmp = ConversationTemplate.objects.get(pk=temp)
-            assignment.conversation_templates.add(tempTmp)
-
-    subject = 'Simulated Conversation Assignment Update'
-    msg = 'You have a new assignment. Please check your home page.'
-    recipient = [i[0] for i in assignment.students.values_list('email')]
-    # when an error occurs, there is no need to add this task to the schedule.
+        template_ids = list(ConversationTemplate.objects.filter(pk__in=templates).values_list('id', flat=True))
+        if len(template_ids) != len(set(templates)):
+            success = 1
+            errMsg = errMsg + 'Some of the chosen templates no longer exist.\n\n'
+
+    # when an error occurs, nothing is saved and there is no need to add this task to the schedule.
     if success == 0:
-        if assign_now == 'true':
-            sendMail(subject, msg, recipient, 'simcon.dev@gmail.com')
-        else:
-            email = Email(subject=subject, message=msg, assignment=assignment)
-            email.save()
-    else:
-        assignment.delete()
+        subject = 'Simulated Conversation Assignment Update'
+        msg = 'You have a new assignment. Please check your home page.'
+        with transaction.atomic():
+            assignment = Assignment.objects.create(name=name, date_assigned=sched_datetime,
+                                                   researcher_id=researcher, response_attempts=response_attempts,
+                                                   recording_attempts=record_attempts,
+                                                   allow_typed_response=allow_typed_response,
+                                                   allow_self_rating=allow_self_rating)
+            # Each relation is written with one bulk insert
+            assignment.students.add(*student_ids)
+            assignment.subject_labels.add(*label_ids)
+            assignment.conversation_templates.add(*template_ids)
+            if assign_now == 'true':
+                recipient = list(Student.objects.filter(id__in=student_ids).values_list('email', flat=True))
+                sendMail(subject, msg, recipient, 'simcon.dev@gmail.com')
+            else:
+                Email.objects.create(subject=subject, message=msg, assignment=assignment)
 
     return HttpResponse(json.dumps({
         'success': success,
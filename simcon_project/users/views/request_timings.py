@@ -0,0 +1,24 @@
+import json
+from django.conf import settings
+from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpResponse
+from conversation_templates.transactions import hold_times, lock_counters
+from simcon_project.timing import request_timings
+from users.views.researcher_home import is_admin
+
+
+@user_passes_test(is_admin)
+def request_timings_view(request):
+    """
+    Returns, as JSON, the p50, p95 and p99 of the wall time, query count, query time, template render time and
+    response size of the sampled requests of every view in this process, by url name. Also includes how long
+    the conversation writes held the database and how often they found it locked.
+    :param request: HttpRequest of an admin (staff) researcher
+    :return: HttpResponse with the timings as JSON
+    """
+    return HttpResponse(json.dumps({
+        'sample_rate': settings.REQUEST_TIMING_SAMPLE_RATE,
+        'views': request_timings.summary(),
+        'write_hold_times': hold_times(),
+        'write_locks': lock_counters(),
+    }), content_type='application/json')
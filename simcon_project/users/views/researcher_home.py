@@ -1,7 +1,9 @@
 from django.shortcuts import render
 from django.db.models import Q
 from conversation_templates.models import TemplateResponse
+from conversation_templates.search_index import response_index
 from django.contrib.auth.decorators import user_passes_test
+from simcon_project.replica import analytics_view
 import django_tables2 as tables
 from django_tables2 import RequestConfig
 import functools
@@ -36,11 +38,14 @@ def is_admin(user):
 
 
 @ user_passes_test(is_researcher)
+@analytics_view
 def researcher_view(request):
-    responses = TemplateResponse.objects.filter(template__researcher__email=request.user.email, archived=False, hidden=False)
+    responses = TemplateResponse.objects.filter(template__researcher__email=request.user.email, archived=False, hidden=False)\
+        .select_related('student', 'assignment', 'template__researcher').prefetch_related('node_responses')
     filtered_responses = filter_search(request, responses)
 
-    if filtered_responses:
+    # Only the rows of the page are fetched, with their students, assignments, templates and node responses
+    if filtered_responses.exists():
         response_table = ResponseTable(filtered_responses)
         RequestConfig(request, paginate={"per_page": 10}).configure(response_table)
     else:
@@ -54,6 +59,9 @@ def researcher_view(request):
 def filter_search(request, responses):
     if 'searchParam' in request.GET:
         param = request.GET['searchParam']
+        if response_index.supported:
+            # Ranked prefix match on student, template, assignment and label names in one indexed lookup
+            return response_index.search(responses, param)
         if param == "":
             filter_fields = Q(student__first_name__contains=param) | Q(student__last_name__contains=param) | \
             Q(template__name__contains=param) | \
@@ -2,7 +2,6 @@ from django.contrib.auth.decorators import user_passes_test
 from users.views.researcher_home import is_admin
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.shortcuts import render
@@ -11,6 +10,7 @@ from django.urls import reverse_lazy
 import django_tables2 as tables
 from users.forms import AddResearcherForm
 from users.models import Researcher
+from users.outbox import enqueue_mail
 from bootstrap_modal_forms.generic import BSModalDeleteView
 from django_tables2 import RequestConfig
 
@@ -110,7 +110,7 @@ def add_researcher(request):
             site = current_site.domain
             message = 'Hi, \nPlease register here: \nhttp://' + site + '/researcher/register/' \
                       + uid + '\n'
-            send_mail(subject, message, 'simulated.conversation@mail.com', [email_address], fail_silently=False)
+            enqueue_mail(subject, message, 'simulated.conversation@mail.com', [email_address])
             messages.success(request, 'A link to register has been sent to the researcher\'s email provided.')
             return AddResearcherForm()
         else:
@@ -1,12 +1,10 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import Max
 from users.models import *
 from conversation_templates.models import *
 import django_tables2 as tables
 from django_tables2 import RequestConfig
-import datetime
-from tzlocal import get_localzone
+from users.student_dashboard import get_assigned_templates
 
 
 def is_student(user):
@@ -74,42 +72,25 @@ def student_view(request):
     """
     incomplete_templates = []
     completed_templates = []
-    # get the Student object matching logged in student
-    student = Student.objects.get(id=request.user.id)
-    # get the assignments for that student
-    now = datetime.datetime.now(get_localzone())
-    assignments = Assignment.objects.filter(students=student, date_assigned__lte=now)
-    # for each assignment, get all templates contained. Get most recent response by the student for each template
-    for assignment in assignments:
-        templates_in_assignment = ConversationTemplate.objects.filter(assignments=assignment, archived=False)
-        for template in templates_in_assignment:
-            responses = TemplateResponse.objects.filter(assignment=assignment, template=template,
-                                                            student=student)
-            last_response = responses.aggregate(Max('completion_date'))
-            attempts_left = assignment.response_attempts - len(responses)
-            new_feedback = False
-            for feedback in responses:
-                if not feedback.feedback_read:
-                    new_feedback = True
-                    break
-
-            if attempts_left < 0:
-                attempts_left = 0
+    # One row per template in the student's assignments, with the student's responses to it summarised
+    for assigned_template in get_assigned_templates(request.user.id):
+        attempts_left = assigned_template['assignment__response_attempts'] - assigned_template['responses']
+        if attempts_left < 0:
+            attempts_left = 0
 
-            assigned_template_row = {}
-            assigned_template_row.update({"conversation_templates__id": template.id,
-                                          "id": assignment.id,
-                                          "conversation_templates__name": template.name,
-                                          "date_assigned": assignment.date_assigned,
-                                          "conversation_templates__template_responses__completion_date":
-                                              last_response['completion_date__max'],
-                                          "attempts_left": attempts_left,
-                                          "new_feedback": new_feedback
-                                          })
-            if last_response['completion_date__max'] is None and attempts_left > 0:
-                incomplete_templates.append(assigned_template_row)
-            else:
-                completed_templates.append(assigned_template_row)
+        assigned_template_row = {
+            "conversation_templates__id": assigned_template['conversationtemplate_id'],
+            "id": assigned_template['assignment_id'],
+            "conversation_templates__name": assigned_template['conversationtemplate__name'],
+            "date_assigned": assigned_template['assignment__date_assigned'],
+            "conversation_templates__template_responses__completion_date": assigned_template['last_completion'],
+            "attempts_left": attempts_left,
+            "new_feedback": assigned_template['unread_feedback'] > 0,
+        }
+        if assigned_template['last_completion'] is None and attempts_left > 0:
+            incomplete_templates.append(assigned_template_row)
+        else:
+            completed_templates.append(assigned_template_row)
 
     incomplete_templates_table = IncompleteTemplatesTable(incomplete_templates, prefix="-1")
     completed_templates_table = CompletedTemplatesTable(completed_templates, prefix="-2")
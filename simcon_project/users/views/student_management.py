@@ -1,12 +1,10 @@
 from users.forms import NewLabel, AddToLabel
 from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import render, redirect
-from django.utils.encoding import force_bytes
 from django.http import HttpResponse, HttpResponseRedirect
-from django.utils.http import urlsafe_base64_encode
 from users.models import Student, Researcher, SubjectLabel, Assignment
+from users.roster_import import import_roster, read_roster
 from conversation_templates.models import TemplateResponse
-from django.core.mail import send_mail
 import django_tables2 as tables
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
@@ -142,35 +140,42 @@ def register_students(request):
     """
     Send registration emails to newly made accounts and attach all students to researcher
     """
-    success = 0
-    error_message = ''
     students = decode(request.POST.get("students"))
     if students is None or students == '':
-        success = 1
-        error_message += 'No emails entered.\n'
-    # for each student, check if account already exists. If no, send registration email. Add researcher to added_by list
-    if success == 0:
-        subject = 'Activate Your Simulated Conversations account'
-        current_site = get_current_site(request)
-        site = current_site.domain
-        message = 'Hi, \nPlease register here: \nhttp://' + site + '/student/register/'
-        for student_email in students:
-            student = Student.objects.filter(email=student_email).first()
-            if student is None:
-                student = Student.objects.create(email=student_email, first_name='N/A', last_name='N/A',
-                                                 is_researcher=False)
-            if student.registered is False:
-                student.set_unusable_password()
-                uid = urlsafe_base64_encode(force_bytes(student.pk))
-                final_message = message + uid + '\n'
-                send_mail(subject, final_message, 'simcon.dev@gmail.com', [student_email], fail_silently=False)
-            student.added_by.add(request.user.id)
-            all_students_label = SubjectLabel.objects.get(label_name='All Students',
-                                                             researcher=request.user.id)
-            all_students_label.students.add(student)
+        return HttpResponse(json.dumps({
+            'success': 1,
+            'message': 'No emails entered.\n',
+        }))
+    rows = ((row_number, email, '', '') for row_number, email in enumerate(students, start=1))
+    return roster_response(import_roster(request.user, rows, get_current_site(request).domain))
+
+
+@user_passes_test(is_researcher)
+@ensure_csrf_cookie
+def import_students(request):
+    """
+    Registers every student in an uploaded CSV roster (email, optional first and last name per row) at once.
+    Returns the number of students created, added and invited, and the rows that were skipped.
+    """
+    roster = request.FILES.get("roster")
+    if roster is None:
+        return HttpResponse(json.dumps({
+            'success': 1,
+            'message': 'No roster uploaded.\n',
+        }))
+    return roster_response(import_roster(request.user, read_roster(roster), get_current_site(request).domain))
+
+
+def roster_response(report):
+    error_message = ''.join(f"Row {error['row']} ({error['email']}): {error['error']}\n"
+                            for error in report['errors'])
     return HttpResponse(json.dumps({
-        'success': success,
+        'success': 1 if report['errors'] else 0,
         'message': error_message,
+        'created': report['created'],
+        'added': report['added'],
+        'invited': report['invited'],
+        'errors': report['errors'],
     }))
 
 